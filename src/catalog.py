@@ -0,0 +1,170 @@
+# Import threading to reload the catalog once when it changes and time to limit how often the version is checked
+import threading
+import time
+
+# Import namedtuple for the lightweight, read-only exercise records held in memory
+from collections import namedtuple
+
+# Import SQLAlchemy database and the models the catalog is loaded from
+from init import db
+from models.exercise import Exercise
+from models.user import User
+
+# Import PostgreSQL insert to bump versions with INSERT ... ON CONFLICT DO UPDATE
+from sqlalchemy.dialects.postgresql import insert
+
+# Import the in-memory search index used to search the catalog's exercises
+from search import ExerciseSearchIndex
+
+
+# Table which stores a version number for each in-memory catalog (and for data shown in routines without the routines being updated, see ROUTINE_OWNERS_VERSION
+# in documents.py). The version is bumped in the same transaction as every change to the data, so every worker process (and validator) can tell that its copy is out of date with a single primary key lookup (created alongside the model tables by 'flask db create').
+catalog_versions = db.Table(
+    "catalog_versions",
+    db.Column("name", db.String, primary_key=True),
+    db.Column("version", db.Integer, nullable=False, default=0)
+)
+
+# Function to build a scalar subquery of a version in catalog_versions (0 if it has never been bumped), so the version can be fetched alongside another query
+def catalog_version(name):
+    return db.func.coalesce(db.select(catalog_versions.c.version).where(catalog_versions.c.name == name).scalar_subquery(), 0)
+
+# Function to record a change in the current transaction by bumping a version in catalog_versions (call before committing)
+# INSERT INTO catalog_versions (name, version) VALUES (:name, 1) ON CONFLICT (name) DO UPDATE SET version = catalog_versions.version + 1
+def bump_catalog_version(name):
+    stmt = insert(catalog_versions).values(name=name, version=1).on_conflict_do_update(
+        index_elements=["name"], set_={"version": catalog_versions.c.version + 1})
+    db.session.execute(stmt)
+
+# Read-only records held by the catalog. They have the same attributes as the models for every field of ExerciseSchema (e.g. record.user.username),
+# so they can be serialised with the same schemas.
+ExerciseUser = namedtuple("ExerciseUser", ("id", "username"))
+ExerciseRecord = namedtuple("ExerciseRecord", ("id", "exercise_name", "description", "body_part", "user_id", "user", "last_updated"))
+
+
+# Function to fetch the sort values of an exercise record: lower cased name (compared by code point), then ID. The same order as the database's
+# (see exercise_name_order in models/exercise.py and EXERCISE_SORT_KEYS in exercises_controller.py).
+def exercise_sort_values(record):
+    return (record.exercise_name.lower(), record.id)
+
+
+# A loaded copy of every exercise at a catalog version. Snapshots are never modified (a new snapshot replaces the old one when the catalog changes).
+class CatalogSnapshot:
+    def __init__(self, version, records):
+        self.version = version
+        # Every exercise in alphabetical order
+        self.records = sorted(records, key=exercise_sort_values)
+        # id -> record
+        self.by_id = {record.id: record for record in self.records}
+        # exercise name -> id
+        self.by_name = {record.exercise_name: record.id for record in self.records}
+        # body part -> records in alphabetical order
+        self.by_body_part = {}
+        for record in self.records:
+            self.by_body_part.setdefault(record.body_part, []).append(record)
+        # Search index (see search.py). Built with the snapshot, so it is built once per catalog version (while ExerciseCatalog holds its lock).
+        self.search_index = ExerciseSearchIndex(self.records)
+
+    # Function to fetch the snapshot's exercise records matching the provided filters, in alphabetical order
+    # body_parts: list of body parts, user_id: creator's user ID, name_prefix: exercise name starts with (case insensitive)
+    def filter(self, body_parts=None, user_id=None, name_prefix=None):
+        if body_parts and len(body_parts) == 1:
+            records = self.by_body_part.get(body_parts[0], [])
+        elif body_parts:
+            body_parts = set(body_parts)
+            records = [record for record in self.records if record.body_part in body_parts]
+        else:
+            records = self.records
+        if user_id is not None:
+            records = [record for record in records if record.user_id == user_id]
+        if name_prefix:
+            name_prefix = name_prefix.lower()
+            records = [record for record in records if record.exercise_name.lower().startswith(name_prefix)]
+        return records
+
+    # Function to search the snapshot's exercises (see ExerciseSearchIndex). Returns up to limit records in ranked order.
+    def search(self, query, limit):
+        return self.search_index.search(query, limit)
+
+
+# In-memory exercise catalog (optional, enabled with EXERCISE_CATALOG_ENABLED). Exercises are small, read-mostly reference data, so each worker process keeps a copy of
+# every exercise (with its creator's username) and serves exercise reads from it: exercise lists, details and searches, the exercise names shown in routine exercises
+# and exercise existence checks.
+# - The catalog is loaded on first use and reloaded when its version (catalog_versions table) changes. The version is checked at most every
+#   EXERCISE_CATALOG_CHECK_INTERVAL seconds, so changes made by other worker processes are seen within that interval.
+# - Routes which change exercises (or usernames shown in exercises) call bump_version() before committing and invalidate() after committing,
+#   so the worker which made the change sees it on its next read.
+class ExerciseCatalog:
+    def __init__(self, app=None):
+        self.enabled = False
+        self.snapshot = None
+        # Time (time.monotonic) of the next version check
+        self.next_check = 0
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("EXERCISE_CATALOG_ENABLED", True)
+        app.config.setdefault("EXERCISE_CATALOG_CHECK_INTERVAL", 1.0)
+        app.extensions["exercise_catalog"] = self
+        self.enabled = app.config["EXERCISE_CATALOG_ENABLED"]
+        self.check_interval = app.config["EXERCISE_CATALOG_CHECK_INTERVAL"]
+
+    # Function to fetch the current version of the catalog from the database (0 if it has never been changed)
+    def current_version(self):
+        return db.session.scalar(db.select(catalog_version("exercises")))
+
+    # Function to load every exercise (and its creator's username) in a single query. version: the current version (fetched if not provided)
+    def load(self, version=None):
+        if version is None:
+            version = self.current_version()
+        stmt = db.select(
+            Exercise.id, Exercise.exercise_name, Exercise.description, Exercise.body_part, Exercise.user_id, Exercise.last_updated, User.username
+        ).join(User, Exercise.user_id == User.id)
+        records = [
+            ExerciseRecord(row.id, row.exercise_name, row.description, row.body_part, row.user_id, ExerciseUser(row.user_id, row.username), row.last_updated)
+            for row in db.session.execute(stmt)
+        ]
+        return CatalogSnapshot(version, records)
+
+    # Function to fetch the current snapshot (loading or reloading it if required). Returns None if the catalog is disabled.
+    def get_snapshot(self):
+        if not self.enabled:
+            return None
+        if self.snapshot is not None and time.monotonic() < self.next_check:
+            return self.snapshot
+        with self.lock:
+            # Another request may have checked the version while this request waited for the lock
+            if self.snapshot is None or time.monotonic() >= self.next_check:
+                version = self.current_version()
+                if self.snapshot is None or version != self.snapshot.version:
+                    self.snapshot = self.load(version)
+                self.next_check = time.monotonic() + self.check_interval
+            return self.snapshot
+
+    # Function to record a change to the catalog's data in the current transaction (call before committing)
+    def bump_version(self):
+        bump_catalog_version("exercises")
+
+    # Function to check the version on the next read (call after committing a change)
+    def invalidate(self):
+        self.next_check = 0
+
+    # Function to fetch an exercise record by ID. Returns None if the exercise is not in the catalog (or the catalog is disabled).
+    def get(self, exercise_id):
+        snapshot = self.get_snapshot()
+        if snapshot is None:
+            return None
+        return snapshot.by_id.get(exercise_id)
+
+    # Function to fetch the ID of the exercise with the provided name. Returns None if there is no such exercise in the catalog (or the catalog is disabled).
+    def find_name(self, exercise_name):
+        snapshot = self.get_snapshot()
+        if snapshot is None:
+            return None
+        return snapshot.by_name.get(exercise_name)
+
+
+# Create an instance of the exercise catalog (initialised with the flask app in main.py)
+exercise_catalog = ExerciseCatalog()
@@ -0,0 +1,165 @@
+# Import gzip and zlib for gzip compression (standard library, always available)
+import gzip
+import zlib
+
+# Import request to negotiate the encoding from the Accept-Encoding header
+from flask import request
+
+# Import optional compression libraries. Encodings whose library is not installed are not offered.
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+# Streaming compressor adapters. Each provides compress(data) -> bytes and flush() -> bytes (remaining compressed data).
+class GzipStream:
+    def __init__(self, level):
+        # wbits = 16 + MAX_WBITS produces a gzip header and trailer
+        self.compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def flush(self):
+        return self.compressor.flush()
+
+
+class BrotliStream:
+    def __init__(self, level):
+        self.compressor = brotli.Compressor(quality=level)
+
+    def compress(self, data):
+        return self.compressor.process(data)
+
+    def flush(self):
+        return self.compressor.finish()
+
+
+class ZstdStream:
+    def __init__(self, level):
+        self.compressor = zstandard.ZstdCompressor(level=level).compressobj()
+
+    def compress(self, data):
+        return self.compressor.compress(data)
+
+    def flush(self):
+        return self.compressor.flush()
+
+
+# Function to compress a complete body with the provided encoding and level
+def compress_body(encoding, body, level):
+    if encoding == "br":
+        return brotli.compress(body, quality=level)
+    if encoding == "zstd":
+        return zstandard.ZstdCompressor(level=level).compress(body)
+    # mtime=0 so the same body always produces the same compressed bytes
+    return gzip.compress(body, compresslevel=level, mtime=0)
+
+
+# Function to compress a streamed body chunk by chunk
+def compress_stream(encoding, chunks, level):
+    stream = {"br": BrotliStream, "zstd": ZstdStream}.get(encoding, GzipStream)(level)
+    for chunk in chunks:
+        data = stream.compress(chunk)
+        if data:
+            yield data
+    yield stream.flush()
+
+
+# Response compression extension. Compresses responses after each request when the client accepts a supported encoding:
+# - Encodings in order of preference: br (brotli), zstd (zstandard), gzip. br and zstd are only offered if their library is installed.
+#   COMPRESS_LEVELS sets the level for each encoding (defaults favour speed, as responses are compressed per request).
+# - Only responses with a COMPRESS_MIMETYPES mimetype of at least COMPRESS_MIN_SIZE bytes are compressed (compressing small bodies costs more CPU than it saves).
+# - Streamed responses are compressed chunk by chunk as they are sent (their size is not known in advance, so they are always compressed).
+# - Precompressed variants: a response may carry a 'compressed_variants' dictionary (encoding -> compressed body), e.g. a response served from a cache.
+#   An existing variant is sent as is. Otherwise the body is compressed and stored in the dictionary, so each cached body is only compressed once per encoding.
+# Compressed responses use a weak ETag (the compressed bytes differ from the uncompressed representation) and include "Vary: Accept-Encoding". So do 304 (not
+# modified) responses to clients with a compressed copy.
+class Compressor:
+    def __init__(self, app=None):
+        self.encodings = []
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("COMPRESS_ENABLED", True)
+        app.config.setdefault("COMPRESS_MIN_SIZE", 500)
+        app.config.setdefault("COMPRESS_MIMETYPES", ["application/json", "application/msgpack"])
+        app.config.setdefault("COMPRESS_LEVELS", {"br": 4, "zstd": 3, "gzip": 6})
+        app.extensions["compressor"] = self
+
+        self.min_size = app.config["COMPRESS_MIN_SIZE"]
+        self.mimetypes = set(app.config["COMPRESS_MIMETYPES"])
+        self.levels = app.config["COMPRESS_LEVELS"]
+        # Supported encodings in order of preference
+        self.encodings = [encoding for encoding, available in (("br", brotli), ("zstd", zstandard), ("gzip", gzip)) if available is not None]
+
+        if app.config["COMPRESS_ENABLED"]:
+            app.after_request(self.compress_response)
+
+    # Function to choose the encoding for the request (None if the client does not accept any supported encoding)
+    def choose_encoding(self):
+        return request.accept_encodings.best_match(self.encodings)
+
+    # Function to check whether the client's copy of a 304 (not modified) response was compressed, so the 304 carries the same (weak) ETag.
+    # The client's copy matched If-None-Match: it was compressed unless it matched with a strong ETag. Otherwise (If-Modified-Since), the response would be
+    # compressed if the client accepts a supported encoding.
+    def weak_not_modified(self, etag):
+        if request.if_none_match:
+            return not request.if_none_match.contains(etag)
+        return self.choose_encoding() is not None
+
+    # Runs after every request
+    def compress_response(self, response):
+        # A 304 has no body to compress, but its headers must match the client's copy: the ETag is weak if the copy was compressed (see below)
+        if response.status_code == 304:
+            response.vary.add("Accept-Encoding")
+            etag, weak = response.get_etag()
+            if etag and not weak and self.weak_not_modified(etag):
+                response.set_etag(etag, weak=True)
+            return response
+
+        # Skip responses which are not compressible or are already encoded (e.g. files, errors without a body)
+        if (response.mimetype not in self.mimetypes or response.status_code < 200 or response.status_code == 204
+                or response.direct_passthrough or "Content-Encoding" in response.headers):
+            return response
+
+        # The response depends on the Accept-Encoding header, whether or not it is compressed
+        response.vary.add("Accept-Encoding")
+
+        encoding = self.choose_encoding()
+        if encoding is None:
+            return response
+        level = self.levels.get(encoding)
+
+        # Streamed responses are compressed as they are sent
+        if response.is_streamed:
+            response.response = compress_stream(encoding, response.iter_encoded(), level)
+            response.headers.pop("Content-Length", None)
+        else:
+            variants = getattr(response, "compressed_variants", None)
+            if variants is not None and encoding in variants:
+                # Use the stored compressed body
+                body = variants[encoding]
+            else:
+                data = response.get_data()
+                if len(data) < self.min_size:
+                    return response
+                body = compress_body(encoding, data, level)
+                # Store the compressed body alongside the cached response
+                if variants is not None:
+                    variants[encoding] = body
+            response.set_data(body)
+
+        response.headers["Content-Encoding"] = encoding
+        # Weaken the ETag (if any) as the bytes sent no longer match the uncompressed representation
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
@@ -0,0 +1,77 @@
+# Import hashlib to build ETags from validator values and timezone to compare Last-Modified dates
+import hashlib
+from datetime import timezone
+
+# Import current_app to create 304 responses, g to store the validators of the current request and request to read conditional headers
+from flask import current_app, g, request
+
+
+# Function to check a conditional GET request (If-None-Match / If-Modified-Since) against the current validators of the requested resource.
+# values: cheap values which change whenever the response body would change (e.g. number of rows, most recent last_updated, likes), fetched without loading
+#         or serialising the resource. The ETag also includes the path, query parameters and Accept header, as they change the body for the same data.
+# last_modified: when the resource was last updated (only for single resources: deleting a row from a list does not change the list's most recent update)
+# Returns a 304 (not modified) response if the client's copy is still up to date, otherwise None. Either way, the validators are added to the response by ConditionalGet.
+def check_not_modified(*values, last_modified=None):
+    parts = (request.path, sorted(request.args.items(multi=True)), request.headers.get("Accept", ""), values)
+    etag = hashlib.sha1(repr(parts).encode("utf-8")).hexdigest()
+    if last_modified is not None:
+        # Timestamps are stored without a timezone and treated as UTC. HTTP dates have a precision of one second.
+        last_modified = last_modified.replace(microsecond=0, tzinfo=timezone.utc)
+    g.validators = (etag, last_modified)
+    # The values are kept so a cached response can be revalidated without querying them again (see response_cache.py)
+    g.validator_values = values
+
+    # If-None-Match takes priority over If-Modified-Since. Weak comparison is used as compressed responses have weak ETags.
+    if request.if_none_match:
+        matched = request.if_none_match.contains_weak(etag)
+    elif last_modified is not None and request.if_modified_since:
+        matched = last_modified <= request.if_modified_since
+    else:
+        matched = False
+
+    if matched:
+        return current_app.response_class(status=304)
+    return None
+
+
+# Conditional GET extension. Adds the validators set by check_not_modified to the response (ETag and Last-Modified) along with caching headers:
+# - Responses to requests with an Authorization header depend on the user, so they are "private, no-cache" (browsers may store them but must revalidate, shared caches must not store them)
+# - Other responses are public. A shared cache in front of the API may store them for CACHE_SHARED_MAX_AGE seconds (browsers for CACHE_MAX_AGE seconds), then revalidates them with the ETag.
+#   When both are 0 (default) every request is revalidated ("public, no-cache"), which is cheap when the response has not changed (304, no body).
+# "Vary: Authorization" is always included so caches never serve one user's response to another.
+class ConditionalGet:
+    def __init__(self, app=None):
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("CACHE_MAX_AGE", 0)
+        app.config.setdefault("CACHE_SHARED_MAX_AGE", 0)
+        app.extensions["conditional_get"] = self
+        self.max_age = app.config["CACHE_MAX_AGE"]
+        self.shared_max_age = app.config["CACHE_SHARED_MAX_AGE"]
+        app.after_request(self.add_headers)
+
+    # Runs after every request
+    def add_headers(self, response):
+        validators = g.get("validators")
+        if validators is None or response.status_code not in (200, 304):
+            return response
+
+        etag, last_modified = validators
+        response.set_etag(etag)
+        if last_modified is not None:
+            response.last_modified = last_modified
+
+        response.vary.add("Authorization")
+        if "Authorization" in request.headers:
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+        else:
+            response.cache_control.public = True
+            if self.max_age or self.shared_max_age:
+                response.cache_control.max_age = self.max_age
+                response.cache_control.s_maxage = self.shared_max_age
+            else:
+                response.cache_control.no_cache = True
+        return response
@@ -2,14 +2,24 @@
 from datetime import timedelta
 
 # Import Blueprint & request for better organisation and route management
-from flask import Blueprint, request
+from flask import Blueprint, request, current_app
 
 # Import models and schemas required for object creation and to serialise/deserialise data
 from models.user import User, user_schema, UserSchema
 from models.exercise import Exercise
-from models.routine import Routine
-# Import bcrypt and SQLAlchemy for password hashing and database functionality
-from init import bcrypt, db
+from models.routine import Routine, increment_likes
+from models.like import Like
+# Import password hasher (bcrypt on a bounded thread pool) and SQLAlchemy for password hashing and database functionality
+from init import hasher, db, response_cache
+
+# Import refresh_documents to rebuild routine documents which show a user's username, and the name of the version bumped when they are rebuilt
+from documents import refresh_documents, ROUTINE_OWNERS_VERSION
+
+# Import the in-memory exercise catalog (shows the username of each exercise's creator) and bump_catalog_version to bump the routine owners version
+from catalog import exercise_catalog, bump_catalog_version
+
+# Import the like buffer to discard a user's buffered likes when the user is deleted
+from like_buffer import like_buffer
 
 # Import validation and authentication libraries for error handling, authentication and JWT management
 from sqlalchemy.exc import IntegrityError
@@ -19,7 +29,9 @@ from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identi
 # Import from utils.py:
 # auth_as_admin_or_owner: decorator which checks if logged in user has authorisation to access the decorated route
 # ADMIN_EMAIL: used for abstracting admin email
-from utils import auth_as_admin_or_owner, ADMIN_EMAIL
+# user_is_admin: function which checks if logged in user is admin (uses the is_admin JWT claim on GET routes where available)
+# get_logged_user: function which fetches the logged in user (once per request)
+from utils import auth_as_admin_or_owner, ADMIN_EMAIL, user_is_admin, get_logged_user
 
 # Create blueprint named "auth". Also decorate with url_prefix for management of routes.
 auth_bp = Blueprint("auth", __name__, url_prefix="/auth")
@@ -68,14 +80,12 @@ def register_user():
             return {"error": "An admin request has been detected, please log in as admin and try again."}, 401
         else:
             # If logged in user != admin
-            check_log_stmt = db.select(User).filter_by(id=logged_in_user)
-            check_logged_user = db.session.scalar(check_log_stmt)
-            if not check_logged_user.is_admin:
+            if not user_is_admin():
                 # Return an error stating only admins can create another admin
                 return {"error": "Only Admins can register an admin account. User registration has been cancelled."}, 403
 
     # If the admin request = true and the logged in user is an admin, set admin_result as True. Else, revert back to default (false)        
-    if admin_request and check_logged_user.is_admin:
+    if admin_request and user_is_admin():
         admin_result = True 
     else:
         admin_result = False
@@ -91,7 +101,7 @@ def register_user():
     # Hash the password using bcrypt
     password = body_data.get("password")
     if password:
-        user.password = bcrypt.generate_password_hash(password).decode("utf-8")
+        user.password = hasher.generate_password_hash(password)
     # Add and commit to the DB
     db.session.add(user)
     db.session.commit()
@@ -108,9 +118,17 @@ def login_user():
     stmt = db.select(User).filter_by(email=body_data.get("email"))
     user = db.session.scalar(stmt)
     # If the user exists and the password is correct
-    if user and bcrypt.check_password_hash(user.password, body_data.get("password")):
+    if user and hasher.check_password_hash(user.password, body_data.get("password")):
+        # If the stored hash was created with a different cost to BCRYPT_LOG_ROUNDS, transparently rehash the password with the current cost
+        if hasher.needs_rehash(user.password):
+            user.password = hasher.generate_password_hash(body_data.get("password"))
+            db.session.commit()
+        # If enabled, include a signed is_admin claim in the token so read-only (GET) routes don't need to fetch the user from the database
+        claims = {}
+        if current_app.config.get("JWT_ADMIN_CLAIM"):
+            claims["is_admin"] = bool(user.is_admin)
         # create a JWT token (expires in 1 day)
-        token = create_access_token(identity=str(user.id), expires_delta=timedelta(days=1))
+        token = create_access_token(identity=str(user.id), expires_delta=timedelta(days=1), additional_claims=claims)
         # Then return a response to the user with their email address, admin status and JWT token
         return {"username": user.username, "email": user.email, "token": token, "is_admin": user.is_admin}
     # Else
@@ -138,19 +156,33 @@ def update_user():
         password = body_data.get("password")
 
         # fetch the user from the database by extracting the user's identity from the JWT token they passed in the header and finding the user ID it matches to in the database 
-        # SELECT * FROM user WHERE id = get_jwt_identity
-        stmt = db.select(User).filter_by(id=get_jwt_identity())
-        user = db.session.scalar(stmt)
+        # SELECT * FROM user WHERE id = get_jwt_identity (only fetched once per request)
+        user = get_logged_user()
+
+        # Check if the username is changing (usernames are shown in cached routine/exercise lists). An empty username keeps the current username.
+        username = body_data.get("username") or user.username
+        username_changed = username != user.username
 
         # update the fields as required
-        user.username = body_data.get("username") or user.username
+        user.username = username
         user.firstname = body_data.get("firstname") or user.firstname
         user.lastname = body_data.get("lastname") or user.lastname
         if password:
-            user.password = bcrypt.generate_password_hash(password).decode("utf-8")
+            user.password = hasher.generate_password_hash(password)
+
+        # Rebuild the documents of the user's routines if the username changed (shown in created_by), along with new routine owners and exercise catalog versions
+        # (the routines and exercises are not updated, so their validators only change with the versions)
+        if username_changed:
+            refresh_documents(Routine.user_id == user.id)
+            bump_catalog_version(ROUTINE_OWNERS_VERSION)
+            exercise_catalog.bump_version()
 
         # commit the changes to the database
         db.session.commit()
+        # Reload the exercise catalog and remove every cached list if the username changed
+        if username_changed:
+            exercise_catalog.invalidate()
+            response_cache.clear()
         # return a response to the user, acknowledging the changes
         return user_schema.dump(user)
     
@@ -168,8 +200,8 @@ def update_user():
 # /auth/users/<int:user_id> - DELETE - Delete user. UPON REQUEST, database will keep any public routines but delete private ones (default = delete all). Will also keep any exercises created by user by transferring ownership. This will keep data integrity and also allow users to still have access to these public routines
 @auth_bp.route("/users/<int:user_id>", methods=["DELETE"])
 @jwt_required() # Check if the user has a valid JWT token in the header of their request
-@auth_as_admin_or_owner # Validates if user_id in URL exists and if logged in user is admin or owner of resource
-def delete_user(user_id):
+@auth_as_admin_or_owner # Validates if user_id in URL exists and if logged in user is admin or owner of resource. Passes the fetched user to the route.
+def delete_user(user_id, user):
     # Grab data from body of JSON request (provide empty dictionary if body is empty)
     body_data = request.get_json(silent=True) or {}
 
@@ -186,36 +218,45 @@ def delete_user(user_id):
     if delete_public_routines is False:
         decision = "kept"
     
-    # Find & select user in database
-    stmt = db.select(User).filter_by(id=user_id)
-    user = db.session.scalar(stmt)
+    # Each of the below is a single set-based statement, regardless of how many routines/exercises/likes the user has
 
     # If user wants to leave their public routines on the database
     if not delete_public_routines:
-        # Select all routines which are created by the user and public
-        stmt = db.select(Routine).filter_by(user_id=user_id, public=True)
-        user_public_routines = db.session.scalars(stmt)
-        # For each of these routines, transfer user_id to DELETED_ACCOUNT_ID
-        for routine in user_public_routines:
-            routine.user_id = DELETED_ACCOUNT_ID
+        # Transfer user_id of all routines which are created by the user and public to DELETED_ACCOUNT_ID (returning the IDs of the transferred routines)
+        # UPDATE routines SET user_id = DELETED_ACCOUNT_ID WHERE user_id = user_id AND public = true RETURNING id
+        stmt = db.update(Routine).filter_by(user_id=user_id, public=True).values(user_id=DELETED_ACCOUNT_ID).returning(Routine.id)
+        transferred_ids = db.session.scalars(stmt).all()
+        # Rebuild the documents of the transferred routines (now created by the deleted account), along with a new routine owners version
+        if transferred_ids:
+            refresh_documents(Routine.id.in_(transferred_ids))
+            bump_catalog_version(ROUTINE_OWNERS_VERSION)
 
-    # Select all/remainder user routines
-    stmt = db.select(Routine).filter_by(user_id=user_id)
-    remaining_routines = db.session.scalars(stmt).all()
+    # Discard the user's buffered likes/unlikes (only likes stored in the database count towards likes counts, and they are removed below)
+    if like_buffer.enabled:
+        like_buffer.discard_user(user_id)
 
-    for routine in remaining_routines:
-        db.session.delete(routine)
+    # The user's likes are deleted alongside the user, so decrement the likes count of every routine the user has liked
+    liked_routine_ids = db.select(Like.routine_id).filter_by(user_id=user_id)
+    db.session.execute(increment_likes(liked_routine_ids, -1))
 
-    # Transfer ownership of any user created exercises to the "DELETED_ACCOUNT" user_id
-    stmt = db.select(Exercise).filter_by(user_id=user_id)
-    user_exercises = db.session.scalars(stmt).all()
+    # Delete all/remainder user routines. Associated routine exercises and likes are deleted by the database (ON DELETE CASCADE)
+    stmt = db.delete(Routine).filter_by(user_id=user_id)
+    db.session.execute(stmt)
 
-    for exercise in user_exercises:
-        exercise.user_id = DELETED_ACCOUNT_ID
+    # Transfer ownership of any user created exercises to the "DELETED_ACCOUNT" user_id
+    stmt = db.update(Exercise).filter_by(user_id=user_id).values(user_id=DELETED_ACCOUNT_ID)
+    # Bump the exercise catalog version if any exercises were transferred
+    if db.session.execute(stmt).rowcount:
+        exercise_catalog.bump_version()
 
-    # Delete user and commit changes to database
-    db.session.delete(user)
+    # Delete user (user's likes are deleted by the database via ON DELETE CASCADE) and commit changes to database
+    stmt = db.delete(User).filter_by(id=user_id)
+    db.session.execute(stmt)
     db.session.commit()
 
+    # Reload the exercise catalog and remove every cached list (the user's routines have been deleted or transferred and their exercises transferred)
+    exercise_catalog.invalidate()
+    response_cache.clear()
+
     # return an acknowledgement message
     return {"message": f"User with id {user_id} has been deleted. We have {decision} your public routines. If you have any questions, please email us on '{ADMIN_EMAIL}'. We hope you come back soon!"}, 200
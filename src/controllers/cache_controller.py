@@ -0,0 +1,39 @@
+# Import Blueprint for better organisation and route management
+from flask import Blueprint
+
+# Import the response cache to report and clear cached responses
+from init import response_cache
+
+# Import from utils.py:
+# user_is_admin: function which checks if logged in user is admin (uses the is_admin JWT claim on GET routes where available)
+from utils import user_is_admin
+
+# Import authentication libraries
+# jwt_required: decorator which checks if user logged in
+from flask_jwt_extended import jwt_required
+
+# Create a blueprint named "cache". Also decorate with url_prefix for management of routes.
+cache_bp = Blueprint("cache", __name__, url_prefix="/cache")
+
+
+# /cache/stats - GET - View the response cache hit/miss counters, in total and for each route (admin only). Used to tune RESPONSE_CACHE_TTL / RESPONSE_CACHE_MAX_ENTRIES.
+@cache_bp.route("/stats", methods=["GET"])
+@jwt_required()
+def get_cache_stats():
+    # If user is not admin, return error
+    if not user_is_admin():
+        return {"error": "Only admin can view the response cache statistics."}, 403
+    # Return the response cache statistics
+    return response_cache.stats(), 200
+
+
+# /cache - DELETE - Remove every cached response (admin only)
+@cache_bp.route("/", methods=["DELETE"])
+@jwt_required()
+def clear_cache():
+    # If user is not admin, return error
+    if not user_is_admin():
+        return {"error": "Only admin can clear the response cache."}, 403
+    # Remove every cached response
+    response_cache.clear()
+    return {"message": "The response cache has been cleared."}, 200
@@ -1,6 +1,9 @@
 # Import Blueprint class for better organisation and route management
 from flask import Blueprint
 
+# Import click to add options to commands
+import click
+
 # Import sqlalchemy and bcrypt (password hashing for creating user accounts)
 from init import db, bcrypt
 
@@ -11,6 +14,17 @@ from models.routine import Routine
 from models.routine_exercise import RoutineExercise
 from models.like import Like
 
+# Import schema migrations (applying migrations to existing databases and reporting index usage)
+from migrations import MigrationError, run_migrations, migration_status, stamp_migrations, explain_indexes
+
+# Import refresh_documents to build the denormalised routine documents (see documents.py)
+from documents import refresh_documents
+
+# Import the sort keys and page statement used by the list routes to report which indexes their queries use
+from controllers.routines_controller import ROUTINE_SORT_KEYS
+from controllers.exercises_controller import EXERCISE_SORT_KEYS
+from pagination import page_statement, DEFAULT_PAGE_SIZE
+
 # Create blueprint for database commands
 db_commands = Blueprint("db", __name__)
 
@@ -18,6 +32,8 @@ db_commands = Blueprint("db", __name__)
 @db_commands.cli.command("create")
 def create_tables():
     db.create_all()
+    # New tables already include every migration, so record them as applied
+    stamp_migrations()
     print("Tables created!")
 
 # Seed values into database for testing purposes
@@ -483,12 +499,101 @@ def seed_tables():
     # Add list of like instances to session
     db.session.add_all(likes)
 
+    # Calculate the denormalised likes count for each routine from the seeded likes
+    recount_likes()
+
+    # Build the denormalised document of each routine
+    refresh_documents()
+
     # Commit session to database
     db.session.commit()
 
     # Provide acknowledgement that tables have been seeded
     print("Tables seeded!")
 
+# Function to recalculate the denormalised likes_count of every routine from the Like table in a single set-based UPDATE statement
+# UPDATE routines SET likes_count = (SELECT COUNT(*) FROM likes WHERE likes.routine_id = routines.id)
+def recount_likes():
+    count_stmt = db.select(db.func.count(Like.id)).where(Like.routine_id == Routine.id).scalar_subquery()
+    stmt = db.update(Routine).values(
+        likes_count=count_stmt,
+        last_updated=Routine.last_updated # Recounting likes should not count as the routine being updated
+    ).execution_options(synchronize_session=False)
+    return db.session.execute(stmt).rowcount
+
+# Repair the likes_count of every routine (e.g. after manual changes to the likes table)
+@db_commands.cli.command("recount-likes")
+def recount_likes_command():
+    updated = recount_likes()
+    db.session.commit()
+    print(f"Likes recounted for {updated} routines.")
+
+# Rebuild the denormalised document of every routine (e.g. after migration 0006, or after manual changes to the routine/exercise/user tables)
+@db_commands.cli.command("rebuild-documents")
+def rebuild_documents_command():
+    rebuilt = refresh_documents()
+    db.session.commit()
+    print(f"Documents rebuilt for {rebuilt} routines.")
+
+# Apply any pending schema migrations to an existing database (see migrations.py)
+@db_commands.cli.command("migrate")
+def migrate_tables():
+    try:
+        applied = 0
+        for version, description in run_migrations():
+            print(f"Applied migration {version}: {description}")
+            applied += 1
+    except MigrationError as err:
+        print(f"Migration failed: {err}")
+        return
+    print(f"Database is up to date ({applied} migrations applied).")
+
+# List all schema migrations and whether they have been applied
+@db_commands.cli.command("migrate-status")
+def migrate_status():
+    for version, description, applied in migration_status():
+        print(f"{version} [{'applied' if applied else 'pending'}] {description}")
+
+# Queries run by each list route (first page with the default page size, using example filter values) for the index report
+def endpoint_queries():
+    routines = db.select(Routine)
+    exercises = db.select(Exercise)
+    return [
+        ("GET /routines (not logged in)", page_statement(routines.filter_by(public=True), ROUTINE_SORT_KEYS["recent"], DEFAULT_PAGE_SIZE)),
+        ("GET /routines (logged in)", page_statement(routines.filter((Routine.public == True) | (Routine.user_id == 1)), ROUTINE_SORT_KEYS["recent"], DEFAULT_PAGE_SIZE)),
+        ("GET /routines (admin)", page_statement(routines, ROUTINE_SORT_KEYS["recent"], DEFAULT_PAGE_SIZE)),
+        ("GET /routines/<target>", page_statement(routines.filter_by(target="Legs", public=True), ROUTINE_SORT_KEYS[None], DEFAULT_PAGE_SIZE)),
+        ("GET /routines/<target>?sort=popular", page_statement(routines.filter_by(target="Legs", public=True), ROUTINE_SORT_KEYS["popular"], DEFAULT_PAGE_SIZE)),
+        ("GET /routines/<target>?sort=recent", page_statement(routines.filter_by(target="Legs", public=True), ROUTINE_SORT_KEYS["recent"], DEFAULT_PAGE_SIZE)),
+        ("GET /routines/<target>?sort=oldest", page_statement(routines.filter_by(target="Legs", public=True), ROUTINE_SORT_KEYS["oldest"], DEFAULT_PAGE_SIZE)),
+        ("GET /routines/liked", page_statement(routines.join(Like, Routine.id == Like.routine_id).filter(Like.user_id == 1), [(Like.created, True), (Like.id, True)], DEFAULT_PAGE_SIZE)),
+        ("Routine exercises of a page of routines", db.select(RoutineExercise).filter(RoutineExercise.routine_id.in_([1, 2, 3]))),
+        ("GET /exercises", page_statement(exercises, EXERCISE_SORT_KEYS, DEFAULT_PAGE_SIZE)),
+        ("GET /exercises?body_part=<body_part>", page_statement(exercises.filter(Exercise.body_part.in_(["Chest"])), EXERCISE_SORT_KEYS, DEFAULT_PAGE_SIZE)),
+        ("GET /exercises?user_id=<user_id>", page_statement(exercises.filter_by(user_id=1), EXERCISE_SORT_KEYS, DEFAULT_PAGE_SIZE)),
+        ("GET /exercises?name=<prefix>", page_statement(exercises.filter(Exercise.exercise_name.istartswith("bench")), EXERCISE_SORT_KEYS, DEFAULT_PAGE_SIZE)),
+        ("DELETE /exercises/<exercise_id> (exercise in use check)", db.select(RoutineExercise).filter_by(exercise_id=1)),
+    ]
+
+# Report which indexes the database uses for the query of each list route (PostgreSQL only)
+# Small tables (e.g. seeded data) are often read with a sequential scan regardless of indexes. --no-seqscan discourages sequential scans to show which index would be used on a larger table.
+@db_commands.cli.command("index-report")
+@click.option("--no-seqscan", is_flag=True, help="Discourage sequential scans to show which indexes would be used on larger tables.")
+def index_report(no_seqscan):
+    if db.engine.dialect.name != "postgresql":
+        print(f"The index report requires PostgreSQL (current database: {db.engine.dialect.name}).")
+        return
+    with db.engine.connect() as connection:
+        if no_seqscan:
+            connection.exec_driver_sql("SET LOCAL enable_seqscan = off")
+        for endpoint, stmt in endpoint_queries():
+            indexes, seq_scans = explain_indexes(connection, stmt)
+            print(endpoint)
+            print(f"    indexes: {', '.join(indexes) or 'none'}")
+            if seq_scans:
+                print(f"    sequential scans: {', '.join(seq_scans)}")
+        connection.rollback()
+
 # Drop all tables and data from database
 @db_commands.cli.command("drop")
 def drop_tables():
@@ -2,12 +2,13 @@
 from flask import Blueprint, request
 
 # Import models and schemas required for object creation and to serialise/deserialise data
-from models.exercise import Exercise, exercise_schema, exercises_schema, VALID_BODYPARTS # VALID_BODYPARTS for validation of user entries
+from models.exercise import Exercise, ExerciseSchema, exercise_schema, VALID_BODYPARTS, exercise_name_order # VALID_BODYPARTS for validation of user entries
 from models.user import User
 from models.routine_exercise import RoutineExercise
+from models.routine import Routine, routine_list_tags
 
-# Import SQLAlchemy database for database operations
-from init import db
+# Import SQLAlchemy database for database operations and the response cache for caching the exercise catalog
+from init import db, response_cache
 
 # Import from utils.py:
 # auth_as_admin_or_owner: decorator which checks if logged in user has authorisation to access the decorated route
@@ -15,6 +16,33 @@ from init import db
 # user_is_admin: function which checks if logged in user is admin
 from utils import auth_as_admin_or_owner, ADMIN_EMAIL, user_is_admin
 
+# Import loader option profiles to eager load the relationships needed for serialisation (avoids N+1 queries)
+from loaders import exercise_options
+
+# Import sparse fieldset helpers to serialise/load only the fields requested with ?fields=
+from fieldsets import get_fieldset, fieldset_schema
+
+# Import serialize to dump responses with compiled serializers (faster than marshmallow's dump for read routes)
+from serializers import serialize
+
+# Import check_not_modified to answer conditional GET requests (ETag / Last-Modified) with 304 (not modified)
+from conditional import check_not_modified
+
+# Import streaming helpers to stream full lists (?stream=true, admin only)
+from streaming import wants_stream, stream_allowed, stream_response
+
+# Import refresh_documents to rebuild the documents of routines which include a changed exercise
+from documents import refresh_documents
+
+# Import keyset pagination helpers to return exercise lists one page at a time
+from pagination import get_page_args, get_limit, paginate, paginate_sorted
+
+# Import the in-memory exercise catalog to serve exercise reads without querying the database, and its version for list validators
+from catalog import exercise_catalog, exercise_sort_values, catalog_version
+
+# Import the database search and the longest search terms accepted for exercise search
+from search import search_database, MAX_QUERY_LENGTH
+
 # Import error handling libraries
 from sqlalchemy.exc import IntegrityError
 from psycopg2 import errorcodes
@@ -27,20 +55,105 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 # Create a blueprint named "exercises". Also decorate with url_prefix for management of routes.
 exercises_bp = Blueprint("exercises", __name__, url_prefix="/exercises")
 
+# Keyset pagination sort keys for exercise lists (alphabetical order, see exercise_name_order). The exercise ID is included to break ties so the order is stable between pages.
+EXERCISE_SORT_KEYS = [(exercise_name_order.label("exercise_name_order"), False), (Exercise.id, False)]
+
+
+# Function to fetch a single page of exercises for the provided statement (page size and cursor are fetched from the 'limit' and 'cursor' query parameters)
+# Only the fields requested with ?fields= are loaded and serialised.
+# records: the matching exercises from the exercise catalog (see catalog.py). When provided, the page is taken from the records instead of querying the database.
+# Returns the serialised page of exercises, the cursor for the next page and the cursor used to fetch this page
+def paginate_exercises(stmt, records=None):
+    # Fetch the fields requested by the user (all fields by default)
+    fields = get_fieldset(ExerciseSchema)
+    # Fetch page size and cursor from query parameters (e.g. ?limit=20&cursor=<next_cursor>)
+    limit, cursor = get_page_args()
+    # If the exercises were fetched from the exercise catalog, take a single page from the records (already in alphabetical order)
+    if records is not None:
+        exercises, next_cursor = paginate_sorted(records, EXERCISE_SORT_KEYS, limit, cursor, exercise_sort_values)
+    # Else, eager load relationships required for serialisation and execute query for a single page (alphabetical order)
+    else:
+        exercises, next_cursor = paginate(stmt.options(*exercise_options(fields)), EXERCISE_SORT_KEYS, limit, cursor)
+    return serialize(fieldset_schema(ExerciseSchema, fields, many=True), exercises), next_cursor, cursor
+
+
+# Function to check whether the client's copy of a list of exercises is still up to date. Validators (number of exercises, most recent update and the exercise catalog
+# version) are fetched with a single aggregate query (or from the exercise catalog snapshot the records were taken from, when provided), without loading or serialising any
+# exercises. Returns a 304 (not modified) response or None.
+# The catalog version is bumped by changes which don't update an exercise's last_updated, e.g. a change of the username shown in created_by (see bump_version in catalog.py).
+def exercise_list_not_modified(stmt, snapshot=None, records=None):
+    if snapshot is not None:
+        count, last_updated, version = len(records), max((record.last_updated for record in records), default=None), snapshot.version
+    else:
+        count, last_updated, version = db.session.execute(stmt.with_only_columns(
+            db.func.count(Exercise.id), db.func.max(Exercise.last_updated), catalog_version("exercises")).order_by(None)).one()
+    return check_not_modified(count, last_updated, version)
+
 
-# /exercises - GET - Fetch all exercises 
+# /exercises - GET - Fetch all exercises (alphabetical order, paginated). Filters can be combined using query parameters:
+# ?body_part=Chest,Back (one or more body parts) &user_id=<id> (creator) &name=<prefix> (exercise name starts with, case insensitive)
+# Admin can stream every matching exercise in a single response with ?stream=true (not paginated)
 @exercises_bp.route("/", methods=["GET"])
+@response_cache.cached("exercises", shared=True) # Same response for every user, removed from the cache when any exercise changes
 def get_all_exercises():
-    # Fetch all exercises in database (order in alphabetical order)
-    stmt = db.select(Exercise).order_by(Exercise.exercise_name.asc())
-
-    # Execute statement & return as list
-    exercises = db.session.scalars(stmt).all()
+    # INITIAL STATEMENT - Fetch all exercises in database
+    stmt = db.select(Exercise)
+
+    # Fetch body parts from query parameter/s if provided (accepts ?body_part=Chest,Back and/or ?body_part=Chest&body_part=Back)
+    body_parts = []
+    for value in request.args.getlist("body_part"):
+        for body_part in value.split(","):
+            # Capitalise input to match VALID_BODYPARTS for ease of entry
+            if body_part.strip():
+                body_parts.append(body_part.strip().capitalize())
+
+    # If body parts were provided
+    if body_parts:
+        # Validate each body part against VALID_BODYPARTS
+        invalid_body_parts = [body_part for body_part in body_parts if body_part not in VALID_BODYPARTS]
+        if invalid_body_parts:
+            return {"error": f"'{', '.join(invalid_body_parts)}' is an invalid body_part. Please search by {', '.join(VALID_BODYPARTS)}"}, 400
+        # Include body part filter in INITIAL STATEMENT
+        stmt = stmt.filter(Exercise.body_part.in_(body_parts))
+
+    # Fetch creator's user ID from query parameter if provided
+    creator_id = request.args.get("user_id")
+    if creator_id:
+        # Validate that the user ID is a number
+        if not creator_id.isdigit():
+            return {"error": f"'{creator_id}' is an invalid user_id. Please provide a user ID number."}, 400
+        # Include creator filter in INITIAL STATEMENT
+        stmt = stmt.filter_by(user_id=int(creator_id))
+
+    # Fetch name prefix from query parameter if provided
+    name = request.args.get("name")
+    if name:
+        # Include name prefix filter in INITIAL STATEMENT (wildcard characters entered by user are escaped)
+        stmt = stmt.filter(Exercise.exercise_name.istartswith(name, autoescape=True))
+
+    # Fetch the matching exercises from the exercise catalog (None if the catalog is disabled, the INITIAL STATEMENT is used instead)
+    snapshot = exercise_catalog.get_snapshot()
+    records = snapshot.filter(body_parts=body_parts, user_id=int(creator_id) if creator_id else None, name_prefix=name) if snapshot else None
+
+    # If the client's copy of the list is still up to date, return 304 (not modified)
+    not_modified = exercise_list_not_modified(stmt, snapshot, records)
+    if not_modified:
+        return not_modified
+
+    # If a streamed response was requested (?stream=true), stream every matching exercise instead of a single page (admin only)
+    if wants_stream():
+        if not stream_allowed():
+            return {"error": "Only admin can stream the full list of exercises. Please use pagination instead."}, 403
+        fields = get_fieldset(ExerciseSchema)
+        return stream_response(stmt.options(*exercise_options(fields)), EXERCISE_SORT_KEYS, fieldset_schema(ExerciseSchema, fields, many=True), "exercises")
+
+    # Execute statement for a single page (alphabetical order)
+    exercises, next_cursor, cursor = paginate_exercises(stmt, records)
 
     # Check if any exercises exist
-    if exercises:
-        # Return list of exercises
-        return exercises_schema.dump(exercises), 200
+    if exercises or cursor:
+        # Return page of exercises, along with the cursor for the next page
+        return {"exercises": exercises, "next_cursor": next_cursor}, 200
     # Else:
     else:
         # Return error message advising no exercises available
@@ -48,28 +161,100 @@ def get_all_exercises():
 
 # /exercises/body-part/<body_part> - GET - Extends fetch all exercises functionality by allowing search via a filter for a specific body_part
 @exercises_bp.route("/body-part/<body_part>", methods=["GET"]) 
+@response_cache.cached("exercises", shared=True) # Same response for every user, removed from the cache when any exercise changes
 def get_body_part_exercises(body_part):
-    # Fetch all exercises from database with filter for specified body_part mentioned in URL. Capitalise the first letter when filtering to match VALID_BODYPARTS, then order in alphabetical order
-    stmt = db.select(Exercise).filter_by(body_part=body_part.capitalize()).order_by(Exercise.exercise_name.asc())
+    # Fetch all exercises from database with filter for specified body_part mentioned in URL. Capitalise the first letter when filtering to match VALID_BODYPARTS
+    stmt = db.select(Exercise).filter_by(body_part=body_part.capitalize())
+    # Fetch the same exercises from the exercise catalog (None if the catalog is disabled)
+    snapshot = exercise_catalog.get_snapshot()
+    records = snapshot.filter(body_parts=[body_part.capitalize()]) if snapshot else None
 
-    # Execute the query and return as a list
-    exercises = db.session.scalars(stmt).all()
+    # If the client's copy of the list is still up to date, return 304 (not modified)
+    not_modified = exercise_list_not_modified(stmt, snapshot, records)
+    if not_modified:
+        return not_modified
+
+    # Execute the query for a single page (alphabetical order)
+    exercises, next_cursor, cursor = paginate_exercises(stmt, records)
 
     # Check if any exercises exist
-    if exercises:
-        # If exists, return exercises to user
-        return exercises_schema.dump(exercises), 200
+    if exercises or cursor:
+        # If exists, return page of exercises to user, along with the cursor for the next page
+        return {"exercises": exercises, "next_cursor": next_cursor}, 200
     # Else:
     else:
         # Return error message
         return {"error": f"There are currently no '{body_part}' exercises that could be found. Our current body part categories include {VALID_BODYPARTS}."}, 404
 
 
+# /exercises/search?q=<search terms> - GET - Search exercises by name. Returns up to 'limit' exercises (default 20) in ranked order: names starting with the
+# search terms, then names with a word starting with the search terms, then fuzzy matches (e.g. misspelt names, most similar first). See search.py.
+@exercises_bp.route("/search", methods=["GET"])
+@response_cache.cached("exercises", shared=True) # Same response for every user, removed from the cache when any exercise changes
+def search_exercises():
+    # Fetch search terms from query parameter (case insensitive)
+    query = (request.args.get("q") or "").strip().lower()
+    # Validate search terms
+    if not query:
+        return {"error": "Please provide search terms using the 'q' query parameter (e.g. /exercises/search?q=bench)."}, 400
+    if len(query) > MAX_QUERY_LENGTH:
+        return {"error": f"Search terms must be at most {MAX_QUERY_LENGTH} characters."}, 400
+
+    # Fetch the fields requested by the user (all fields by default) and the number of results
+    fields = get_fieldset(ExerciseSchema)
+    limit = get_limit()
+
+    # If the exercise catalog is enabled, search its exercises in memory (no database queries)
+    snapshot = exercise_catalog.get_snapshot()
+    if snapshot is not None:
+        # If the client's copy is still up to date (the catalog has not changed), return 304 (not modified)
+        not_modified = check_not_modified(snapshot.version)
+        if not_modified:
+            return not_modified
+        exercises = snapshot.search(query, limit)
+    # Else, search the database
+    else:
+        # If the client's copy is still up to date (no exercise has changed, see bump_version in catalog.py), return 304 (not modified).
+        # A primary key lookup, so the search itself only runs once (for the results).
+        not_modified = check_not_modified(exercise_catalog.current_version())
+        if not_modified:
+            return not_modified
+        exercises = search_database(query, limit, exercise_options(fields))
+
+    # If any exercises match, return them in ranked order
+    if exercises:
+        return {"exercises": serialize(fieldset_schema(ExerciseSchema, fields, many=True), exercises)}, 200
+    # Else:
+    else:
+        # Return error message advising no exercises match
+        return {"error": f"We could not find any exercises matching '{query}'."}, 404
+
+
 #/exercises/id/<int:exercise_id> - GET - Fetch a specific exercise by ID
 @exercises_bp.route("/id/<int:exercise_id>", methods=["GET"])
 def get_specific_exercise(exercise_id):
-    # Query the database for exercises that match exercise_id in URL
-    stmt = db.select(Exercise).filter_by(id=exercise_id)
+    # Fetch the fields requested by the user (all fields by default)
+    fields = get_fieldset(ExerciseSchema)
+
+    # If the exercise is in the exercise catalog, return it without querying the database (if it is not, e.g. it was created by another worker process
+    # since the catalog was last checked, fetch it from the database below)
+    record = exercise_catalog.get(exercise_id)
+    if record:
+        # If the client's copy is still up to date, return 304 (not modified)
+        not_modified = check_not_modified(exercise_id, record.last_updated, last_modified=record.last_updated)
+        if not_modified:
+            return not_modified
+        return serialize(fieldset_schema(ExerciseSchema, fields), record), 200
+
+    # If the exercise exists and the client's copy is still up to date, return 304 (not modified) without loading the exercise
+    last_updated = db.session.scalar(db.select(Exercise.last_updated).filter_by(id=exercise_id))
+    if last_updated:
+        not_modified = check_not_modified(exercise_id, last_updated, last_modified=last_updated)
+        if not_modified:
+            return not_modified
+
+    # Query the database for exercises that match exercise_id in URL (eager load relationships required to serialise the requested fields)
+    stmt = db.select(Exercise).filter_by(id=exercise_id).options(*exercise_options(fields))
 
     # Execute the query
     exercise = db.session.scalar(stmt)
@@ -77,7 +262,7 @@ def get_specific_exercise(exercise_id):
     # Check if any exercises exist
     if exercise:
         # If exists, return exercise to user
-        return exercise_schema.dump(exercise), 200
+        return serialize(fieldset_schema(ExerciseSchema, fields), exercise), 200
     # Else: 
     else:
         # Return an error message stating the exercise does not exist
@@ -86,6 +271,7 @@ def get_specific_exercise(exercise_id):
 
 #/exercises/user/<user_id> - GET - Fetch all exercises created by a user (search by user ID entered into URL).
 @exercises_bp.route("/user/<int:user_id>/", methods=["GET"])
+@response_cache.cached("exercises", shared=True) # Same response for every user, removed from the cache when any exercise changes
 def get_user_exercises(user_id):
     # Check if user exists:
     stmt = db.select(User).filter_by(id=user_id)
@@ -95,12 +281,19 @@ def get_user_exercises(user_id):
     if user_exists:
         # Fetch exercises while filtering only by user_id
         stmt = db.select(Exercise).filter_by(user_id=user_id)
-        # Execute the query and return as a list
-        exercises = db.session.scalars(stmt).all()
+        # Fetch the same exercises from the exercise catalog (None if the catalog is disabled)
+        snapshot = exercise_catalog.get_snapshot()
+        records = snapshot.filter(user_id=user_id) if snapshot else None
+        # If the client's copy of the list is still up to date, return 304 (not modified)
+        not_modified = exercise_list_not_modified(stmt, snapshot, records)
+        if not_modified:
+            return not_modified
+        # Execute the query for a single page (alphabetical order)
+        exercises, next_cursor, cursor = paginate_exercises(stmt, records)
         # If exercises exist:
-        if exercises:
-            # Return exercises list to user
-            return exercises_schema.dump(exercises), 200
+        if exercises or cursor:
+            # Return page of exercises to user, along with the cursor for the next page
+            return {"exercises": exercises, "next_cursor": next_cursor}, 200
         # Else:
         else:
             return {"error": f"We could not find any exercises created by '{user_exists.username}' with ID {user_id}."}, 404
@@ -112,6 +305,7 @@ def get_user_exercises(user_id):
 
 #/exercises/user/<user_id> - GET - Fetch a filtered list of exercises created by a user. Filter by query parameter (e.g. ?body_part=Chest)
 @exercises_bp.route("/user/<int:user_id>/filter", methods=["GET"])
+@response_cache.cached("exercises", shared=True) # Same response for every user, removed from the cache when any exercise changes
 def filter_user_exercises(user_id):
     # Fetch body part from query paramater if provided
     body_part = request.args.get("body_part")
@@ -130,13 +324,22 @@ def filter_user_exercises(user_id):
             # Return an error message with prompt of valid body parts
             return {"error": f"'{body_part}' is an invalid body_part. Please search by {', '.join(VALID_BODYPARTS)}"}, 400
 
-    # If body part filter is not provided. Execute the query and return as a list
-    exercises = db.session.scalars(stmt).all()
+    # Fetch the same exercises from the exercise catalog (None if the catalog is disabled)
+    snapshot = exercise_catalog.get_snapshot()
+    records = snapshot.filter(body_parts=[body_part.capitalize()] if body_part else None, user_id=user_id) if snapshot else None
+
+    # If the client's copy of the list is still up to date, return 304 (not modified)
+    not_modified = exercise_list_not_modified(stmt, snapshot, records)
+    if not_modified:
+        return not_modified
+
+    # Execute the query for a single page (alphabetical order)
+    exercises, next_cursor, cursor = paginate_exercises(stmt, records)
 
     # If exercises exist:
-    if exercises:
-        # Return exercises list to user
-        return exercises_schema.dump(exercises), 200
+    if exercises or cursor:
+        # Return page of exercises to user, along with the cursor for the next page
+        return {"exercises": exercises, "next_cursor": next_cursor}, 200
     else:
         # Fetch username from database for informational error message
         user_stmt = db.select(User).filter_by(id=user_id)
@@ -160,13 +363,16 @@ def create_exercise():
         # Get the details of the new exercise from the body of the request
         body_data = exercise_schema.load(request.get_json())
 
-        # Check if the provided exercise name already exists in the list of exercises
+        # Check if the provided exercise name already exists in the list of exercises (checked in the exercise catalog, or the database if the catalog is disabled.
+        # A name taken since the catalog was last checked is caught by the unique constraint below)
         exercise_name = body_data.get("exercise_name")
-        exist_exer_stmt = db.select(Exercise).filter_by(exercise_name=exercise_name)
-        existing_exercise = db.session.scalar(exist_exer_stmt)
+        if exercise_catalog.enabled:
+            existing_exercise = exercise_catalog.find_name(exercise_name) is not None
+        else:
+            existing_exercise = db.session.scalar(db.select(Exercise.id).filter_by(exercise_name=exercise_name)) is not None
         # If the exercise already exists, send an error message
         if existing_exercise: 
-            return {"error": f"An exercise with the name '{existing_exercise.exercise_name}' already exists. Please choose a different name."}, 400
+            return {"error": f"An exercise with the name '{exercise_name}' already exists. Please choose a different name."}, 400
 
         # Populate new entry into exercise table accordingly
         exercise = Exercise(
@@ -175,9 +381,13 @@ def create_exercise():
             description = body_data.get("description"),
             body_part = body_data.get("body_part"),
         )
-        # Add and commit to the DB
+        # Add and commit to the DB (along with a new exercise catalog version)
         db.session.add(exercise)
+        exercise_catalog.bump_version()
         db.session.commit()
+        # Reload the exercise catalog and remove cached exercise lists
+        exercise_catalog.invalidate()
+        response_cache.invalidate("exercises")
 
         # Successfully created response message
         return exercise_schema.dump(exercise), 201
@@ -191,8 +401,8 @@ def create_exercise():
 # /exercises/<int:exercise_id> - DELETE - Delete an exercise (User must have created the exercise or is admin)
 @exercises_bp.route("/<int:exercise_id>", methods=["DELETE"])
 @jwt_required() # Check if user is logged in using jwt_required
-@auth_as_admin_or_owner # Validate if the exercise id in the URL exists and if the logged in user has authority to delete (either as owner or admin)
-def delete_exercise(exercise_id):
+@auth_as_admin_or_owner # Validate if the exercise id in the URL exists and if the logged in user has authority to delete (either as owner or admin). Passes the fetched exercise to the route.
+def delete_exercise(exercise_id, exercise):
     # Check if exercise appears in a user's routine. 
     exer_is_used_stmt = db.select(RoutineExercise).filter_by(exercise_id=exercise_id)
     exercise_is_used = db.session.scalars(exer_is_used_stmt).first()
@@ -202,13 +412,29 @@ def delete_exercise(exercise_id):
         # return error
         return {"error": f"Exercise with 'ID - {exercise_id}' is being used in existing routine/s. Delete has been aborted. If action is still required, email admin: {ADMIN_EMAIL}"}, 409
 
-    # If exercise is not being used, fetch the exercise the user is requesting to delete from the database
-    stmt = db.select(Exercise).filter_by(id=exercise_id)
-    exercise = db.session.scalar(stmt)
-
-    # If it doesn't exist in a user's routine, delete the exercise from the database
+    # If the exercise is used (admin only), delete the routine exercises which use it (a routine exercise can't exist without its exercise) and mark their routines
+    # as updated (removing an exercise counts as the routine being updated). Returns the routines which included the exercise.
+    # WITH deleted AS (DELETE FROM routine_exercises WHERE exercise_id = :exercise_id RETURNING routine_id)
+    # UPDATE routines SET last_updated = now() WHERE id IN (SELECT routine_id FROM deleted) RETURNING id, public, target
+    routines = []
+    if exercise_is_used:
+        routine_exercises, routines_table = RoutineExercise.__table__, Routine.__table__
+        deleted = db.delete(routine_exercises).where(routine_exercises.c.exercise_id == exercise_id).returning(routine_exercises.c.routine_id).cte("deleted")
+        stmt = db.update(routines_table).where(routines_table.c.id.in_(db.select(deleted.c.routine_id))).values(last_updated=db.func.current_timestamp()).add_cte(
+            deleted).returning(routines_table.c.id, routines_table.c.public, routines_table.c.target)
+        routines = db.session.execute(stmt).all()
+
+    # Delete the exercise from the database
     db.session.delete(exercise)
+    # Rebuild the documents of the routines which included the exercise
+    if routines:
+        refresh_documents(Routine.id.in_([routine.id for routine in routines]))
+    exercise_catalog.bump_version()
     db.session.commit()
+    # Reload the exercise catalog and remove cached exercise lists (and cached routine lists which include the exercise or its public routines)
+    exercise_catalog.invalidate()
+    public_targets = {routine.target for routine in routines if routine.public}
+    response_cache.invalidate("exercises", *(routine_list_tags(*public_targets) if public_targets else []))
     # Return an acknowledgement message
     return {"message": f"Exercise with 'ID - {exercise_id}' has been successfully deleted."}, 200
 
@@ -216,8 +442,8 @@ def delete_exercise(exercise_id):
 # /exercises/<int:exercise_id> - PUT/PATCH - Update an exercise (User must have created the exercise or is admin)
 @exercises_bp.route("/<int:exercise_id>", methods=["PUT", "PATCH"])
 @jwt_required() # Check if user is logged in using jwt_required
-@auth_as_admin_or_owner # Validate if the exercise id in the URL exists and if the logged in user has authority to update (either as owner or admin)
-def update_exercise(exercise_id):
+@auth_as_admin_or_owner # Validate if the exercise id in the URL exists and if the logged in user has authority to update (either as owner or admin). Passes the fetched exercise to the route.
+def update_exercise(exercise_id, exercise):
     try:
         # Check if exercise appears in a user's routine
         exer_is_used_stmt = db.select(RoutineExercise).filter_by(exercise_id=exercise_id)
@@ -231,17 +457,18 @@ def update_exercise(exercise_id):
         # If exercise does not appear in any user routines, fetch data from body of request
         body_data = exercise_schema.load(request.get_json(), partial=True)
 
-        # Fetch the exercise the user is requesting to update from the database
-        stmt = db.select(Exercise).filter_by(id=exercise_id)
-        exercise = db.session.scalar(stmt)
-
         # Update the below attributes for the exercise
         exercise.exercise_name = body_data.get("exercise_name") or exercise.exercise_name
         exercise.description = body_data.get("description") or exercise.description
         exercise.body_part = body_data.get("body_part") or exercise.body_part
 
-        # Commit to the database
+        # Rebuild the documents of routines which include the exercise (exercise names are shown in routines) and commit to the database
+        refresh_documents(Routine.id.in_(db.select(RoutineExercise.routine_id).filter_by(exercise_id=exercise_id)))
+        exercise_catalog.bump_version()
         db.session.commit()
+        # Reload the exercise catalog and remove cached exercise lists (and cached routine lists which include the exercise)
+        exercise_catalog.invalidate()
+        response_cache.invalidate("exercises")
 
         # Return the updated exercise to the user
         return exercise_schema.dump(exercise), 200
@@ -1,24 +1,47 @@
 # Import Blueprint & request for better organisation and route management
 from flask import Blueprint, request
 
-# Import the func module for database SQL functions (count likes)
-from sqlalchemy import func
-
 # Import models and schemas required for object creation and to serialise/deserialise data
-from models.user import User
 from models.exercise import Exercise
-from models.routine import Routine, routine_schema, routines_schema, VALID_TARGET
+from models.routine import Routine, RoutineSchema, routine_schema, routines_schema, VALID_TARGET, routine_list_tags
 from models.routine_exercise import RoutineExercise, routine_exercise_schema
-from models.like import Like
+from models.like import Like, like_routines, unlike_routines
+
+# Import SQLAlchemy database for database operations and the response cache for caching anonymous routine lists
+from init import db, response_cache
 
-# Import SQLAlchemy database for database operations
-from init import db
+# Import selectinload to eager load a routine's owner when copying routines
+from sqlalchemy.orm import selectinload
 
 # Import from utils.py:
 # auth_as_admin_or_owner: decorator which checks if logged in user has authorisation to access the decorated route
-# user_is_admin: function which checks if logged in user is admin
+# user_is_admin: function which checks if logged in user is admin (uses the is_admin JWT claim on GET routes where available)
 from utils import auth_as_admin_or_owner, user_is_admin
 
+# Import loader option profiles to eager load the relationships needed for serialisation (avoids N+1 queries)
+from loaders import routine_list_options, routine_detail_options, routine_document_options
+
+# Import routine document helpers to serve routines from their stored documents and rebuild documents when routines change
+from documents import refresh_documents, dump_routine_documents, ROUTINE_OWNERS_VERSION
+
+# Import sparse fieldset helpers to serialise/load only the fields requested with ?fields= and ?expand=
+from fieldsets import get_fieldset, fieldset_schema
+
+# Import keyset pagination helpers to return routine lists one page at a time
+from pagination import get_page_args, paginate, page_statement
+
+# Import check_not_modified to answer conditional GET requests (ETag / Last-Modified) with 304 (not modified)
+from conditional import check_not_modified
+
+# Import streaming helpers to stream full lists (?stream=true, admin only)
+from streaming import wants_stream, stream_allowed, stream_response
+
+# Import like buffer (batches likes/unlikes when LIKE_BUFFER_ENABLED is set)
+from like_buffer import like_buffer
+
+# Import the in-memory exercise catalog to check exercises exist without querying the database, and catalog_version for routine validators
+from catalog import exercise_catalog, catalog_version
+
 # Import authentication libraries
 # jwt_required: decorator which checks if user logged in
 # get_jwt_identity: function which grabs the logged in users user ID
@@ -27,10 +50,83 @@ from flask_jwt_extended import jwt_required, get_jwt_identity
 # Create a blueprint named "routines". Also decorate with url_prefix for management of routes.
 routines_bp = Blueprint("routines", __name__, url_prefix="/routines")
 
+# Keyset pagination sort keys for each 'sort' query parameter (None = default). The routine ID is included to break ties so the order is stable between pages.
+ROUTINE_SORT_KEYS = {
+    "popular": [(Routine.likes_count, True), (Routine.id, True)],
+    "recent": [(Routine.last_updated, True), (Routine.id, True)],
+    "oldest": [(Routine.last_updated, False), (Routine.id, False)],
+    None: [(Routine.routine_title, False), (Routine.id, False)]
+}
+
+# Fields left out of routine lists unless requested with ?expand=routine_exercises (or ?fields=)
+EXPANDABLE_ROUTINE_FIELDS = ("routine_exercises",)
+
+# Constant variable for the maximum amount of routines which can be provided to bulk routes (e.g. copy many routines)
+MAX_BULK_ROUTINES = 50
+
+
+# Function to fetch the validators of a page of routines: the (id, owner's user ID, likes_count, last_updated, buffered likes) of each routine on the page (plus the first
+# routine of the next page), fetched with the same keyset query as the page itself but without loading the routines' documents. Any change to which routines are on the page,
+# their order, their owners, their likes or their contents changes the validators. The most recent update of any exercise is included when routine exercises are included
+# (exercise names are included in the response), and the routine owners version when created_by is included (bumped when usernames change, see documents.py).
+def routine_list_validators(stmt, fields, sort_keys, limit, cursor):
+    columns = [Routine.id, Routine.user_id, Routine.likes_count, Routine.last_updated]
+    if "created_by" in fields:
+        columns.append(catalog_version(ROUTINE_OWNERS_VERSION))
+    if "routine_exercises" in fields:
+        columns.append(db.select(db.func.max(Exercise.last_updated)).scalar_subquery())
+    page = page_statement(stmt.with_only_columns(*columns), sort_keys, limit, cursor)
+    rows = [tuple(row[:len(columns)]) for row in db.session.execute(page)]
+    # Include buffered likes/unlikes which are shown in likes_count
+    if like_buffer.enabled:
+        rows = [row + (like_buffer.pending_likes_delta(row[0]),) for row in rows]
+    return rows
+
+
+# Function to fetch the validators of a single routine with a single query (no relationships are loaded)
+# Returns None if the routine doesn't exist, otherwise (public, owner's user ID, validator values). The values include the owner's user ID, and the routine owners
+# version when created_by is included (bumped when usernames change, see documents.py).
+# Note: routines have no Last-Modified date, as likes change likes_count without changing last_updated (only the ETag is used)
+def routine_validators(routine_id, fields):
+    columns = [Routine.public, Routine.user_id, Routine.last_updated, Routine.likes_count]
+    if "created_by" in fields:
+        columns.append(catalog_version(ROUTINE_OWNERS_VERSION))
+    if "routine_exercises" in fields:
+        # Most recent update of the exercises in the routine (exercise names are included in the response)
+        columns.append(db.select(db.func.max(Exercise.last_updated)).join(
+            RoutineExercise, RoutineExercise.exercise_id == Exercise.id).where(
+                RoutineExercise.routine_id == Routine.id).scalar_subquery())
+    row = db.session.execute(db.select(*columns).where(Routine.id == routine_id)).first()
+    if row is None:
+        return None
+
+    public, owner_id, *values = row
+    values.append(owner_id)
+    # Include buffered likes/unlikes which are shown in likes_count
+    if like_buffer.enabled:
+        values.append(like_buffer.pending_likes_delta(routine_id))
+    return public, owner_id, values
+
+
+# Function to fetch the response cache tags of the cached routine lists which include a routine (only public routines are included in cached lists)
+# Call before committing (the routine's attributes are expired by the commit), then invalidate the tags after committing
+def public_routine_tags(routine):
+    return routine_list_tags(routine.target) if routine.public else []
+
+
+# Function to check if an exercise exists. Checked in the exercise catalog first, then in the database (e.g. an exercise created by another worker process
+# since the catalog was last checked, or if the catalog is disabled)
+def exercise_exists(exercise_id):
+    if exercise_catalog.get(exercise_id):
+        return True
+    return db.session.scalar(db.select(Exercise.id).filter_by(id=exercise_id)) is not None
+
 
 # /routines - GET - fetch all public routines + personal private routines if logged in. Admin can see all. Allows users to see what the newest routines which have been added or updated by other users
+# Admin can stream every routine in a single response with ?stream=true (not paginated)
 @routines_bp.route("/", methods=["GET"])
 @jwt_required(optional=True)
+@response_cache.cached("routines") # Anonymous responses are cached until a public routine changes
 def get_routines():
     # Fetch user_id if exists
     user_id = get_jwt_identity()
@@ -40,12 +136,8 @@ def get_routines():
 
     # If user is logged in:
     if user_id:
-        # Fetch user in database
-        stmt = db.select(User).filter_by(id=user_id)
-        logged_user = db.session.scalar(stmt)
-
         # If user is an admin:
-        if logged_user.is_admin:
+        if user_is_admin():
             # Query database for all routines in order of most recent
             stmt = db.select(Routine)
 
@@ -56,23 +148,44 @@ def get_routines():
                 (Routine.public == True) | (Routine.user_id == user_id)
             )
 
-    # Filter final stmt based on when Routine was last_updated
-    stmt = stmt.order_by(Routine.last_updated.desc())
+    # Fetch the fields requested by the user (routine exercises are only included if requested)
+    fields = get_fieldset(RoutineSchema, EXPANDABLE_ROUTINE_FIELDS)
+
+    # Cached lists which include routine exercises also show exercise names
+    if "routine_exercises" in fields:
+        response_cache.tag("exercises")
+
+    # If a streamed response was requested (?stream=true), stream every routine instead of a single page (admin only)
+    if wants_stream():
+        if not stream_allowed():
+            return {"error": "Only admin can stream the full list of routines. Please use pagination instead."}, 403
+        # Eager load relationships required to serialise the requested fields
+        stmt = stmt.options(*routine_list_options(fields))
+        return stream_response(stmt, ROUTINE_SORT_KEYS["recent"], fieldset_schema(RoutineSchema, fields, many=True), "routines")
 
-    # Execute query and return as list
-    routines = db.session.scalars(stmt).all()
+    # Fetch page size and cursor from query parameters (e.g. ?limit=20&cursor=<next_cursor>)
+    limit, cursor = get_page_args()
+
+    # If the client's copy of the page is still up to date, return 304 (not modified) without loading or serialising any routines
+    not_modified = check_not_modified(user_id, *routine_list_validators(stmt, fields, ROUTINE_SORT_KEYS["recent"], limit, cursor))
+    if not_modified:
+        return not_modified
+
+    # Execute query for a single page, ordered by when Routine was last_updated (most recent first). Only the routine rows (with their documents) are loaded.
+    routines, next_cursor = paginate(stmt.options(*routine_document_options()), ROUTINE_SORT_KEYS["recent"], limit, cursor)
 
     # Check if any routines were found
-    if not routines:
+    if not routines and not cursor:
         return {"error": "Could not find any routines. We recommend you create one!"}, 404
     
-    # Return respective list to each type of user
-    return routines_schema.dump(routines), 200
+    # Return respective page to each type of user, along with the cursor for the next page
+    return {"routines": dump_routine_documents(routines, fields), "next_cursor": next_cursor}, 200
 
 
 # /routines/<str:target> - GET - Search for a public routine which targets a specific muscle group. User can also order the selected muscle group by popularity (how many likes), recent, and oldest using paramater query (e.g. ?sort=<filter> where filter can = popular, recent, oldest)
 @routines_bp.route("/<target>", methods=["GET"])
 @jwt_required(optional=True)
+@response_cache.cached() # Anonymous responses are cached until a public routine with the target changes (tagged below)
 def get_target_routine(target):
     # Adjust user input to match format of VALID_TARGET for ease of entry
     target = target.lower().capitalize()
@@ -96,56 +209,57 @@ def get_target_routine(target):
     if sort not in ["popular", "recent", "oldest", None]:
         return {"error": "The provided filter query could not be recognised. Please provide a paramater query that exists ('popular', 'recent', 'oldest')."}, 400
     
-    # If user provided popular:
-    if sort == "popular":
-        # Recreate query to allow for the count of likes for each routine
-        stmt = stmt.outerjoin( # Perform an OUTERJOIN between initial query (filtered Routine Table) AND Like table where the routine id's match on both tables.
-            Like, Routine.id == Like.routine_id).group_by( # GROUP Routine IDs together
-                Routine.id).order_by( 
-            func.count(Like.id).desc())  # Order by number of likes each Routine has.
-    
-    # If user provided oldest:
-    elif sort == "oldest":
-        # Order initial query by when routine was last_updated (oldest to most recent)
-        stmt = stmt.order_by(Routine.last_updated.asc())
-    
-    # If user provided recent:
-    elif sort == "recent":
-        # Order initial query by when routine was last_updated (most recent to oldest)
-        stmt = stmt.order_by(Routine.last_updated.desc())
-    # Else
-    else:
-        # Order initial query by routine title as default
-        stmt = stmt.order_by(Routine.routine_title.asc())
+    # Fetch the sort keys for the sort provided (see ROUTINE_SORT_KEYS):
+    # popular = number of likes (most liked to least liked)
+    # oldest = when routine was last_updated (oldest to most recent)
+    # recent = when routine was last_updated (most recent to oldest)
+    # default = routine title (alphabetical order)
+    sort_keys = ROUTINE_SORT_KEYS[sort]
 
     # THIS SECTION FILTERS THE INITIAL QUERY WHICH IS DETERMINED BY USER STATUS (NOT LOGGED IN / LOGGED IN / ADMIN)
 
     # If user is logged in:
     if user_id:
-        # Fetch user in database
-        user_stmt = db.select(User).filter_by(id=user_id)
-        logged_user = db.session.scalar(user_stmt)
         # If user is an admin:
-        if logged_user.is_admin:
+        if user_is_admin():
             # Leave statement as is (admin can see all)
             stmt = stmt
         # If user is not admin (but logged in)
         else:
             # Filter the initial query by public routines bitwise OR routines the user has created that are private
-            stmt = stmt.filter(Routine.public == True) | (Routine.user_id == user_id, Routine.public == False)
+            stmt = stmt.filter((Routine.public == True) | (Routine.user_id == user_id))
     # Else (if user is not logged in)
     else:
         stmt = stmt.filter(Routine.public == True)
 
-    # Execute query:
-    routines = db.session.scalars(stmt).all()
+    # Fetch the fields requested by the user (routine exercises are only included if requested)
+    fields = get_fieldset(RoutineSchema, EXPANDABLE_ROUTINE_FIELDS)
+
+    # Tag the cached list with its target (plus exercises, as exercise names are shown when routine exercises are included)
+    response_cache.tag(f"routines:{target}")
+    if "routine_exercises" in fields:
+        response_cache.tag("exercises")
+
+    # Fetch page size and cursor from query parameters (e.g. ?sort=popular&limit=20&cursor=<next_cursor>)
+    limit, cursor = get_page_args()
+
+    # If the client's copy of the page is still up to date, return 304 (not modified) without loading or serialising any routines
+    not_modified = check_not_modified(user_id, *routine_list_validators(stmt, fields, sort_keys, limit, cursor))
+    if not_modified:
+        return not_modified
+
+    # Load only the routine rows (with their documents)
+    stmt = stmt.options(*routine_document_options())
+
+    # Execute query for a single page in the requested sort order:
+    routines, next_cursor = paginate(stmt, sort_keys, limit, cursor)
 
     # Check if any routines were found
-    if not routines:
+    if not routines and not cursor:
         return {"error": "Could not find any routines."}, 404
 
-    # Return respective list to each type of user
-    return routines_schema.dump(routines), 200
+    # Return respective page to each type of user, along with the cursor for the next page
+    return {"routines": dump_routine_documents(routines, fields), "next_cursor": next_cursor}, 200
 
 
 # /routines/liked - GET - View all routines that logged in user has liked
@@ -155,38 +269,76 @@ def liked_routines():
     # Fetch user's id using jwt
     user_id = get_jwt_identity()
 
-    # Grab all logged in user's likes in 'Like' table
-    stmt = db.select(Like).filter_by(user_id=user_id)
-    likes = db.session.scalars(stmt).all()
-
-    # If user has likes:
-    if likes:
-        # Fetch routine IDs from each liked routine and store in 'routine_ids'
-        routine_ids = []
-        for like in likes:
-            routine_ids.append(like.routine_id)
-
-        # JOIN the Routine and Like table by linking Routine(id) & Like(routine_id)
-        # Filter by selecting the routines where the routine id = the routines the user has liked (from the list created previously)
-        stmt = db.select(Routine).join(
-            Like, Routine.id == Like.routine_id).filter(
-                Routine.id.in_(routine_ids), Like.user_id == user_id).order_by(Like.created.desc())
-        
-        # Execute the query
-        liked_routines = db.session.scalars(stmt)
-
-        # Return list of liked routines to user
-        return routines_schema.dump(liked_routines), 200
-    
+    # If the user has buffered likes/unlikes, write them to the database first so they are included
+    if like_buffer.enabled and like_buffer.has_pending(user_id):
+        like_buffer.flush()
+
+    # Fetch the fields requested by the user (routine exercises are only included if requested)
+    fields = get_fieldset(RoutineSchema, EXPANDABLE_ROUTINE_FIELDS)
+
+    # JOIN the Routine and Like table by linking Routine(id) & Like(routine_id), filtered to the logged in user's likes (single query, no list of routine IDs is built)
+    # Only the routine rows (with their documents) are loaded
+    stmt = db.select(Routine).join(
+        Like, Routine.id == Like.routine_id).filter(
+            Like.user_id == user_id).options(*routine_document_options())
+
+    # Fetch page size and cursor from query parameters (e.g. ?limit=20&cursor=<next_cursor>)
+    limit, cursor = get_page_args()
+
+    # Execute the query for a single page, ordered by when the routine was liked (most recent to oldest)
+    liked_routines, next_cursor = paginate(stmt, [(Like.created, True), (Like.id, True)], limit, cursor)
+
+    # If user has likes (or a later page was requested), return page of liked routines to user, along with the cursor for the next page
+    if liked_routines or cursor:
+        return {"routines": dump_routine_documents(liked_routines, fields), "next_cursor": next_cursor}, 200
+
     # Else, if user hasn't liked any posts yet
     return {"message": "You haven't liked any routines yet."}, 200
 
+# Function to copy routines (as private routines owned by user_id) in a fixed number of statements, regardless of how many routines/routine exercises are copied:
+# 1. A single multi-row INSERT for the new routines, returning their new IDs (in the same order as routines_to_copy)
+# 2. A single INSERT ... SELECT which copies every routine exercise of the original routines on the database server (in the order they were added)
+# Returns the list of new routine IDs
+def copy_routines(routines_to_copy, user_id):
+    # Insert the copied routine details and return their new IDs
+    stmt = db.insert(Routine).returning(Routine.id, sort_by_parameter_order=True)
+    new_routine_ids = db.session.scalars(stmt, [
+        {
+            "routine_title": f"{routine.routine_title} (Copied from {routine.user.username})", # Suffix to identify routine was copied
+            "description": routine.description,
+            "target": routine.target,
+            "public": False, # Set the copied routine to private by default
+            "user_id": user_id # Set user ID to logged in user's ID
+        }
+        for routine in routines_to_copy
+    ]).all()
+
+    # Map each original routine ID to its copied routine ID
+    copied_ids = {routine.id: new_id for routine, new_id in zip(routines_to_copy, new_routine_ids)}
+
+    # Copy every column of the routine exercises (except the ID and associated routine ID), so new columns are copied automatically
+    table = RoutineExercise.__table__
+    columns = [column for column in table.columns if column.key not in ("id", "routine_id")]
+
+    # INSERT INTO routine_exercises (routine_id, ...) SELECT CASE routine_id WHEN <original id> THEN <copied id> ... END, ... FROM routine_exercises WHERE routine_id IN (<original ids>) ORDER BY id
+    select_stmt = db.select(
+        db.case(copied_ids, value=table.c.routine_id), *columns).where(
+            table.c.routine_id.in_(copied_ids.keys())).order_by(table.c.id)
+    stmt = table.insert().from_select(["routine_id", *[column.key for column in columns]], select_stmt)
+    db.session.execute(stmt)
+
+    # Build the documents of the copied routines
+    refresh_documents(Routine.id.in_(new_routine_ids))
+
+    return new_routine_ids
+
+
 # /routines/<int:routine_id>/copy - POST - Copy another user's routine as personal private routine
 @routines_bp.route("/<int:routine_id>/copy", methods=["POST"])
 @jwt_required()  # User must be logged in
 def copy_routine(routine_id):
-    # Fetch the routine ID the user wants to copy in URL
-    stmt = db.select(Routine).filter_by(id=routine_id)
+    # Fetch the routine ID the user wants to copy in URL (eager load the owner for the copied routine title)
+    stmt = db.select(Routine).filter_by(id=routine_id).options(selectinload(Routine.user))
     routine_to_copy = db.session.scalar(stmt)
     
     # Check if routine exists and routine is not private. If any, return an appropriate error message
@@ -198,43 +350,54 @@ def copy_routine(routine_id):
     # Get logged in user's ID
     user_id = get_jwt_identity()
 
-    # Copy the routine details
-    copied_routine = Routine(
-        routine_title=f"{routine_to_copy.routine_title} (Copied from {routine_to_copy.user.username}", # Suffix to identify routine was copied
-        description=routine_to_copy.description,
-        target=routine_to_copy.target,
-        public=False,  # Set the copied routine to private by default
-        user_id=user_id  # Set user ID to logged in user's ID
-    )
-
-    # Add copied routine to the database
-    db.session.add(copied_routine)
-    # Call db.session.flush to allow access to added changes before committing to database
-    db.session.flush()
+    # Copy the routine and its routine exercises
+    new_routine_ids = copy_routines([routine_to_copy], user_id)
 
-    # For each routine_exercise that was part of the original routine
-    for exercise in routine_to_copy.routine_exercises:
-        # Copy the exercise details for each exercise
-        copied_exercise = RoutineExercise(
-            routine_id=copied_routine.id, # set associated routine ID as the new copied routine ID
-            exercise_id=exercise.exercise_id,
-            sets=exercise.sets,
-            reps=exercise.reps,
-            weight=exercise.weight,
-            distance_km=exercise.distance_km,
-            minutes=exercise.minutes,
-            seconds=exercise.seconds,
-            note=exercise.note
-        )
-        # Add each copied exercise object into the session
-        db.session.add(copied_exercise)
-
-    # Commit all changes (new copied routine + associated exercises)
+    # Commit all changes (new copied routine + associated exercises). Copies are private, so no cached (public) routine lists change.
     db.session.commit()
 
+    # Fetch the copied routine (with relationships required for serialisation)
+    stmt = db.select(Routine).filter_by(id=new_routine_ids[0]).options(*routine_detail_options())
+    copied_routine = db.session.scalar(stmt)
+
     # Return successful message along with 
     return {"message": "The routine has been copied successfully!", "details": routine_schema.dump(copied_routine)}, 201
 
+
+# /routines/copy - POST - Copy many public routines as personal private routines in one request (body: {"routine_ids": [1, 2, 3]})
+@routines_bp.route("/copy", methods=["POST"])
+@jwt_required()  # User must be logged in
+def copy_many_routines():
+    # Fetch routine IDs from JSON body (duplicates removed)
+    routine_ids = get_bulk_routine_ids()
+    if routine_ids is None:
+        return {"error": f"Please provide 'routine_ids' as a list of up to {MAX_BULK_ROUTINES} routine IDs (e.g. [1, 2, 3])."}, 400
+
+    # Fetch the routines the user wants to copy (eager load the owner for the copied routine titles)
+    stmt = db.select(Routine).filter(Routine.id.in_(routine_ids)).options(selectinload(Routine.user))
+    routines = {routine.id: routine for routine in db.session.scalars(stmt)}
+
+    # Check if all routines exist and are public. If any, return an appropriate error message
+    missing_ids = [routine_id for routine_id in routine_ids if routine_id not in routines]
+    if missing_ids:
+        return {"error": f"Routine/s with id {missing_ids} do not exist."}, 404
+    private_ids = [routine_id for routine_id in routine_ids if not routines[routine_id].public]
+    if private_ids:
+        return {"error": f"Access denied: Only public routines can be copied. Routine/s with id {private_ids} are private."}, 403
+
+    # Copy all routines and their routine exercises
+    new_routine_ids = copy_routines([routines[routine_id] for routine_id in routine_ids], get_jwt_identity())
+
+    # Commit all changes (new copied routines + associated exercises). Copies are private, so no cached (public) routine lists change.
+    db.session.commit()
+
+    # Fetch the copied routines (with relationships required for serialisation)
+    stmt = db.select(Routine).filter(Routine.id.in_(new_routine_ids)).order_by(Routine.id).options(*routine_list_options())
+    copied_routines = db.session.scalars(stmt).all()
+
+    # Return successful message along with the copied routines
+    return {"message": f"{len(copied_routines)} routines have been copied successfully!", "details": routines_schema.dump(copied_routines)}, 201
+
 # /routines - POST - create a new routine (must be logged in)
 @routines_bp.route("/", methods=["POST"])
 @jwt_required()
@@ -254,20 +417,49 @@ def create_routine():
         user_id = logged_user_id
     )
 
-    # Add and commit instance to database
+    # Add instance to database and build its document
     db.session.add(routine)
+    db.session.flush()
+    refresh_documents(Routine.id == routine.id)
+
+    # Commit instance to database
     db.session.commit()
 
+    # Remove cached lists which include the new routine (if public)
+    response_cache.invalidate(*public_routine_tags(routine))
+
     # Return routine information to user
     return routine_schema.dump(routine), 201
 
 
+# Function to serialise the requested fields of a single routine (from its document), including any buffered likes/unlikes which have not been written to the database yet
+def dump_routine(routine, fields):
+    data = dump_routine_documents([routine], fields)[0]
+    if like_buffer.enabled and "likes_count" in data:
+        data["likes_count"] += like_buffer.pending_likes_delta(routine.id)
+    return data
+
+
 # /routines/<int:routine_id> - GET - fetch specific routine (can be viewed by all if public. If private, must be owner or admin to view)
 @routines_bp.route("/<int:routine_id>", methods=["GET"])
 @jwt_required(optional=True)
+@response_cache.coalesced() # Identical concurrent anonymous requests share a single computation (e.g. a popular routine)
 def get_specific_routine(routine_id):
-    # Attempt to select the routine from the database based off routine ID provided in URL
-    stmt = db.select(Routine).filter_by(id=routine_id)
+    # Fetch the fields requested by the user (all fields by default)
+    fields = get_fieldset(RoutineSchema)
+
+    # Fetch the routine's validators. If the routine exists, the user can view it and the client's copy is still up to date, return 304 (not modified) without loading the routine.
+    validators = routine_validators(routine_id, fields)
+    if validators:
+        public, owner_id, values = validators
+        viewer_id = get_jwt_identity()
+        if public or (viewer_id and (viewer_id == str(owner_id) or user_is_admin())):
+            not_modified = check_not_modified(*values)
+            if not_modified:
+                return not_modified
+
+    # Attempt to select the routine from the database based off routine ID provided in URL (only the routine row with its document is loaded)
+    stmt = db.select(Routine).filter_by(id=routine_id).options(*routine_document_options())
 
     # Execute the query
     routine = db.session.scalar(stmt)
@@ -279,7 +471,7 @@ def get_specific_routine(routine_id):
     # If routine exists and is public
     if routine.public:
         # Return routine to user
-        return routine_schema.dump(routine), 200
+        return dump_routine(routine, fields), 200
     
     # If routine is not public, check if user is logged in / exists
     user_id = get_jwt_identity() 
@@ -289,7 +481,7 @@ def get_specific_routine(routine_id):
         # If logged in user matches the user id on the routine OR is an admin
         if user_id == str(routine.user_id) or user_is_admin():
             # Return to user
-            return routine_schema.dump(routine), 200
+            return dump_routine(routine, fields), 200
         # Else (if user is not the owner or admin)
         else:
             # Return forbidden error message
@@ -303,18 +495,13 @@ def get_specific_routine(routine_id):
 # /routines/<int:routine_id> - PUT/PATCH - update specific routine (must be owner or admin)
 @routines_bp.route("/<int:routine_id>", methods=["PUT", "PATCH"])
 @jwt_required()
-@auth_as_admin_or_owner
-def update_routine(routine_id):
+@auth_as_admin_or_owner(options=routine_detail_options()) # Fetches the routine (with relationships required for serialisation) and passes it to the route
+def update_routine(routine_id, routine):
     # Fetch data from the body of the request
     body_data = routine_schema.load(request.get_json(), partial=True)
 
-    # Fetch the routine from the database
-    stmt = db.select(Routine).filter_by(id=routine_id)
-    routine = db.session.scalar(stmt)
-
-    # If routine does not exist
-    if not routine:
-        return {"error": f"Routine with ID {routine_id} not found."}, 404
+    # Fetch the cached lists which include the routine before it is updated
+    cache_tags = public_routine_tags(routine)
 
     # If routine is originally public
     if routine.public:
@@ -322,22 +509,26 @@ def update_routine(routine_id):
         update_public = body_data.get('public')
         # If updated value is public = False and the field is not None (i.e. the user has explicitly provided an input which = False)
         if update_public is not None and not update_public:
-            # Select all associated likes in Like table
-            stmt = db.select(Like).filter_by(routine_id=routine_id)
-            remove_likes = db.session.scalars(stmt)
-            # For each selected like, delete from database
-            for like in remove_likes:
-                db.session.delete(like)
+            # Delete all associated likes in Like table in a single statement
+            stmt = db.delete(Like).filter_by(routine_id=routine_id)
+            db.session.execute(stmt)
+            # Reset the likes count as all likes have been removed
+            routine.likes_count = 0
 
     # If routine is not originally public and exists, update attributes (if provided)
     routine.routine_title = body_data.get('routine_title', routine.routine_title)
     routine.description = body_data.get('description', routine.description)
     routine.target = body_data.get('target', routine.target)
     routine.public = body_data.get('public', routine.public)
+    cache_tags += public_routine_tags(routine)
 
-    # Commit changes to database
+    # Rebuild the routine's document and commit changes to database
+    refresh_documents(Routine.id == routine_id)
     db.session.commit()
 
+    # Remove cached lists which included the routine before or after the update
+    response_cache.invalidate(*cache_tags)
+
     # Return updated routine to user
     return routine_schema.dump(routine), 200
 
@@ -345,16 +536,18 @@ def update_routine(routine_id):
 # /routines/<int:routine_id> - DELETE - delete a specific routine (must be owner or admin)
 @routines_bp.route("/<int:routine_id>", methods=["DELETE"])
 @jwt_required()
-@auth_as_admin_or_owner # Performs validation & checks if user is admin or owner or resource
-def delete_routine(routine_id):
-    # Fetch the routine from the Routine table. Filter by routine_id from URL
-    stmt = db.select(Routine).filter_by(id=routine_id)
-    routine = db.session.scalar(stmt)
+@auth_as_admin_or_owner # Performs validation & checks if user is admin or owner or resource. Passes the fetched routine to the route.
+def delete_routine(routine_id, routine):
+    # Fetch the cached lists which include the routine
+    cache_tags = public_routine_tags(routine)
 
     # Delete the routine
     db.session.delete(routine)
     db.session.commit()
 
+    # Remove cached lists which included the routine
+    response_cache.invalidate(*cache_tags)
+
     # Return successful delete message to user
     return {"message": f"Routine with ID {routine_id} has been deleted."}, 200
 
@@ -362,26 +555,16 @@ def delete_routine(routine_id):
 # /routines/<int:routine_id>/exercise - POST - add a routine_exercise to a routine (must be owner of routine or admin)
 @routines_bp.route("/<int:routine_id>/exercise", methods=["POST"])
 @jwt_required()
-@auth_as_admin_or_owner
-def add_routine_exercise(routine_id):
-    # Fetch the routine from the Routine table. Filter by routine_id from URL
-    stmt = db.select(Routine).filter_by(id=routine_id)
-    routine = db.session.scalar(stmt)
-
-    # If routine does not exist
-    if not routine:
-        return {"error": f"Routine with ID {routine_id} not found."}, 404
-    
+@auth_as_admin_or_owner # Performs validation & checks if user is admin or owner or resource. Passes the fetched routine to the route.
+def add_routine_exercise(routine_id, routine):
     # Get routine exercise data from request body
     body_data = routine_exercise_schema.load(request.get_json())
 
     # Check if the exercise exists
     exercise_id = body_data.get('exercise_id')
-    exer_stmt = db.select(Exercise).filter_by(id=exercise_id)
-    exercise_exists = db.session.scalar(exer_stmt)
 
     # If exercise does not exist
-    if not exercise_exists:
+    if not exercise_exists(exercise_id):
         # Return not found error
         return {"error": f"Exercise with ID {exercise_id} does not exist."}, 404
 
@@ -400,10 +583,18 @@ def add_routine_exercise(routine_id):
         note = body_data.get('note')
     )
 
-    # Add and commit the new exercise
+    # Adding an exercise counts as the routine being updated
+    routine.last_updated = db.func.current_timestamp()
+    cache_tags = public_routine_tags(routine)
+
+    # Add the new exercise, rebuild the routine's document and commit
     db.session.add(routine_exercise)
+    refresh_documents(Routine.id == routine_id)
     db.session.commit()
 
+    # Remove cached lists which include the routine
+    response_cache.invalidate(*cache_tags)
+
     return routine_exercise_schema.dump(routine_exercise), 201
     
 
@@ -433,16 +624,14 @@ def get_routine_exercise(routine_id, routine_exercise_id):
 
     # Fetch logged in user's ID 
     user_id = get_jwt_identity()
-    user_stmt = db.select(User).filter_by(id=user_id)
-    logged_user = db.session.scalar(user_stmt)
     
     # If routine is private
     if not routine.public:
         # If user is not logged in or 
-        if not logged_user:
+        if not user_id:
             return {"error": f"Sorry, authorised access is required. Please log in for verification"}, 401
         # If logged in user's ID does not match user ID associated with routine.
-        elif logged_user.id != routine.user_id:
+        elif int(user_id) != routine.user_id:
             # Return error denying permission
             return {"error": f"Sorry, you do not have permission to view this routine exercise."}, 403
 
@@ -457,7 +646,7 @@ def get_routine_exercise(routine_id, routine_exercise_id):
 @routines_bp.route("/<int:routine_id>/exercise/<int:routine_exercise_id>", methods=["PUT", "PATCH"])
 @jwt_required()
 @auth_as_admin_or_owner # Verify if logged in user is owner of the routine ID or is admin
-def update_routine_exercise(routine_id, routine_exercise_id):
+def update_routine_exercise(routine_id, routine_exercise_id, routine):
     # Get the data from the body of the request
     body_data = routine_exercise_schema.load(request.get_json())
 
@@ -475,11 +664,9 @@ def update_routine_exercise(routine_id, routine_exercise_id):
     
     # Check if the exercise exists
     exercise_id = body_data.get('exercise_id')
-    exer_stmt = db.select(Exercise).filter_by(id=exercise_id)
-    exercise_exists = db.session.scalar(exer_stmt)
 
     # If exercise does not exist
-    if not exercise_exists:
+    if not exercise_exists(exercise_id):
         # Return not found error
         return {"error": f"Exercise with ID {exercise_id} does not exist."}, 404
 
@@ -495,9 +682,17 @@ def update_routine_exercise(routine_id, routine_exercise_id):
     routine_exercise.seconds = body_data.get("seconds") or routine_exercise.seconds
     routine_exercise.note = body_data.get("note") or routine_exercise.note
 
-    # Commit updates to database
+    # Updating an exercise counts as the routine being updated
+    routine.last_updated = db.func.current_timestamp()
+    cache_tags = public_routine_tags(routine)
+
+    # Rebuild the routine's document and commit updates to database
+    refresh_documents(Routine.id == routine_id)
     db.session.commit()
 
+    # Remove cached lists which include the routine
+    response_cache.invalidate(*cache_tags)
+
     # Return acknowledgement
     return routine_exercise_schema.dump(routine_exercise), 200
 
@@ -506,7 +701,7 @@ def update_routine_exercise(routine_id, routine_exercise_id):
 @routines_bp.route("/<int:routine_id>/exercise/<int:routine_exercise_id>", methods=["DELETE"])
 @jwt_required()
 @auth_as_admin_or_owner # Verify if logged in user is owner of the routine ID or is admin
-def delete_routine_exercise(routine_id, routine_exercise_id):
+def delete_routine_exercise(routine_id, routine_exercise_id, routine):
     # Fetch specified routine exercise in URL
     stmt = db.select(RoutineExercise).filter_by(id=routine_exercise_id)
     routine_exercise = db.session.scalar(stmt)
@@ -521,22 +716,80 @@ def delete_routine_exercise(routine_id, routine_exercise_id):
 
     # For better error message:
     # Fetch the exercise name and routine title from the specified routine in the URL
-    routine_title = routine_exercise.routine.routine_title
-    exercise_name = routine_exercise.exercise.exercise_name
+    routine_title = routine.routine_title
+    # (the exercise name is read from the exercise catalog where available)
+    record = exercise_catalog.get(routine_exercise.exercise_id)
+    exercise_name = record.exercise_name if record else routine_exercise.exercise.exercise_name
+
+    # Removing an exercise counts as the routine being updated
+    routine.last_updated = db.func.current_timestamp()
+    cache_tags = public_routine_tags(routine)
 
-    # Delete the routine exercise
+    # Delete the routine exercise, rebuild the routine's document and commit
     db.session.delete(routine_exercise)
+    refresh_documents(Routine.id == routine_id)
     db.session.commit()
 
+    # Remove cached lists which include the routine
+    response_cache.invalidate(*cache_tags)
+
     # Return acknowledgement message
     return {"message": f"The exercise '{exercise_name}' has been deleted from the routine named '{routine_title}'."}, 200
 
 
+# Function to like (liked=True) or unlike (liked=False) a routine through the like buffer. Returns the same responses as the unbuffered routes.
+# The user's current like is read from the buffer first, then the database, so repeated likes/unlikes are rejected even before they are flushed.
+def buffer_like(user_id, routine_id, liked):
+    # Fetch the routine to check it exists (and is public when liking)
+    stmt = db.select(Routine).filter_by(id=routine_id)
+    routine = db.session.scalar(stmt)
+
+    # If routine doesn't exist
+    if not routine:
+        # Return an error
+        return {"error": f"Routine with ID {routine_id} not found."}, 404
+
+    if liked:
+        if not routine.public:
+            return {"error": f"Only public routines can be liked."}, 403
+        # If user has already liked the routine, return error message (each routine can only be liked once)
+        if like_buffer.user_likes_routine(user_id, routine_id):
+            return {"error": "You have already liked this routine."}, 400
+        # Buffer the like and return a successfully liked message
+        like_buffer.record(user_id, routine_id, True)
+        return {"message": f"You have successly liked Routine with ID '{routine_id}' named {routine.routine_title}."}, 201
+
+    # If user has not liked the routine, return error message
+    if not like_buffer.user_likes_routine(user_id, routine_id):
+        return {"error": "You have not liked this routine."}, 400
+    # Buffer the unlike and return a successfully unliked message
+    like_buffer.record(user_id, routine_id, False)
+    return {"message": f"You have unliked routine with ID '{routine_id}' named {routine.routine_title} successfully."}, 200
+
+
 # /routines/<int:routine_id>/like - POST - like a routine (must be logged in)
 @routines_bp.route("/<int:routine_id>/like", methods=["POST"])
 @jwt_required() # User must be logged in to assign their user ID to the newly created like.
 def like_routine(routine_id):
-    # Check if the routine exists (if not, return an error)
+    # Get user identity to perform below checks
+    user_id = get_jwt_identity()
+
+    # If the like buffer is enabled, validate the like here and buffer it (written to the database in a batch shortly after)
+    if like_buffer.enabled:
+        return buffer_like(user_id, routine_id, liked=True)
+
+    # Like the routine and increment its likes count in a single statement. Nothing is returned if the routine doesn't exist, is private or has already been liked by the user.
+    liked = db.session.execute(like_routines(user_id, [routine_id])).first()
+    db.session.commit()
+
+    # If routine was liked
+    if liked:
+        # Remove cached lists which show the routine's likes count
+        response_cache.invalidate(*routine_list_tags(liked.target))
+        # Return a successfully liked message
+        return {"message": f"You have successly liked Routine with ID '{routine_id}' named {liked.routine_title}."}, 201
+
+    # Else, check why the routine could not be liked to provide an appropriate error message
     stmt = db.select(Routine).filter_by(id=routine_id)
     routine = db.session.scalar(stmt)
 
@@ -548,36 +801,33 @@ def like_routine(routine_id):
     if not routine.public:
         return {"error": f"Only public routines can be liked."}, 403
 
+    # Else, the user has already liked the routine. Return error message (each routine can only be liked once)
+    return {"error": "You have already liked this routine."}, 400
+
+
+# /routines/<int:routine_id>/like - DELETE - Delete a like from a specific routine (must be logged in)
+@routines_bp.route("/<int:routine_id>/like", methods=["DELETE"])
+@jwt_required() # Check if used is logged in
+def unlike_routine(routine_id):
     # Get user identity to perform below checks
     user_id = get_jwt_identity()
 
-    # Check if the user has already liked this routine (filter like table by user ID and routine ID specified in URL)
-    like_stmt = db.select(Like).filter_by(user_id=user_id, routine_id=routine_id)
-    like_exists = db.session.scalar(like_stmt)
-    # If user has liked the routine
-    if like_exists:
-        # Return error message (each routine can only be liked once)
-        return {"error": "You have already liked this routine."}, 400
-
-    # If like doesn't exist, create a new like
-    like = Like(
-        user_id=user_id,
-        routine_id=routine_id
-    )
+    # If the like buffer is enabled, validate the unlike here and buffer it (written to the database in a batch shortly after)
+    if like_buffer.enabled:
+        return buffer_like(user_id, routine_id, liked=False)
 
-    # Add and commit to database
-    db.session.add(like)
+    # Delete the like and decrement the routine's likes count in a single statement. Nothing is returned if the user has not liked the routine.
+    unliked = db.session.execute(unlike_routines(user_id, [routine_id])).first()
     db.session.commit()
 
-    # Return a successfully liked message
-    return {"message": f"You have successly liked Routine with ID '{routine_id}' named {routine.routine_title}."}, 201
+    # If routine was unliked
+    if unliked:
+        # Remove cached lists which show the routine's likes count
+        response_cache.invalidate(*routine_list_tags(unliked.target))
+        # Return a successfully unliked message
+        return {"message": f"You have unliked routine with ID '{routine_id}' named {unliked.routine_title} successfully."}, 200
 
-
-# /routines/<int:routine_id>/like - DELETE - Delete a like from a specific routine (must be logged in)
-@routines_bp.route("/<int:routine_id>/like", methods=["DELETE"])
-@jwt_required() # Check if used is logged in
-def unlike_routine(routine_id):
-    # Check if the routine exists (if not, return an error)
+    # Else, check if the routine exists (if not, return an error)
     stmt = db.select(Routine).filter_by(id=routine_id)
     routine = db.session.scalar(stmt)
 
@@ -586,21 +836,77 @@ def unlike_routine(routine_id):
         # Return an error
         return {"error": f"Routine with ID {routine_id} not found."}, 404
 
-    # Get user identity to perform below checks
-    user_id = get_jwt_identity()
-
-    # Check if user has liked the this specific routine (filter like table by user ID and routine ID specified in URL)
-    like_stmt = db.select(Like).filter_by(user_id=user_id, routine_id=routine_id)
-    like_exists = db.session.scalar(like_stmt)
-
-    # If routine has not been liked
-    if not like_exists:
-        # Error message
-        return {"error": "You have not liked this routine."}, 400
-
-    # If like does exist, delete the like
-    db.session.delete(like_exists)
+    # Else, routine has not been liked. Error message
+    return {"error": "You have not liked this routine."}, 400
+
+
+# Function to fetch and validate a list of routine IDs from the JSON body of a bulk request (e.g. {"routine_ids": [1, 2, 3]})
+# Returns the list of routine IDs (duplicates removed) or None if the list is invalid
+def get_bulk_routine_ids():
+    body_data = request.get_json(silent=True) or {}
+    routine_ids = body_data.get("routine_ids")
+    # Validate that routine_ids is a list of routine IDs within the maximum amount
+    if not isinstance(routine_ids, list) or not routine_ids or len(routine_ids) > MAX_BULK_ROUTINES:
+        return None
+    if not all(isinstance(routine_id, int) and not isinstance(routine_id, bool) for routine_id in routine_ids):
+        return None
+    # Remove duplicate IDs (keeping the order provided)
+    return list(dict.fromkeys(routine_ids))
+
+
+# /routines/likes - POST - Like many routines in one request (body: {"routine_ids": [1, 2, 3]}). Routines which don't exist, are private or have already been liked are skipped.
+@routines_bp.route("/likes", methods=["POST"])
+@jwt_required() # User must be logged in
+def like_many_routines():
+    # Fetch routine IDs from JSON body
+    routine_ids = get_bulk_routine_ids()
+    if routine_ids is None:
+        return {"error": f"Please provide 'routine_ids' as a list of up to {MAX_BULK_ROUTINES} routine IDs (e.g. [1, 2, 3])."}, 400
+
+    # Apply the user's buffered likes/unlikes first, so they can't overwrite this request's changes when flushed later
+    if like_buffer.enabled:
+        like_buffer.flush_user(get_jwt_identity(), routine_ids)
+
+    # Like all routines and increment their likes counts in a single statement
+    liked = db.session.execute(like_routines(get_jwt_identity(), routine_ids)).all()
+    db.session.commit()
+    liked_ids = {row.id for row in liked}
+
+    # Remove cached lists which show the likes counts of the liked routines
+    if liked:
+        response_cache.invalidate(*routine_list_tags(*{row.target for row in liked}))
+
+    # Return which routines were liked and which were skipped
+    return {
+        "liked": [routine_id for routine_id in routine_ids if routine_id in liked_ids],
+        "skipped": [routine_id for routine_id in routine_ids if routine_id not in liked_ids]
+    }, 201
+
+
+# /routines/likes - DELETE - Unlike many routines in one request (body: {"routine_ids": [1, 2, 3]}). Routines which have not been liked are skipped.
+@routines_bp.route("/likes", methods=["DELETE"])
+@jwt_required() # User must be logged in
+def unlike_many_routines():
+    # Fetch routine IDs from JSON body
+    routine_ids = get_bulk_routine_ids()
+    if routine_ids is None:
+        return {"error": f"Please provide 'routine_ids' as a list of up to {MAX_BULK_ROUTINES} routine IDs (e.g. [1, 2, 3])."}, 400
+
+    # Apply the user's buffered likes/unlikes first, so they can't overwrite this request's changes when flushed later
+    if like_buffer.enabled:
+        like_buffer.flush_user(get_jwt_identity(), routine_ids)
+
+    # Unlike all routines and decrement their likes counts in a single statement
+    unliked = db.session.execute(unlike_routines(get_jwt_identity(), routine_ids)).all()
     db.session.commit()
+    unliked_ids = {row.id for row in unliked}
+
+    # Remove cached lists which show the likes counts of the unliked routines
+    if unliked:
+        response_cache.invalidate(*routine_list_tags(*{row.target for row in unliked}))
 
-    # Return a successfully unliked message
-    return {"message": f"You have unliked routine with ID '{routine_id}' named {routine.routine_title} successfully."}, 200
\ No newline at end of file
+    # Return which routines were unliked and which were skipped
+    return {
+        "unliked": [routine_id for routine_id in routine_ids if routine_id in unliked_ids],
+        "skipped": [routine_id for routine_id in routine_ids if routine_id not in unliked_ids]
+    }, 200
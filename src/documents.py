@@ -0,0 +1,85 @@
+# Import SQLAlchemy database for loading routines and storing their documents
+from init import db
+
+# Import models and schema used to build routine documents
+from models.routine import Routine, RoutineSchema
+
+# Import the full loader profile (routine + owner + routine exercises + exercise names) used to build documents
+from loaders import routine_options
+
+# Import compiled serializers and sparse fieldset schemas to build and read documents
+from serializers import serialize
+from fieldsets import fieldset_schema
+
+
+# ROUTINE DOCUMENTS
+# Each routine stores its serialised document (the output of RoutineSchema, e.g. {"id": 1, "routine_title": ..., "created_by": {...}, "routine_exercises": [...]})
+# in the routines.document column, so read routes can return routines without loading the owner, routine exercises and exercises (three extra tables).
+# - Documents are rebuilt with refresh_documents() in the same transaction as every change to the routine, its routine exercises, the names of its exercises
+#   or its owner's username, so a committed document always matches the tables.
+# - likes_count is left out of the document (it changes on every like/unlike, which are applied in batches) and is read from its own column instead.
+# - Routines without a document (e.g. created before the document column was added) are serialised from the tables. Run "flask db rebuild-documents" to build every document.
+
+# Constant variable for the fields stored in documents (every routine field except likes_count)
+DOCUMENT_FIELDS = tuple(field for field in RoutineSchema.Meta.fields if field != "likes_count")
+
+# Constant variable for the number of routines rebuilt at a time
+DOCUMENT_BATCH_SIZE = 500
+
+# Constant variable for the name of the version (catalog_versions table, see catalog.py) bumped when documents are rebuilt because the owner shown in created_by
+# changed without the routines being updated (a change of username, routines transferred to the deleted account). Included in the routines' validators.
+ROUTINE_OWNERS_VERSION = "routine_owners"
+
+
+# Function to rebuild the documents of the routines matching the provided filters (e.g. Routine.id.in_(routine_ids)), in batches of DOCUMENT_BATCH_SIZE routines.
+# Pending changes are flushed first so documents include them. Documents are written in the current transaction (committed by the caller).
+# Returns the number of documents rebuilt
+def refresh_documents(*criteria):
+    db.session.flush()
+    schema = fieldset_schema(RoutineSchema, DOCUMENT_FIELDS)
+
+    rebuilt = 0
+    last_id = 0
+    while True:
+        # Fetch the next batch of routines (populate_existing: routines already in the session are reloaded with their flushed changes)
+        stmt = db.select(Routine).where(Routine.id > last_id, *criteria).order_by(Routine.id).limit(DOCUMENT_BATCH_SIZE).options(
+            *routine_options()).execution_options(populate_existing=True)
+        routines = db.session.scalars(stmt).all()
+        if not routines:
+            return rebuilt
+        db.session.execute(update_documents([(routine.id, serialize(schema, routine)) for routine in routines]))
+        rebuilt += len(routines)
+        last_id = routines[-1].id
+
+
+# Function to build a single statement which stores a batch of documents (one statement per batch, not one per routine):
+# UPDATE routines SET document = CAST(documents.document AS JSON), last_updated = routines.last_updated FROM (VALUES (...), (...)) AS documents
+# WHERE routines.id = documents.routine_id (last_updated is set to itself, rebuilding a document does not count as the routine being updated)
+def update_documents(documents):
+    table = Routine.__table__
+    values = db.values(db.column("routine_id", db.Integer), db.column("document", db.JSON), name="documents").data(documents)
+    return db.update(table).where(table.c.id == values.c.routine_id).values(
+        document=db.cast(values.c.document, db.JSON), last_updated=table.c.last_updated)
+
+
+# Function to serialise the requested fields of routines loaded with routine_document_options (see loaders.py). Returns a list of dictionaries.
+# Routines with a document are read from it, routines without a document are loaded (in a single query) and serialised from the tables.
+def dump_routine_documents(routines, fields):
+    documents = {routine.id: routine.document for routine in routines}
+    missing_ids = [routine_id for routine_id, document in documents.items() if document is None]
+    schema = fieldset_schema(RoutineSchema, fields)
+    if missing_ids:
+        stmt = db.select(Routine).filter(Routine.id.in_(missing_ids)).options(*routine_options(fields)).execution_options(populate_existing=True)
+        db.session.scalars(stmt).all()
+
+    results = []
+    for routine in routines:
+        document = documents[routine.id]
+        if document is None:
+            results.append(serialize(schema, routine))
+            continue
+        data = {field: document[field] for field in fields if field in document}
+        if "likes_count" in fields:
+            data["likes_count"] = routine.likes_count
+        results.append(data)
+    return results
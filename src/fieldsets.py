@@ -0,0 +1,50 @@
+# Import lru_cache to reuse schema instances for each combination of requested fields
+from functools import lru_cache
+
+# Import request to read the 'fields' and 'expand' query parameters
+from flask import request
+
+# Import ValidationError so invalid query parameters are handled by the global ValidationError handler (400)
+from marshmallow.exceptions import ValidationError
+
+
+# Function to read a comma separated query parameter (accepts ?fields=a,b and/or ?fields=a&fields=b)
+def get_list_arg(name):
+    values = []
+    for value in request.args.getlist(name):
+        for item in value.split(","):
+            if item.strip() and item.strip() not in values:
+                values.append(item.strip())
+    return values
+
+
+# Function to fetch and validate the sparse fieldset requested with the 'fields' and 'expand' query parameters, e.g.
+# ?fields=id,routine_title (only include these fields) and ?expand=routine_exercises (include a field which is left out by default)
+# schema_class: schema used to serialise the response (valid fields are read from Meta.fields)
+# expandable: fields which are left out unless requested (with ?expand= or ?fields=)
+# Returns a tuple of field names in the order of Meta.fields, used both to serialise the response (see fieldset_schema) and to choose what is loaded (see loaders.py)
+def get_fieldset(schema_class, expandable=()):
+    available = schema_class.Meta.fields
+    fields = get_list_arg("fields")
+    expand = get_list_arg("expand")
+
+    # Validate requested fields
+    invalid_fields = [field for field in fields if field not in available]
+    if invalid_fields:
+        raise ValidationError({"fields": [f"Unknown field/s '{', '.join(invalid_fields)}'. Valid fields are: {', '.join(available)}."]})
+    invalid_expand = [field for field in expand if field not in expandable]
+    if invalid_expand:
+        valid_expand = ", ".join(expandable) if expandable else "none"
+        raise ValidationError({"expand": [f"Unknown expansion/s '{', '.join(invalid_expand)}'. Valid expansions are: {valid_expand}."]})
+
+    # If specific fields were requested, only include those fields (plus any expanded fields)
+    if fields:
+        return tuple(field for field in available if field in fields or field in expand)
+    # Else, include all fields except expandable fields which were not requested
+    return tuple(field for field in available if field not in expandable or field in expand)
+
+
+# Function to fetch a schema which only serialises the provided fields (schemas are cached for each combination of fields)
+@lru_cache(maxsize=128)
+def fieldset_schema(schema_class, fields, many=False):
+    return schema_class(only=fields, many=many)
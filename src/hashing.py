@@ -0,0 +1,70 @@
+# Import ThreadPoolExecutor to run password hashing on a pool of worker threads (bcrypt releases the GIL while hashing, so hashes run in parallel)
+from concurrent.futures import ThreadPoolExecutor
+
+# Import threading for the semaphore which bounds how many hashes can be running or waiting at once
+import threading
+
+
+# Error raised when the hashing pool and its queue are full (handled globally in main.py as 503 - service unavailable)
+class HashingBusyError(Exception):
+    pass
+
+
+# Password hashing executor. Wraps Flask-Bcrypt so that CPU heavy hashing is:
+# - run on a fixed size thread pool (HASHING_POOL_SIZE) instead of being unbounded across every request thread
+# - limited to HASHING_QUEUE_SIZE waiting hashes. Requests wait up to HASHING_QUEUE_TIMEOUT seconds for a free slot, then fail fast with HashingBusyError (back-pressure)
+# The cost of new hashes is set by BCRYPT_LOG_ROUNDS (read by Flask-Bcrypt).
+class PasswordHasher:
+    def __init__(self, bcrypt, app=None):
+        self.bcrypt = bcrypt
+        self.executor = None
+        self.slots = None
+        self.queue_timeout = None
+        self.log_rounds = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        # Default configuration (can be overridden in create_app)
+        app.config.setdefault("HASHING_POOL_SIZE", 4)
+        app.config.setdefault("HASHING_QUEUE_SIZE", 32)
+        app.config.setdefault("HASHING_QUEUE_TIMEOUT", 5)
+
+        pool_size = app.config["HASHING_POOL_SIZE"]
+        self.executor = ThreadPoolExecutor(max_workers=pool_size, thread_name_prefix="password-hasher")
+        # One slot for each running hash plus one for each queued hash
+        self.slots = threading.BoundedSemaphore(pool_size + app.config["HASHING_QUEUE_SIZE"])
+        self.queue_timeout = app.config["HASHING_QUEUE_TIMEOUT"]
+        # Cost used by Flask-Bcrypt for new hashes
+        self.log_rounds = app.config.get("BCRYPT_LOG_ROUNDS", 12)
+        app.extensions["password_hasher"] = self
+
+    # Function to run a hashing function on the pool and wait for the result
+    def run(self, fn, *args):
+        # If no slot becomes available in time, reject the request rather than queueing indefinitely
+        if not self.slots.acquire(timeout=self.queue_timeout):
+            raise HashingBusyError()
+        try:
+            future = self.executor.submit(fn, *args)
+        except Exception:
+            self.slots.release()
+            raise
+        # Release the slot as soon as the hash has finished
+        future.add_done_callback(lambda future: self.slots.release())
+        return future.result()
+
+    # Function to hash a password (returns the hash as a string ready to be stored)
+    def generate_password_hash(self, password):
+        return self.run(self.bcrypt.generate_password_hash, password).decode("utf-8")
+
+    # Function to check a password against a stored hash
+    def check_password_hash(self, pw_hash, password):
+        return self.run(self.bcrypt.check_password_hash, pw_hash, password)
+
+    # Function to check if a stored hash was created with a different cost to the current BCRYPT_LOG_ROUNDS (e.g. "$2b$12$..." has a cost of 12)
+    def needs_rehash(self, pw_hash):
+        try:
+            rounds = int(pw_hash.split("$")[2])
+        except (AttributeError, IndexError, ValueError):
+            return True
+        return rounds != self.log_rounds
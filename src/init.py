@@ -3,8 +3,23 @@ from flask_sqlalchemy import SQLAlchemy
 from flask_marshmallow import Marshmallow
 from flask_bcrypt import Bcrypt
 from flask_jwt_extended import JWTManager
+# Import PasswordHasher to run bcrypt hashing on a bounded thread pool
+from hashing import PasswordHasher
+# Import RateLimiter to throttle expensive and write routes
+from rate_limit import RateLimiter
+# Import Compressor to compress responses (gzip/brotli/zstd)
+from compression import Compressor
+# Import ConditionalGet to add ETag/Last-Modified and caching headers to read routes
+from conditional import ConditionalGet
+# Import ResponseCache to cache the responses of public read routes
+from response_cache import ResponseCache
 
 db = SQLAlchemy()
 ma = Marshmallow()
 bcrypt = Bcrypt()
-jwt = JWTManager()
\ No newline at end of file
+jwt = JWTManager()
+hasher = PasswordHasher(bcrypt)
+limiter = RateLimiter()
+compressor = Compressor()
+conditional_get = ConditionalGet()
+response_cache = ResponseCache()
\ No newline at end of file
@@ -0,0 +1,77 @@
+# Import request to negotiate the response format from the Accept header
+from flask import request
+
+# Import Flask's default JSON provider to extend (keeps its handling of dates, decimals, UUIDs, etc.)
+from flask.json.provider import DefaultJSONProvider
+
+# Import optional fast encoders. Responses fall back to the standard library json module (and JSON only) if they are not installed.
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+# Constant variables for the supported response formats
+JSON_MIMETYPE = "application/json"
+MSGPACK_MIMETYPES = ("application/msgpack", "application/x-msgpack")
+
+
+# JSON provider used for every response which returns a dict/list (and jsonify, request.get_json, etc.)
+# - Encodes/decodes JSON with orjson when it is installed (much faster than the standard library json module). Output is equivalent to Flask's default provider:
+#   compact (or indented in debug mode), keys are sorted and datetimes are passed to Flask's default handler (HTTP date format). Non-ASCII characters are
+#   written as UTF-8 instead of \u escapes.
+# - Encodes responses as MessagePack when the client prefers it (Accept: application/msgpack) and msgpack is installed. MessagePack bodies are smaller and
+#   cheaper to decode for native clients. Responses include "Vary: Accept" so caches store each format separately.
+class FastJSONProvider(DefaultJSONProvider):
+    # Function to fetch the orjson options for the provided sort_keys/indent arguments
+    def orjson_option(self, sort_keys=None, indent=None):
+        option = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS
+        if self.sort_keys if sort_keys is None else sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        if indent:
+            option |= orjson.OPT_INDENT_2
+        return option
+
+    def dumps(self, obj, **kwargs):
+        # orjson output is always compact, so Flask's compact separators are accepted. Use the standard library json module if orjson is not installed,
+        # or for options orjson does not support (e.g. other separators)
+        if kwargs.get("separators") == (",", ":"):
+            kwargs = {key: value for key, value in kwargs.items() if key != "separators"}
+        if orjson is None or set(kwargs) - {"sort_keys", "indent", "default"}:
+            return super().dumps(obj, **kwargs)
+        option = self.orjson_option(kwargs.get("sort_keys"), kwargs.get("indent"))
+        return orjson.dumps(obj, default=kwargs.get("default", self.default), option=option).decode("utf-8")
+
+    def loads(self, s, **kwargs):
+        if orjson is None or kwargs:
+            return super().loads(s, **kwargs)
+        return orjson.loads(s)
+
+    # Function to check whether the client prefers MessagePack over JSON (JSON is used for */* and when both are equally preferred)
+    def wants_msgpack(self):
+        if msgpack is None:
+            return False
+        best = request.accept_mimetypes.best_match((JSON_MIMETYPE,) + MSGPACK_MIMETYPES, default=JSON_MIMETYPE)
+        return best in MSGPACK_MIMETYPES
+
+    # Function to create the response for a dict/list returned by a route
+    def response(self, *args, **kwargs):
+        if self.wants_msgpack():
+            obj = self._prepare_response_obj(args, kwargs)
+            body = msgpack.packb(obj, default=self.default, datetime=False)
+            response = self._app.response_class(body, mimetype=MSGPACK_MIMETYPES[0])
+        elif orjson is not None:
+            # Encode the body with orjson directly as bytes (indented in debug mode, like Flask's default provider)
+            obj = self._prepare_response_obj(args, kwargs)
+            indent = (self.compact is None and self._app.debug) or self.compact is False
+            body = orjson.dumps(obj, default=self.default, option=self.orjson_option(indent=indent) | orjson.OPT_APPEND_NEWLINE)
+            response = self._app.response_class(body, mimetype=self.mimetype)
+        else:
+            response = super().response(*args, **kwargs)
+        if msgpack is not None:
+            response.vary.add("Accept")
+        return response
@@ -0,0 +1,183 @@
+# Import logging to report failed flushes, threading for the background flush thread and atexit to flush remaining likes on shutdown
+import atexit
+import logging
+import threading
+
+# Import SQLAlchemy database, the response cache and the batched like/unlike statements
+from init import db, response_cache
+from models.like import Like, like_pairs, unlike_pairs
+from models.routine import routine_list_tags
+
+logger = logging.getLogger(__name__)
+
+
+# Write-coalescing buffer for likes/unlikes (optional, enabled with LIKE_BUFFER_ENABLED).
+# Instead of committing every like/unlike in its own transaction, like/unlike routes record the event here and a background thread applies
+# all buffered events every LIKE_BUFFER_FLUSH_INTERVAL seconds (or as soon as LIKE_BUFFER_MAX_EVENTS events are waiting) in two statements:
+# one batched INSERT ... ON CONFLICT DO NOTHING and one batched DELETE, each updating the likes_count of every affected routine once.
+# Only the latest event for each (user, routine) is kept, so a like followed by an unlike within the same interval never reaches the database.
+# Read-your-writes: pending_state/pending_likes_delta let routes overlay buffered events (including events being flushed) on top of what is stored in the database, and flush() can be called
+# before reads which must include the user's own likes (e.g. liked routines).
+# Routes which write a user's likes directly (bulk like/unlike) call flush_user() first, so older buffered events can't overwrite them. Deleting a user
+# discards the user's buffered events (discard_user).
+# A batch which fails to flush is retried up to LIKE_BUFFER_MAX_ATTEMPTS times, after which its events are dropped (and logged).
+# Note: each worker process has its own buffer. Buffered events are lost if the process is killed before they are flushed.
+class LikeBuffer:
+    def __init__(self, app=None):
+        self.app = None
+        self.enabled = False
+        # (user_id, routine_id) -> True (like) / False (unlike)
+        self.pending = {}
+        # Events taken from the buffer by the flush in progress (until they are committed or returned to the buffer), so reads still see them
+        self.flushing = {}
+        # (user_id, routine_id) -> number of failed flushes of the buffered event
+        self.attempts = {}
+        self.lock = threading.Lock()
+        # Serialises flushes (background thread and flushes requested by routes). Re-entrant so flush_user can flush while holding it.
+        self.flush_lock = threading.RLock()
+        self.wake = threading.Event()
+        self.thread = None
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("LIKE_BUFFER_ENABLED", False)
+        app.config.setdefault("LIKE_BUFFER_FLUSH_INTERVAL", 0.05)
+        app.config.setdefault("LIKE_BUFFER_MAX_EVENTS", 1000)
+        app.config.setdefault("LIKE_BUFFER_MAX_ATTEMPTS", 3)
+        self.app = app
+        self.enabled = app.config["LIKE_BUFFER_ENABLED"]
+        self.flush_interval = app.config["LIKE_BUFFER_FLUSH_INTERVAL"]
+        self.max_events = app.config["LIKE_BUFFER_MAX_EVENTS"]
+        self.max_attempts = app.config["LIKE_BUFFER_MAX_ATTEMPTS"]
+        app.extensions["like_buffer"] = self
+        if self.enabled:
+            atexit.register(self.flush)
+
+    # Function to record a like (liked=True) or unlike (liked=False) by a user
+    def record(self, user_id, routine_id, liked):
+        self.start()
+        key = (int(user_id), int(routine_id))
+        with self.lock:
+            self.pending[key] = liked
+            # A new event replaces the one which failed to flush
+            self.attempts.pop(key, None)
+            full = len(self.pending) >= self.max_events
+        # If the buffer is full, wake the flush thread immediately
+        if full:
+            self.wake.set()
+
+    # Function to check if a user has a buffered like/unlike for a routine. Returns True (liked), False (unliked) or None (nothing buffered)
+    def pending_state(self, user_id, routine_id):
+        key = (int(user_id), int(routine_id))
+        with self.lock:
+            return self.pending.get(key, self.flushing.get(key))
+
+    # Function to check if a user has any buffered likes/unlikes
+    def has_pending(self, user_id):
+        user_id = int(user_id)
+        with self.lock:
+            return any(key[0] == user_id for key in (*self.pending, *self.flushing))
+
+    # Function to estimate how much a routine's stored likes_count will change once buffered events are flushed
+    # (buffered likes which already exist / unlikes which don't exist are ignored when flushed, so this can only be an estimate)
+    def pending_likes_delta(self, routine_id):
+        routine_id = int(routine_id)
+        with self.lock:
+            events = {**self.flushing, **self.pending}
+        return sum(1 if liked else -1 for (_, pending_routine_id), liked in events.items() if pending_routine_id == routine_id)
+
+    # Function to start the background flush thread (once per process)
+    def start(self):
+        if self.thread is None:
+            with self.lock:
+                if self.thread is None:
+                    self.thread = threading.Thread(target=self.run, name="like-buffer", daemon=True)
+                    self.thread.start()
+
+    # Background thread: flush every flush_interval seconds, or sooner if the buffer fills up
+    def run(self):
+        while True:
+            self.wake.wait(self.flush_interval)
+            self.wake.clear()
+            self.flush()
+
+    # Function to apply all buffered events to the database
+    def flush(self):
+        with self.flush_lock:
+            # Take all buffered events, leaving an empty buffer for new events
+            with self.lock:
+                if not self.pending:
+                    return
+                events, self.pending = self.pending, {}
+                self.flushing = events
+
+            likes = [key for key, liked in events.items() if liked]
+            unlikes = [key for key, liked in events.items() if not liked]
+
+            with self.app.app_context():
+                try:
+                    # Targets of the routines whose likes_count changed
+                    targets = set()
+                    if likes:
+                        targets.update(db.session.scalars(like_pairs(likes)))
+                    if unlikes:
+                        targets.update(db.session.scalars(unlike_pairs(unlikes)))
+                    db.session.commit()
+                    with self.lock:
+                        self.flushing = {}
+                        for key in events:
+                            self.attempts.pop(key, None)
+                    # Remove cached routine lists which show the changed likes counts
+                    if targets:
+                        response_cache.invalidate(*routine_list_tags(*targets))
+                except Exception:
+                    db.session.rollback()
+                    # Return events to the buffer to be retried (events recorded since take priority), unless they have failed max_attempts times
+                    dropped = []
+                    with self.lock:
+                        self.flushing = {}
+                        for key, liked in events.items():
+                            if key in self.pending:
+                                continue
+                            self.attempts[key] = self.attempts.get(key, 0) + 1
+                            if self.attempts[key] < self.max_attempts:
+                                self.pending[key] = liked
+                            else:
+                                del self.attempts[key]
+                                dropped.append((key, liked))
+                    logger.exception("Failed to flush %s buffered likes/unlikes. %s will be retried.", len(events), len(events) - len(dropped))
+                    if dropped:
+                        logger.error("Dropped %s likes/unlikes after %s failed flushes (user_id, routine_id, liked): %s",
+                                     len(dropped), self.max_attempts, [(*key, liked) for key, liked in dropped])
+                finally:
+                    db.session.remove()
+
+    # Function to apply a user's buffered events before their likes are written directly (e.g. liking many routines). Flushes the buffer, then discards
+    # any of the user's events which could not be flushed (routine_ids: only discard events for these routines), so they can't be applied after (and overwrite)
+    # the direct write. Waits for any flush in progress, which may hold the user's older events.
+    # Note: must not be called while holding row locks a flush may need (e.g. the user's row), as the flush would wait on them.
+    def flush_user(self, user_id, routine_ids=None):
+        with self.flush_lock:
+            self.flush()
+            self.discard_user(user_id, routine_ids)
+
+    # Function to remove a user's buffered events without applying them (e.g. the user is being deleted). routine_ids: only remove events for these routines
+    def discard_user(self, user_id, routine_ids=None):
+        user_id = int(user_id)
+        with self.lock:
+            for key in [key for key in self.pending if key[0] == user_id and (routine_ids is None or key[1] in routine_ids)]:
+                del self.pending[key]
+                self.attempts.pop(key, None)
+
+    # Function to check whether a user currently likes a routine, including buffered events (read-your-writes)
+    def user_likes_routine(self, user_id, routine_id):
+        state = self.pending_state(user_id, routine_id)
+        if state is not None:
+            return state
+        stmt = db.select(Like.id).filter_by(user_id=user_id, routine_id=routine_id)
+        return db.session.scalar(stmt) is not None
+
+
+# Create an instance of the like buffer (initialised with the flask app in main.py)
+like_buffer = LikeBuffer()
@@ -0,0 +1,82 @@
+# Import loader strategies from SQLAlchemy to control how relationships are fetched alongside a query
+from sqlalchemy.orm import selectinload, joinedload, load_only
+
+# Import models whose relationships are touched when routines are serialised
+from models.user import User
+from models.routine import Routine
+from models.routine_exercise import RoutineExercise
+from models.exercise import Exercise
+
+# Import the in-memory exercise catalog (exercise names of routine exercises are read from it when enabled)
+from catalog import exercise_catalog
+
+# LOADER OPTION PROFILES
+# Each profile describes which relationships a serialiser will touch, so they can be fetched up front in a fixed number of queries instead of lazily per row (N+1 queries).
+# selectinload is used on the routine itself (one extra "SELECT ... WHERE id IN (...)" query per relationship, regardless of how many rows were returned). This keeps the parent query free of extra joins, so it can safely be grouped, ordered or limited.
+# joinedload is used for many-to-one relationships hanging off those secondary queries (e.g. the exercise of each routine exercise).
+# Each profile accepts the sparse fieldset requested by the user (see fieldsets.py). When fields are provided, only the columns and relationships needed for those fields are loaded.
+# When fields is None (e.g. routes which modify the routine), every column and relationship used by the full schema is loaded.
+
+# Columns loaded for each routine schema field. id, public and user_id are always loaded (used for authorisation checks).
+ROUTINE_FIELD_COLUMNS = {
+    "routine_title": Routine.routine_title,
+    "description": Routine.description,
+    "target": Routine.target,
+    "last_updated": Routine.last_updated,
+    "likes_count": Routine.likes_count,
+}
+
+# Columns loaded for each exercise schema field. id and user_id are always loaded (used for authorisation checks).
+EXERCISE_FIELD_COLUMNS = {
+    "exercise_name": Exercise.exercise_name,
+    "description": Exercise.description,
+    "body_part": Exercise.body_part,
+}
+
+# Profile for routines dumped with routines_schema/routine_schema (created_by, routine_exercises + exercise names)
+# Note: likes are not loaded as likes_count is read from the denormalised likes_count column
+def routine_options(fields=None):
+    if fields is None:
+        return (
+            selectinload(Routine.user),
+            selectinload(Routine.routine_exercises).joinedload(RoutineExercise.exercise),
+        )
+
+    columns = [column for field, column in ROUTINE_FIELD_COLUMNS.items() if field in fields]
+    options = [load_only(Routine.id, Routine.public, Routine.user_id, *columns)]
+    if "created_by" in fields:
+        options.append(selectinload(Routine.user).load_only(User.username))
+    if "routine_exercises" in fields:
+        # Exercise names are read from the exercise catalog when it is enabled, so the exercises are only joined when it is disabled
+        if exercise_catalog.enabled:
+            options.append(selectinload(Routine.routine_exercises))
+        else:
+            options.append(selectinload(Routine.routine_exercises).joinedload(RoutineExercise.exercise).load_only(Exercise.exercise_name))
+    return tuple(options)
+
+# Profile for a list of routines (list endpoints). Kept separate to allow list and detail views to diverge.
+def routine_list_options(fields=None):
+    return routine_options(fields)
+
+# Profile for a single routine (detail endpoints)
+def routine_detail_options(fields=None):
+    return routine_options(fields)
+
+# Profile for routines read from their stored documents (see documents.py). Only the routine row is loaded (no owner, routine exercises or exercises).
+def routine_document_options():
+    return (
+        load_only(Routine.id, Routine.public, Routine.user_id, Routine.likes_count, Routine.document),
+    )
+
+# Profile for exercises dumped with exercises_schema/exercise_schema (created_by)
+def exercise_options(fields=None):
+    if fields is None:
+        return (
+            selectinload(Exercise.user),
+        )
+
+    columns = [column for field, column in EXERCISE_FIELD_COLUMNS.items() if field in fields]
+    options = [load_only(Exercise.id, Exercise.user_id, *columns)]
+    if "created_by" in fields:
+        options.append(selectinload(Exercise.user).load_only(User.username))
+    return tuple(options)
@@ -2,29 +2,102 @@ import os # Import os for environment functionality
 from flask import Flask # Import flask to create flask application
 from marshmallow.exceptions import ValidationError # Import ValidationError to utlise in app.errorhandler
 from sqlalchemy.exc import IntegrityError # Import IntegrityError to utilise in app.errorhandler
+from hashing import HashingBusyError # Import HashingBusyError to utilise in app.errorhandler
+from json_provider import FastJSONProvider # Import FastJSONProvider to encode responses (orjson/msgpack when installed)
 
 # Import sqlalchemy, mashmallow, bcrypt and JWTManager to be initialised
-from init import db, ma, bcrypt, jwt
+from init import db, ma, bcrypt, jwt, hasher, limiter, compressor, conditional_get, response_cache
+
+# Import WRITE_METHODS for configuring rate limits of routes which modify data
+from rate_limit import WRITE_METHODS
+
+# Import like buffer to be initialised (batches likes/unlikes when enabled)
+from like_buffer import like_buffer
+
+# Import the in-memory exercise catalog to be initialised
+from catalog import exercise_catalog
 
 # Import all blueprints for registration
 from controllers.cli_controllers import db_commands
 from controllers.auth_controller import auth_bp
 from controllers.exercises_controller import exercises_bp
 from controllers.routines_controller import routines_bp
+from controllers.cache_controller import cache_bp
 
 # Create Flask app
 def create_app():
     app = Flask(__name__)
 
+    # Encode responses with the fast JSON provider (orjson when installed, MessagePack for clients which send Accept: application/msgpack)
+    app.json = FastJSONProvider(app)
+
     # Configure connection to database. Retrieve DATABASE_URL & JWT_SECRET_KEY from .env 
     app.config["SQLALCHEMY_DATABASE_URI"] = os.environ.get("DATABASE_URL")
     app.config["JWT_SECRET_KEY"] = os.environ.get("JWT_SECRET_KEY")
+    # Include a signed is_admin claim in tokens issued at login (default = false). Allows read-only (GET) routes to check admin status without fetching the user
+    # from the database. Routes which modify data always check the database.
+    # Note: on GET routes, a change to a user's admin status only applies to tokens issued after the change.
+    app.config["JWT_ADMIN_CLAIM"] = os.environ.get("JWT_ADMIN_CLAIM", "false").lower() == "true"
+
+    # Configure password hashing. BCRYPT_LOG_ROUNDS = cost of new hashes (existing hashes are upgraded on login).
+    # HASHING_POOL_SIZE = number of hashes run in parallel, HASHING_QUEUE_SIZE = number of hashes which can wait for the pool before requests are rejected
+    app.config["BCRYPT_LOG_ROUNDS"] = int(os.environ.get("BCRYPT_LOG_ROUNDS", 12))
+    app.config["HASHING_POOL_SIZE"] = int(os.environ.get("HASHING_POOL_SIZE", 4))
+    app.config["HASHING_QUEUE_SIZE"] = int(os.environ.get("HASHING_QUEUE_SIZE", 32))
+
+    # Configure like buffer. When enabled, likes/unlikes are buffered and written to the database in batches every LIKE_BUFFER_FLUSH_INTERVAL seconds (or every LIKE_BUFFER_MAX_EVENTS events).
+    # Events which fail to flush LIKE_BUFFER_MAX_ATTEMPTS times are dropped.
+    app.config["LIKE_BUFFER_ENABLED"] = os.environ.get("LIKE_BUFFER_ENABLED", "false").lower() == "true"
+    app.config["LIKE_BUFFER_FLUSH_INTERVAL"] = float(os.environ.get("LIKE_BUFFER_FLUSH_INTERVAL", 0.05))
+    app.config["LIKE_BUFFER_MAX_EVENTS"] = int(os.environ.get("LIKE_BUFFER_MAX_EVENTS", 1000))
+    app.config["LIKE_BUFFER_MAX_ATTEMPTS"] = int(os.environ.get("LIKE_BUFFER_MAX_ATTEMPTS", 3))
+
+    # Configure response compression. Responses of at least COMPRESS_MIN_SIZE bytes are compressed with brotli, zstd or gzip (whichever the client accepts and is installed).
+    app.config["COMPRESS_ENABLED"] = os.environ.get("COMPRESS_ENABLED", "true").lower() == "true"
+    app.config["COMPRESS_MIN_SIZE"] = int(os.environ.get("COMPRESS_MIN_SIZE", 500))
+
+    # Configure caching headers for read routes (seconds a browser / shared cache may reuse a response before revalidating it with its ETag, default 0 = always revalidate)
+    app.config["CACHE_MAX_AGE"] = int(os.environ.get("CACHE_MAX_AGE", 0))
+    app.config["CACHE_SHARED_MAX_AGE"] = int(os.environ.get("CACHE_SHARED_MAX_AGE", 0))
+
+    # Configure the server-side response cache for anonymous routine lists and the exercise catalog. Entries expire after RESPONSE_CACHE_TTL seconds
+    # (or sooner when the data changes). At most RESPONSE_CACHE_MAX_ENTRIES responses are kept per worker process (least recently used are evicted).
+    # Disabled by default: cached responses and invalidations are per worker process, so only enable it with a single worker process
+    # (or provide a shared backend with RESPONSE_CACHE_BACKEND, see response_cache.py).
+    app.config["RESPONSE_CACHE_ENABLED"] = os.environ.get("RESPONSE_CACHE_ENABLED", "false").lower() == "true"
+    app.config["RESPONSE_CACHE_TTL"] = int(os.environ.get("RESPONSE_CACHE_TTL", 30))
+    app.config["RESPONSE_CACHE_MAX_ENTRIES"] = int(os.environ.get("RESPONSE_CACHE_MAX_ENTRIES", 1024))
+    # Identical concurrent reads share a single computation of the response (within a worker process). Waiting requests compute their own response after SINGLE_FLIGHT_TIMEOUT seconds.
+    app.config["SINGLE_FLIGHT_ENABLED"] = os.environ.get("SINGLE_FLIGHT_ENABLED", "true").lower() == "true"
+    app.config["SINGLE_FLIGHT_TIMEOUT"] = float(os.environ.get("SINGLE_FLIGHT_TIMEOUT", 5))
+
+    # Configure the in-memory exercise catalog. Each worker process keeps a copy of every exercise and checks whether it has changed at most every
+    # EXERCISE_CATALOG_CHECK_INTERVAL seconds (changes made by other worker processes are seen within that interval).
+    app.config["EXERCISE_CATALOG_ENABLED"] = os.environ.get("EXERCISE_CATALOG_ENABLED", "true").lower() == "true"
+    app.config["EXERCISE_CATALOG_CHECK_INTERVAL"] = float(os.environ.get("EXERCISE_CATALOG_CHECK_INTERVAL", 1))
+
+    # Configure rate limits per blueprint (token buckets: 'limit' requests per 'per' seconds, per route, per client)
+    # Login/register are limited by IP address as they are CPU expensive (bcrypt). Routes which modify data are limited per logged in user.
+    app.config["RATE_LIMIT_ENABLED"] = os.environ.get("RATE_LIMIT_ENABLED", "true").lower() == "true"
+    app.config["RATE_LIMITS"] = {
+        "auth": [{"limit": 10, "per": 60, "methods": ["POST"], "key": "ip"}],
+        "exercises": [{"limit": 60, "per": 60, "methods": WRITE_METHODS, "key": "user"}],
+        "routines": [{"limit": 120, "per": 60, "methods": WRITE_METHODS, "key": "user"}],
+    }
 
     # Initialise database, marshmallow, bcrypt and JWT with flask app
     db.init_app(app)
     ma.init_app(app)
     bcrypt.init_app(app)
     jwt.init_app(app)
+    hasher.init_app(app)
+    limiter.init_app(app)
+    like_buffer.init_app(app)
+    compressor.init_app(app)
+    # Initialised after the compressor so validators are added before the response is compressed (after_request functions run in reverse order)
+    conditional_get.init_app(app)
+    response_cache.init_app(app)
+    exercise_catalog.init_app(app)
 
     # GLOBAL ERROR HANDLERS IN ORDER OF SPECIFICITY
 
@@ -39,6 +112,11 @@ def create_app():
         db.session.rollback()
         return {"error": "An unexpected database integrity error has occurred. To prevent any loss, we've rolled back any changes you've made."}, 400
     
+    # Global HashingBusyError handler. If the password hashing pool is full, returns error message with 503 HTTP status (service unavailable) and asks the client to retry shortly.
+    @app.errorhandler(HashingBusyError)
+    def hashing_busy(err):
+        return {"error": "We are currently receiving a high number of requests. Please try again shortly."}, 503, {"Retry-After": "1"}
+
     # Global JWT authentication/unauthorised access error handler. Custom error message requesting user to log in.
     @jwt.unauthorized_loader
     def unauthorised_response(callback):
@@ -64,5 +142,6 @@ def create_app():
     app.register_blueprint(auth_bp)
     app.register_blueprint(exercises_bp)
     app.register_blueprint(routines_bp)
+    app.register_blueprint(cache_bp)
 
     return app
\ No newline at end of file
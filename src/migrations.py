@@ -0,0 +1,213 @@
+# Import text to execute raw SQL statements
+from sqlalchemy import text
+
+# Import SQLAlchemy database for the migrations table and database connections
+from init import db
+
+
+# Table which records the migrations that have been applied to the database (created alongside the model tables by 'flask db create')
+schema_migrations = db.Table(
+    "schema_migrations",
+    db.Column("version", db.String, primary_key=True),
+    db.Column("description", db.String, nullable=False),
+    db.Column("applied_at", db.DateTime, server_default=db.func.current_timestamp(), nullable=False)
+)
+
+
+# Error raised when migrations cannot be run (e.g. unsupported database)
+class MigrationError(Exception):
+    pass
+
+
+# MIGRATIONS
+# Each migration is a function which receives a database connection. Migrations are written in plain SQL (rather than using the models) so they keep
+# doing exactly what they did when they were written, even after the models change.
+# Transactional migrations run inside a single transaction (all or nothing). Non-transactional migrations run in autocommit mode, which is required for
+# CREATE INDEX CONCURRENTLY. Non-transactional migrations must be safe to run again if they fail part way through (e.g. IF NOT EXISTS).
+
+# 0001 - denormalised likes_count column on routines, filled in from the likes table
+def add_likes_count(connection):
+    connection.execute(text("ALTER TABLE routines ADD COLUMN IF NOT EXISTS likes_count INTEGER NOT NULL DEFAULT 0"))
+    connection.execute(text(
+        "UPDATE routines SET likes_count = (SELECT count(*) FROM likes WHERE likes.routine_id = routines.id), last_updated = last_updated"
+    ))
+
+# 0002 - each user can only like a routine once. Duplicate likes (keeping the oldest) are removed before the constraint is added.
+# The unique index is built without blocking writes (CREATE UNIQUE INDEX CONCURRENTLY), then attached as the constraint (a brief lock, no table scan).
+# If a duplicate like is added while the index is built, the build fails. Running the migration again removes it and rebuilds the index.
+def add_unique_likes(connection):
+    connection.execute(text(
+        "DELETE FROM likes duplicate USING likes original "
+        "WHERE duplicate.user_id = original.user_id AND duplicate.routine_id = original.routine_id AND duplicate.id > original.id"
+    ))
+    create_index_concurrently(connection, "likes", "uq_likes_user_routine", "user_id, routine_id", unique=True)
+    constraint = connection.execute(text("SELECT 1 FROM pg_constraint WHERE conname = 'uq_likes_user_routine'")).first()
+    if not constraint:
+        connection.execute(text("ALTER TABLE likes ADD CONSTRAINT uq_likes_user_routine UNIQUE USING INDEX uq_likes_user_routine"))
+    connection.execute(text(
+        "UPDATE routines SET likes_count = (SELECT count(*) FROM likes WHERE likes.routine_id = routines.id), last_updated = last_updated"
+    ))
+
+# 0003 - likes and routine exercises are deleted by the database when their user/routine is deleted (ON DELETE CASCADE).
+# Constraints are replaced as NOT VALID (no scan of the table while it is locked), then validated separately (existing rows are checked without blocking writes).
+CASCADE_FOREIGN_KEYS = [
+    ("likes", "likes_user_id_fkey", "user_id", "users"),
+    ("likes", "likes_routine_id_fkey", "routine_id", "routines"),
+    ("routine_exercises", "routine_exercises_routine_id_fkey", "routine_id", "routines"),
+]
+
+def add_cascade_foreign_keys(connection):
+    for table, name, column, referenced_table in CASCADE_FOREIGN_KEYS:
+        connection.execute(text(
+            f"ALTER TABLE {table} DROP CONSTRAINT IF EXISTS {name}, "
+            f"ADD CONSTRAINT {name} FOREIGN KEY ({column}) REFERENCES {referenced_table} (id) ON DELETE CASCADE NOT VALID"
+        ))
+    for table, name, column, referenced_table in CASCADE_FOREIGN_KEYS:
+        connection.execute(text(f"ALTER TABLE {table} VALIDATE CONSTRAINT {name}"))
+
+# 0004 - indexes for the filters/sorts used by the list routes (see the index declarations in models/)
+# (table, index name, indexed columns)
+LIST_INDEXES = [
+    ("routines", "ix_routines_public_recent", "public, last_updated DESC, id DESC"),
+    ("routines", "ix_routines_user_recent", "user_id, last_updated DESC, id DESC"),
+    ("routines", "ix_routines_target_recent", "target, public, last_updated DESC, id DESC"),
+    ("routines", "ix_routines_target_popular", "target, public, likes_count DESC, id DESC"),
+    ("routines", "ix_routines_target_title", "target, public, routine_title, id"),
+    ("likes", "ix_likes_user_recent", "user_id, created DESC, id DESC"),
+    ("likes", "ix_likes_routine_id", "routine_id"),
+    ("routine_exercises", "ix_routine_exercises_routine_id", "routine_id"),
+    ("routine_exercises", "ix_routine_exercises_exercise_id", "exercise_id"),
+    ("exercises", "ix_exercises_body_part_name", "body_part, exercise_name, id"),
+    ("exercises", "ix_exercises_user_name", "user_id, exercise_name, id"),
+    ("exercises", "ix_exercises_name_prefix", "lower(exercise_name) text_pattern_ops"),
+]
+
+def add_list_indexes(connection):
+    for table, name, columns in LIST_INDEXES:
+        create_index_concurrently(connection, table, name, columns)
+
+# 0005 - last_updated timestamp on exercises (existing exercises are treated as updated when the migration runs)
+def add_exercise_last_updated(connection):
+    connection.execute(text("ALTER TABLE exercises ADD COLUMN IF NOT EXISTS last_updated TIMESTAMP WITHOUT TIME ZONE NOT NULL DEFAULT CURRENT_TIMESTAMP"))
+
+# 0006 - Denormalised routine documents (see documents.py). Existing routines are served from the tables until "flask db rebuild-documents" is run.
+def add_routine_document(connection):
+    connection.execute(text("ALTER TABLE routines ADD COLUMN IF NOT EXISTS document JSON"))
+
+# 0007 - Versions of the in-memory catalogs (see catalog.py)
+def add_catalog_versions(connection):
+    connection.execute(text("CREATE TABLE IF NOT EXISTS catalog_versions (name VARCHAR PRIMARY KEY, version INTEGER NOT NULL DEFAULT 0)"))
+
+# 0008 - Trigram index for exercise search (see search.py). pg_trgm is included with PostgreSQL, creating the extension requires the CREATE privilege on the database.
+def add_exercise_search_index(connection):
+    connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+    create_index_concurrently(connection, "exercises", "ix_exercises_name_trgm", "lower(exercise_name) gin_trgm_ops", using="gin")
+
+# 0009 - Indexes for the alphabetical order of exercise lists (lower cased name in "C" collation, see exercise_name_order in models/exercise.py),
+# replacing the 0004 indexes sorted by exercise_name
+EXERCISE_ORDER_INDEXES = [
+    ("exercises", "ix_exercises_name_order", 'lower(exercise_name) COLLATE "C", id'),
+    ("exercises", "ix_exercises_body_part_order", 'body_part, lower(exercise_name) COLLATE "C", id'),
+    ("exercises", "ix_exercises_user_order", 'user_id, lower(exercise_name) COLLATE "C", id'),
+]
+
+def add_exercise_order_indexes(connection):
+    for table, name, columns in EXERCISE_ORDER_INDEXES:
+        create_index_concurrently(connection, table, name, columns)
+    connection.execute(text("DROP INDEX CONCURRENTLY IF EXISTS ix_exercises_body_part_name"))
+    connection.execute(text("DROP INDEX CONCURRENTLY IF EXISTS ix_exercises_user_name"))
+
+
+# Ordered list of all migrations: (version, description, migration function, transactional)
+# New migrations must be appended to the end of the list with the next version number. Never change a migration once it has been released.
+MIGRATIONS = [
+    ("0001", "Add likes_count to routines", add_likes_count, True),
+    ("0002", "Add unique constraint on likes (user_id, routine_id)", add_unique_likes, False),
+    ("0003", "Delete likes and routine exercises with their user/routine (ON DELETE CASCADE)", add_cascade_foreign_keys, False),
+    ("0004", "Add indexes for list routes", add_list_indexes, False),
+    ("0005", "Add last_updated to exercises", add_exercise_last_updated, True),
+    ("0006", "Add document to routines", add_routine_document, True),
+    ("0007", "Add catalog_versions table", add_catalog_versions, True),
+    ("0008", "Add trigram index for exercise search", add_exercise_search_index, False),
+    ("0009", "Replace exercise list indexes with case-insensitive alphabetical order", add_exercise_order_indexes, False),
+]
+
+
+# Function to build an index without locking the table against writes (CREATE INDEX CONCURRENTLY, must be run in autocommit mode). unique: build a unique index
+# If a previous concurrent build failed, PostgreSQL leaves an invalid index behind which IF NOT EXISTS would skip, so it is dropped and rebuilt.
+def create_index_concurrently(connection, table, name, columns, using=None, unique=False):
+    invalid = connection.execute(text(
+        "SELECT 1 FROM pg_class JOIN pg_index ON pg_index.indexrelid = pg_class.oid WHERE pg_class.relname = :name AND NOT pg_index.indisvalid"
+    ), {"name": name}).first()
+    if invalid:
+        connection.execute(text(f"DROP INDEX CONCURRENTLY IF EXISTS {name}"))
+    method = f" USING {using}" if using else ""
+    kind = "UNIQUE INDEX" if unique else "INDEX"
+    connection.execute(text(f"CREATE {kind} CONCURRENTLY IF NOT EXISTS {name} ON {table}{method} ({columns})"))
+
+
+# Function to fetch the versions of all applied migrations
+def applied_versions(connection):
+    schema_migrations.create(connection, checkfirst=True)
+    return set(connection.execute(db.select(schema_migrations.c.version)).scalars())
+
+
+# Function to list every migration with whether it has been applied: [(version, description, applied)]
+def migration_status():
+    with db.engine.begin() as connection:
+        applied = applied_versions(connection)
+    return [(version, description, version in applied) for version, description, migrate, transactional in MIGRATIONS]
+
+
+# Function to apply all pending migrations in order. Each migration is recorded as applied once it completes, so a failed migration can be fixed and run again.
+# Yields (version, description) as each migration is applied.
+def run_migrations():
+    engine = db.engine
+    if engine.dialect.name != "postgresql":
+        raise MigrationError(f"Migrations require PostgreSQL (current database: {engine.dialect.name}).")
+
+    with engine.begin() as connection:
+        applied = applied_versions(connection)
+
+    for version, description, migrate, transactional in MIGRATIONS:
+        if version in applied:
+            continue
+        if transactional:
+            # Run migration and record it in the same transaction
+            with engine.begin() as connection:
+                migrate(connection)
+                connection.execute(db.insert(schema_migrations).values(version=version, description=description))
+        else:
+            # Run migration in autocommit mode (each statement is committed as it runs)
+            with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+                migrate(connection)
+                connection.execute(db.insert(schema_migrations).values(version=version, description=description))
+        yield version, description
+
+
+# Function to record every migration as applied without running them. Used when tables are created from the models (flask db create), which already include every change.
+def stamp_migrations():
+    with db.engine.begin() as connection:
+        applied = applied_versions(connection)
+        for version, description, migrate, transactional in MIGRATIONS:
+            if version not in applied:
+                connection.execute(db.insert(schema_migrations).values(version=version, description=description))
+
+
+# Function to find which indexes the database uses for a query, using EXPLAIN (PostgreSQL only).
+# Returns (index names used, tables read with a sequential scan)
+def explain_indexes(connection, stmt):
+    # render_postcompile renders IN (...) lists as individual parameters
+    compiled = stmt.compile(dialect=connection.dialect, compile_kwargs={"render_postcompile": True})
+    plan = connection.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {compiled}", compiled.params).scalar()
+    indexes, seq_scans = [], []
+    # Walk the query plan tree
+    nodes = [plan[0]["Plan"]]
+    while nodes:
+        node = nodes.pop()
+        if "Index Name" in node and node["Index Name"] not in indexes:
+            indexes.append(node["Index Name"])
+        if node["Node Type"] == "Seq Scan" and node["Relation Name"] not in seq_scans:
+            seq_scans.append(node["Relation Name"])
+        nodes.extend(node.get("Plans", []))
+    return indexes, seq_scans
@@ -1,6 +1,9 @@
 # Import sqlalchemy and marshmallow
 from init import db, ma
 
+# Import func method for database methods (timestamp), event and DDL to create the pg_trgm extension alongside the tables
+from sqlalchemy import func, event, DDL
+
 # Import mashmallow modules for validation of fields and defining schemas
 from marshmallow import fields
 from marshmallow.validate import OneOf, Length
@@ -18,6 +21,8 @@ class Exercise(db.Model):
     exercise_name = db.Column(db.String, nullable=False, unique=True)
     description = db.Column(db.String)
     body_part = db.Column(db.String, nullable=False)
+    # When the exercise was last updated (used to tell clients and caches whether exercises, or routines which include them, have changed). Not included in responses.
+    last_updated = db.Column(db.DateTime, server_default=func.current_timestamp(), onupdate=func.current_timestamp(), nullable=False)
 
     # Foreign Keys
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
@@ -26,6 +31,24 @@ class Exercise(db.Model):
     user = db.relationship("User", back_populates="exercises")
     routine_exercises = db.relationship("RoutineExercise", back_populates="exercise")
 
+# Sort order of exercise lists (alphabetical): the lower cased exercise name compared by code point ("C" collation), then ID. The collation is fixed so the
+# database returns the same order as the in-memory exercise catalog (see exercise_sort_values in catalog.py), whatever the database's default collation.
+exercise_name_order = db.func.lower(Exercise.exercise_name, type_=db.String).collate("C")
+
+# Indexes for the filters used by the exercise list routes, ending with the (exercise_name_order, id) sort keys used for keyset pagination (existing databases receive these indexes via migrations.py)
+# No filter (GET /exercises), and name prefix matches for exercise search (LIKE 'prefix%' can use it as it is in the C collation, see search.py)
+db.Index("ix_exercises_name_order", exercise_name_order, Exercise.id)
+# Filter by body part (GET /exercises?body_part=..., GET /exercises/<body_part>)
+db.Index("ix_exercises_body_part_order", Exercise.body_part, exercise_name_order, Exercise.id)
+# Filter by creator (GET /exercises?user_id=..., GET /exercises/user/<user_id>)
+db.Index("ix_exercises_user_order", Exercise.user_id, exercise_name_order, Exercise.id)
+# Case-insensitive name prefix search (GET /exercises?name=...). text_pattern_ops allows LIKE 'prefix%' to use the index regardless of the database collation.
+db.Index("ix_exercises_name_prefix", db.func.lower(Exercise.exercise_name).label("lower_exercise_name"), postgresql_ops={"lower_exercise_name": "text_pattern_ops"})
+# Exercise search (GET /exercises/search?q=). A trigram (pg_trgm) index for word prefix (LIKE '% terms%') and fuzzy (terms <% name) matches.
+db.Index("ix_exercises_name_trgm", db.func.lower(Exercise.exercise_name).label("lower_exercise_name_trgm"), postgresql_using="gin", postgresql_ops={"lower_exercise_name_trgm": "gin_trgm_ops"})
+# The pg_trgm extension must exist before the exercises table (and its trigram index) is created
+event.listen(Exercise.__table__, "before_create", DDL("CREATE EXTENSION IF NOT EXISTS pg_trgm").execute_if(dialect="postgresql"))
+
 class ExerciseSchema(ma.Schema):
     # Reason for validation is to ensure any required fields are included in user requests. Also ensures inputs are not too larger. Nested values are also included (e.g. created_by) to allow more information to users when exercises are included in responses.
     exercise_name = fields.String(required=True, validate=Length(max=50, min=1))
@@ -4,23 +4,93 @@ from init import db, ma
 # Import func method for database methods (timestamp)
 from sqlalchemy import func
 
+# Import PostgreSQL insert to allow INSERT ... ON CONFLICT DO NOTHING
+from sqlalchemy.dialects.postgresql import insert
+
+# Import Routine model and increment_likes to keep the routine's likes_count in step with the Like table
+from models.routine import Routine, increment_likes
+# Import User model to skip buffered likes by deleted users
+from models.user import User
+
 # Table for Like Model
 class Like(db.Model):
     # Name of table
     __tablename__ = "likes"
+    # A user can only like a routine once (also enforced under concurrent requests)
+    __table_args__ = (db.UniqueConstraint("user_id", "routine_id", name="uq_likes_user_routine"),)
 
     # Attributes of table
     id = db.Column(db.Integer, primary_key=True)
     # Foreign Keys
     # Note: created attribute with timestamp has been added to assist "View Liked Routines" route to allow user to retrieve the like routines from most recently liked to oldest.
-    user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
-    routine_id = db.Column(db.Integer, db.ForeignKey("routines.id"), nullable=False)
+    # Likes are deleted by the database when the associated user or routine is deleted (ON DELETE CASCADE)
+    user_id = db.Column(db.Integer, db.ForeignKey("users.id", ondelete="CASCADE"), nullable=False)
+    routine_id = db.Column(db.Integer, db.ForeignKey("routines.id", ondelete="CASCADE"), nullable=False)
     created = db.Column(db.DateTime, server_default=func.current_timestamp(), nullable=False)
 
     # Define relationships with routine and user table 
     routine = db.relationship("Routine", back_populates="likes")
     user = db.relationship("User", back_populates="likes")
 
+# Indexes (existing databases receive these indexes via migrations.py). Lookups by user_id alone use the unique (user_id, routine_id) constraint.
+# GET /routines/liked (a user's likes, most recently liked first)
+db.Index("ix_likes_user_recent", Like.user_id, Like.created.desc(), Like.id.desc())
+# Likes of a routine (deleting a routine, recounting likes)
+db.Index("ix_likes_routine_id", Like.routine_id)
+
+# Function to build a single statement which likes the provided routine IDs for a user and increments the likes_count of each newly liked routine:
+# WITH inserted AS (INSERT INTO likes (user_id, routine_id) SELECT :user_id, id FROM routines WHERE id IN (...) AND public
+#                   ON CONFLICT (user_id, routine_id) DO NOTHING RETURNING routine_id)
+# UPDATE routines SET likes_count = likes_count + 1 WHERE id IN (SELECT routine_id FROM inserted) RETURNING id, routine_title, target
+# Only routines which exist, are public and were not already liked are returned (safe to repeat, safe under concurrent requests)
+def like_routines(user_id, routine_ids):
+    likeable = db.select(db.literal(int(user_id), db.Integer), Routine.id).where(Routine.id.in_(routine_ids), Routine.public == True)
+    inserted = insert(Like.__table__).from_select(["user_id", "routine_id"], likeable).on_conflict_do_nothing(
+        index_elements=["user_id", "routine_id"]).returning(Like.__table__.c.routine_id).cte("inserted")
+    return increment_likes(db.select(inserted.c.routine_id)).add_cte(inserted).returning(Routine.id, Routine.routine_title, Routine.target)
+
+# Function to build a single statement which unlikes the provided routine IDs for a user and decrements the likes_count of each unliked routine:
+# WITH deleted AS (DELETE FROM likes WHERE user_id = :user_id AND routine_id IN (...) RETURNING routine_id)
+# UPDATE routines SET likes_count = likes_count - 1 WHERE id IN (SELECT routine_id FROM deleted) RETURNING id, routine_title, target
+# Only routines which were liked by the user are returned
+def unlike_routines(user_id, routine_ids):
+    deleted = db.delete(Like.__table__).where(
+        Like.__table__.c.user_id == int(user_id), Like.__table__.c.routine_id.in_(routine_ids)).returning(Like.__table__.c.routine_id).cte("deleted")
+    return increment_likes(db.select(deleted.c.routine_id), -1).add_cte(deleted).returning(Routine.id, Routine.routine_title, Routine.target)
+
+# Function to build a single statement which applies a batch of likes from many users, e.g. buffered likes (see like_buffer.py):
+# WITH inserted AS (INSERT INTO likes (user_id, routine_id) SELECT events.user_id, events.routine_id FROM (VALUES (...), (...)) AS events JOIN routines ON routines.id = events.routine_id
+#                   JOIN users ON users.id = events.user_id WHERE routines.public ON CONFLICT (user_id, routine_id) DO NOTHING RETURNING routine_id)
+# UPDATE routines SET likes_count = likes_count + counts.amount FROM (SELECT routine_id, count(*) AS amount FROM inserted GROUP BY routine_id) AS counts WHERE routines.id = counts.routine_id
+# Each routine's counter is updated once per batch, no matter how many of its likes are in the batch.
+# Likes of routines or by users which have been deleted since the like was buffered are skipped (rather than failing the whole batch).
+def like_pairs(pairs):
+    likes, routines, users = Like.__table__, Routine.__table__, User.__table__
+    events = db.values(db.column("user_id", db.Integer), db.column("routine_id", db.Integer), name="events").data(pairs)
+    likeable = db.select(events.c.user_id, events.c.routine_id).join(routines, routines.c.id == events.c.routine_id).join(
+        users, users.c.id == events.c.user_id).where(routines.c.public == True)
+    inserted = insert(likes).from_select(["user_id", "routine_id"], likeable).on_conflict_do_nothing(
+        index_elements=["user_id", "routine_id"]).returning(likes.c.routine_id).cte("inserted")
+    return update_likes_count(inserted, 1)
+
+# Function to build a single statement which applies a batch of unlikes from many users (the counterpart of like_pairs):
+# WITH deleted AS (DELETE FROM likes WHERE (user_id, routine_id) IN ((...), (...)) RETURNING routine_id)
+# UPDATE routines SET likes_count = likes_count - counts.amount FROM (SELECT routine_id, count(*) AS amount FROM deleted GROUP BY routine_id) AS counts WHERE routines.id = counts.routine_id
+def unlike_pairs(pairs):
+    likes = Like.__table__
+    deleted = db.delete(likes).where(
+        db.tuple_(likes.c.user_id, likes.c.routine_id).in_(pairs)).returning(likes.c.routine_id).cte("deleted")
+    return update_likes_count(deleted, -1)
+
+# Function to build the grouped likes_count update for the routine IDs returned by a like/unlike CTE (see like_pairs and unlike_pairs). Returns the target of each updated routine.
+def update_likes_count(changed, sign):
+    routines = Routine.__table__
+    counts = db.select(changed.c.routine_id, db.func.count().label("amount")).group_by(changed.c.routine_id).subquery("counts")
+    return db.update(routines).where(routines.c.id == counts.c.routine_id).values(
+        likes_count=routines.c.likes_count + sign * counts.c.amount,
+        last_updated=routines.c.last_updated # Liking a routine does not count as the routine being updated
+    ).add_cte(changed).returning(routines.c.target)
+
 class LikeSchema(ma.Schema):
     # Confirms which fields will be visible
     class Meta:
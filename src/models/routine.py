@@ -4,6 +4,9 @@ from init import db, ma
 # Import func method for database methods (timestamp)
 from sqlalchemy import func
 
+# Import deferred so the routine document is only loaded when requested
+from sqlalchemy.orm import deferred
+
 # Import mashmallow modules for validation of fields and defining schemas
 from marshmallow import fields, validates
 from marshmallow.validate import OneOf, Length
@@ -23,25 +26,53 @@ class Routine(db.Model):
     target = db.Column(db.String, nullable=False)
     public = db.Column(db.Boolean, default=False, nullable=False)
     last_updated = db.Column(db.DateTime, server_default=func.current_timestamp(), onupdate=func.current_timestamp(), nullable=False)
+    # Denormalised count of likes. Maintained atomically by the like/unlike routes (see increment_likes) to avoid loading every Like row just to count them.
+    likes_count = db.Column(db.Integer, default=0, server_default="0", nullable=False)
+    # Denormalised document of the serialised routine (except likes_count), rebuilt whenever the routine changes (see documents.py).
+    # Deferred: only loaded by read routes which return routines (see routine_document_options in loaders.py).
+    document = deferred(db.Column(db.JSON))
 
     # Foreign Keys
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
 
     # Define relationships with user, routine exercises and likes table. Delete all associated routine exercises and likes when routine is deleted.
+    # passive_deletes: associated routine exercises and likes are deleted by the database (ON DELETE CASCADE) rather than loaded and deleted one at a time
     # Note: Routine exercises associated with public routines will be kept by transferring ownership to "DELETED ACCOUNT" account if user chooses to not delete public routines when deleting account (see logic for delete user in auth_controller.py)
     user = db.relationship("User", back_populates="routines")
-    routine_exercises = db.relationship("RoutineExercise", back_populates="routine", cascade="all, delete")
-    likes = db.relationship("Like", back_populates="routine", cascade="all, delete")
+    routine_exercises = db.relationship("RoutineExercise", back_populates="routine", cascade="all, delete", passive_deletes=True)
+    likes = db.relationship("Like", back_populates="routine", cascade="all, delete", passive_deletes=True)
+
+# Function to build an atomic "UPDATE routines SET likes_count = likes_count + amount" statement for the given routine ID/s.
+# The database performs the arithmetic, so concurrent likes/unlikes cannot overwrite each other.
+# Note: last_updated is explicitly set to itself so liking a routine does not count as the routine being updated (bypasses onupdate).
+def increment_likes(routine_ids, amount=1):
+    return db.update(Routine).where(
+        Routine.id.in_(routine_ids)).values(
+            likes_count=Routine.likes_count + amount,
+            last_updated=Routine.last_updated
+        ).execution_options(synchronize_session=False)
 
-    # Function to count how many users have liked the specific instance of a routine. Accesses relationship with Like model via 'likes'.
-    def count_likes(self):
-        return len(self.likes)
+# Function to fetch the response cache tags of the cached routine lists which include routines with the provided targets (see response_cache.py):
+# "routines" (GET /routines) and "routines:<target>" (GET /routines/<target>, every sort order)
+def routine_list_tags(*targets):
+    return ["routines", *(f"routines:{target}" for target in targets)]
+
+# Indexes for the filters/sorts used by the routine list routes (see ROUTINE_SORT_KEYS in routines_controller.py). Each index ends with the sort keys used for keyset pagination,
+# so a page can be read directly from the index in order instead of sorting every matching routine. Existing databases receive these indexes via migrations.py (flask db migrate).
+# GET /routines (public routines, most recently updated first)
+db.Index("ix_routines_public_recent", Routine.public, Routine.last_updated.desc(), Routine.id.desc())
+# GET /routines (logged in user's own routines) and deleting a user's routines
+db.Index("ix_routines_user_recent", Routine.user_id, Routine.last_updated.desc(), Routine.id.desc())
+# GET /routines/<target> for each sort (?sort=recent/oldest, ?sort=popular and the default alphabetical sort)
+db.Index("ix_routines_target_recent", Routine.target, Routine.public, Routine.last_updated.desc(), Routine.id.desc())
+db.Index("ix_routines_target_popular", Routine.target, Routine.public, Routine.likes_count.desc(), Routine.id.desc())
+db.Index("ix_routines_target_title", Routine.target, Routine.public, Routine.routine_title, Routine.id)
 
 class RoutineSchema(ma.Schema):
     # Reason for validation are as per error messages provided. 
     # Generally ensure user inputs are not too long and any required inputs are provided by user.
     # Also used for formatting (e.g. timestamp) and allowing nesting of data from other tables (e.g. created_by & routine methods).
-    # Also incorporate fields.Method to call function (get_likes_count) which calculates the amount of likes for a particular routine instance which can then be seen by user when routine is dumped. 
+    # Also includes the likes_count which is read directly from the denormalised likes_count column (dump only).
     routine_title = fields.String(validate=Length(max=50), error="Routine title cannot exceed 50 characters.")
     description = fields.String(validate=Length(max=255), error="You have exceeded the 255 character count limit.")
     target = fields.String(validate=OneOf(VALID_TARGET))
@@ -49,17 +80,13 @@ class RoutineSchema(ma.Schema):
     last_updated = fields.Method("format_timestamp")
     created_by = fields.Nested("UserSchema", only=["username"], attribute="user")
     routine_exercises = fields.List(fields.Nested('RoutineExerciseSchema'), attribute="routine_exercises")
-    # Defines the "likes_count" field as an integer which is equal to the result of the "count_likes" method in the Routine model.
-    likes_count = fields.Method("get_likes_count")
+    # Defines the "likes_count" field as an integer which is read from the likes_count column of the Routine model.
+    likes_count = fields.Integer(dump_only=True)
 
     # Method to format the last_updated timestamp
     def format_timestamp(self, routine):
         return routine.last_updated.strftime("%Y-%m-%d %H:%M:%S")
 
-    # Method to call count_likes() on routine instance
-    def get_likes_count(self, routine):
-        return routine.count_likes()
-
     # Create validation for public attribute
     @validates("public")
     def validates_public(self, value):
@@ -6,6 +6,9 @@ from marshmallow.exceptions import ValidationError
 from marshmallow import fields, post_dump, pre_load
 from marshmallow.validate import Length, Range
 
+# Import the in-memory exercise catalog to read exercise names without loading each exercise
+from catalog import exercise_catalog
+
 # Constant variable for max inputs
 MAX_RANGE = 999999
 # Constant variable for valid inputs
@@ -29,13 +32,24 @@ class RoutineExercise(db.Model):
     note = db.Column(db.String)
 
     # Foreign Keys
-    routine_id = db.Column(db.Integer, db.ForeignKey("routines.id"), nullable=False)
-    exercise_id = db.Column(db.Integer, db.ForeignKey("exercises.id"), nullable=False)
+    # Routine exercises are deleted by the database when the associated routine is deleted (ON DELETE CASCADE)
+    # Both foreign keys are indexed: routine exercises are loaded by routine_id and checked by exercise_id before an exercise is deleted
+    routine_id = db.Column(db.Integer, db.ForeignKey("routines.id", ondelete="CASCADE"), nullable=False, index=True)
+    exercise_id = db.Column(db.Integer, db.ForeignKey("exercises.id"), nullable=False, index=True)
 
     # Define relationships with exercise and routine table
     exercise = db.relationship("Exercise", back_populates="routine_exercises")
     routine = db.relationship("Routine", back_populates="routine_exercises")
 
+    # The exercise shown in the routine exercise's exercise_name (see RoutineExerciseSchema). If the exercise has already been loaded (e.g. when building routine
+    # documents, see documents.py) it is used as is, otherwise it is read from the exercise catalog (see catalog.py) and only loaded if it is not in the catalog.
+    @property
+    def catalog_exercise(self):
+        exercise = self.__dict__.get("exercise")
+        if exercise is None:
+            exercise = exercise_catalog.get(self.exercise_id) or self.exercise
+        return exercise
+
 # Reason for validation is to ensure that user inputs are not too long. Also to ensure particular attributes do not exceed certain values (e.g. minutes and seconds should not exceed 59).
 # Also include nesting for retrieving the associated exercise name for the exercise_id. This is retrieved by accessing the exercise relationship.
 class RoutineExerciseSchema(ma.Schema):
@@ -48,8 +62,8 @@ class RoutineExerciseSchema(ma.Schema):
     minutes = fields.Integer(validate=Range(max=59))
     seconds = fields.Integer(validate=Range(max=59))
     note = fields.String(validate=Length(max=255))
-    # To allow exercise name to appear when routine exercises are called/input into JSON response
-    exercise_name = fields.Nested("ExerciseSchema", only=["exercise_name"], attribute="exercise")
+    # To allow exercise name to appear when routine exercises are called/input into JSON response (read from the exercise catalog where available)
+    exercise_name = fields.Nested("ExerciseSchema", only=["exercise_name"], attribute="catalog_exercise")
 
 
     # Pre-load decorator to perform validation on user input. Raise a validation error if no attributes provided to avoid empty routine_exercises. 
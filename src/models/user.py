@@ -22,8 +22,8 @@ class User(db.Model):
     # Define relationships with exercise, routine and like tables
     exercises = db.relationship("Exercise", back_populates="user")
     routines = db.relationship("Routine", back_populates="user")
-    # All associated likes belonging to a user are to be deleted when user is deleted.
-    likes = db.relationship("Like", back_populates="user", cascade="all, delete")
+    # All associated likes belonging to a user are to be deleted when user is deleted (by the database, ON DELETE CASCADE).
+    likes = db.relationship("Like", back_populates="user", cascade="all, delete", passive_deletes=True)
 
 class UserSchema(ma.Schema):
     # Reason for validation are as per error messages provided. Generally ensure that any inputs from the user are not too long and are easy to read within the app. E.g. prevent multiple consecutive underscores in username, etc.
@@ -0,0 +1,145 @@
+# Import base64 and json to encode/decode opaque pagination cursors
+import base64
+import json
+
+# Import bisect to find the start of a page in an already sorted list
+import bisect
+
+# Import datetime to restore timestamp values stored in cursors
+from datetime import datetime
+
+# Import request to read the 'limit' and 'cursor' query parameters
+from flask import request
+
+# Import ValidationError so invalid pagination parameters are handled by the global ValidationError handler (400)
+from marshmallow.exceptions import ValidationError
+
+# Import tuple_ to compare (sort value, id) pairs as a single row value (allows the database to seek directly into a composite index)
+from sqlalchemy import tuple_
+
+# Import SQLAlchemy database for executing paginated queries
+from init import db
+
+# Constant variables for page sizes. Default page size when 'limit' is not provided, and the largest page size a user can request.
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+# Function to fetch and validate the 'limit' query parameter from the request (default to DEFAULT_PAGE_SIZE)
+def get_limit():
+    limit = request.args.get("limit", DEFAULT_PAGE_SIZE)
+    try:
+        limit = int(limit)
+    except (TypeError, ValueError):
+        raise ValidationError({"limit": [f"'limit' must be a whole number between 1 and {MAX_PAGE_SIZE}."]})
+    # If limit is out of range
+    if limit < 1 or limit > MAX_PAGE_SIZE:
+        raise ValidationError({"limit": [f"'limit' must be a whole number between 1 and {MAX_PAGE_SIZE}."]})
+    return limit
+
+
+# Function to fetch and validate the 'limit' and 'cursor' query parameters from the request
+def get_page_args():
+    # Fetch limit from query parameter (default to DEFAULT_PAGE_SIZE)
+    limit = get_limit()
+
+    # Fetch cursor from query parameter (None if first page)
+    cursor = request.args.get("cursor") or None
+    return limit, cursor
+
+
+# Function to describe the sort keys of a cursor (e.g. ["last_updated:desc", "id:desc"])
+def describe_keys(keys):
+    return [f"{column.key}:{'desc' if descending else 'asc'}" for column, descending in keys]
+
+
+# Function to encode the sort values of the last row of a page into an opaque, URL safe cursor
+def encode_cursor(keys, values):
+    payload = {
+        # Store the sort key names to ensure cursor is only reused with the same sort
+        "k": describe_keys(keys),
+        # Store the values of the last row (timestamps are stored as ISO strings)
+        "v": [value.isoformat() if isinstance(value, datetime) else value for value in values]
+    }
+    return base64.urlsafe_b64encode(json.dumps(payload, separators=(",", ":")).encode("utf-8")).decode("ascii")
+
+
+# Function to decode a cursor back into the sort values of the last row of the previous page
+def decode_cursor(keys, cursor):
+    try:
+        payload = json.loads(base64.urlsafe_b64decode(cursor.encode("ascii")))
+        key_names = payload["k"]
+        values = payload["v"]
+    except (ValueError, TypeError, KeyError, AttributeError):
+        raise ValidationError({"cursor": ["The provided cursor is invalid. Please use the 'next_cursor' provided in a previous response."]})
+
+    # If cursor was created for a different sort order
+    if key_names != describe_keys(keys) or not isinstance(values, list) or len(values) != len(keys):
+        raise ValidationError({"cursor": ["The provided cursor does not match the requested sort order."]})
+
+    # Convert timestamp values back into datetime objects
+    decoded = []
+    for (column, descending), value in zip(keys, values):
+        if value is not None and column.type.python_type is datetime:
+            try:
+                value = datetime.fromisoformat(value)
+            except (TypeError, ValueError):
+                raise ValidationError({"cursor": ["The provided cursor is invalid. Please use the 'next_cursor' provided in a previous response."]})
+        decoded.append(value)
+    return decoded
+
+
+# Function to build the keyset (cursor) pagination query for a select statement.
+# keys: list of (column, descending) pairs, the last of which must be unique (e.g. id) so the order is stable. All keys must share the same direction.
+# Instead of OFFSET (which has to read and discard every earlier row), each page continues from the sort values of the last row of the previous page:
+# WHERE (sort_value, id) < (:last_sort_value, :last_id) ORDER BY sort_value DESC, id DESC LIMIT :limit + 1
+# The sort keys are selected alongside each result (used to build the next cursor). One extra row is fetched to check whether there is another page.
+def page_statement(stmt, keys, limit, cursor=None):
+    columns = [column for column, descending in keys]
+    descending = keys[0][1]
+
+    # If a cursor was provided, continue after the last row of the previous page
+    if cursor:
+        values = decode_cursor(keys, cursor)
+        if descending:
+            stmt = stmt.filter(tuple_(*columns) < tuple_(*values))
+        else:
+            stmt = stmt.filter(tuple_(*columns) > tuple_(*values))
+
+    # Order by the sort keys and select the sort keys alongside each result
+    order = [column.desc() if descending else column.asc() for column in columns]
+    return stmt.add_columns(*columns).order_by(None).order_by(*order).limit(limit + 1)
+
+
+# Function to perform keyset (cursor) pagination on a select statement (see page_statement)
+# Returns the list of results for the page and the cursor for the next page (None if there are no more results)
+def paginate(stmt, keys, limit, cursor=None):
+    # Execute query for the page
+    rows = db.session.execute(page_statement(stmt, keys, limit, cursor)).all()
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+
+    # Create a cursor from the sort values of the last row on this page
+    next_cursor = None
+    if has_more:
+        next_cursor = encode_cursor(keys, tuple(rows[-1])[1:])
+
+    return [row[0] for row in rows], next_cursor
+
+
+# Function to perform keyset (cursor) pagination on a list which is already sorted by the sort keys in ascending order (e.g. exercises held in memory, see catalog.py).
+# sort_values: function which returns the sort values of an item. Cursors are interchangeable with paginate (the same keys produce the same cursors).
+# Returns the list of items for the page and the cursor for the next page (None if there are no more items)
+def paginate_sorted(items, keys, limit, cursor, sort_values):
+    # If a cursor was provided, continue after the last item of the previous page (binary search on the sort values, O(log n))
+    start = 0
+    if cursor:
+        values = tuple(decode_cursor(keys, cursor))
+        start = bisect.bisect_right(items, values, key=sort_values)
+
+    page = items[start:start + limit]
+    # Create a cursor from the sort values of the last item on this page
+    next_cursor = None
+    if start + limit < len(items):
+        next_cursor = encode_cursor(keys, sort_values(page[-1]))
+    return page, next_cursor
@@ -0,0 +1,113 @@
+# Import ABC and abstractmethod to define the interface of rate limit storage backends
+from abc import ABC, abstractmethod
+
+# Import math to round up Retry-After values, threading to protect the in-memory buckets and time for refilling tokens
+import math
+import threading
+import time
+
+# Import request to identify the route/blueprint and client of each request
+from flask import request
+
+# Import JWT functions to key rate limits by the logged in user
+from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+
+
+# Constant variable for request methods which modify data
+WRITE_METHODS = ("POST", "PUT", "PATCH", "DELETE")
+
+
+# Interface for rate limit storage backends. A shared backend (e.g. Redis) can be provided to RateLimiter to share buckets between worker processes.
+class RateLimitStorage(ABC):
+    # Take one token from the bucket for 'key' (bucket holds up to 'capacity' tokens and refills at 'rate' tokens per second)
+    # Returns (allowed, retry_after) where retry_after is the number of seconds until a token will be available
+    @abstractmethod
+    def consume(self, key, capacity, rate):
+        pass
+
+
+# In-memory token buckets (per worker process)
+class MemoryStorage(RateLimitStorage):
+    def __init__(self, max_keys=100000):
+        # key -> (tokens, last refill time, capacity, rate)
+        self.buckets = {}
+        self.lock = threading.Lock()
+        self.max_keys = max_keys
+
+    def consume(self, key, capacity, rate):
+        now = time.monotonic()
+        with self.lock:
+            tokens, last, _, _ = self.buckets.get(key, (capacity, now, capacity, rate))
+            # Refill the bucket based on how much time has passed since it was last used
+            tokens = min(capacity, tokens + (now - last) * rate)
+            if tokens >= 1:
+                self.buckets[key] = (tokens - 1, now, capacity, rate)
+                allowed, retry_after = True, 0
+            else:
+                self.buckets[key] = (tokens, now, capacity, rate)
+                allowed, retry_after = False, (1 - tokens) / rate
+            # Prevent unbounded memory growth by removing buckets which have refilled completely (identical to a new bucket)
+            if len(self.buckets) > self.max_keys:
+                self.prune(now)
+        return allowed, retry_after
+
+    def prune(self, now):
+        for key, (tokens, last, capacity, rate) in list(self.buckets.items()):
+            if tokens + (now - last) * rate >= capacity:
+                del self.buckets[key]
+
+
+# Rate limiting extension. Checks every request against the limits configured for its blueprint in app.config["RATE_LIMITS"], e.g.
+# {"auth": [{"limit": 10, "per": 60, "methods": ["POST"], "key": "ip"}]} = 10 POST requests per minute, per route, per IP address, for the auth blueprint
+# "methods" defaults to all methods and "key" can be "ip" or "user" (logged in user, falls back to IP address if user is not logged in)
+# Requests over the limit receive 429 (too many requests) with a Retry-After header.
+class RateLimiter:
+    def __init__(self, storage=None, app=None):
+        self.storage = storage or MemoryStorage()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("RATE_LIMIT_ENABLED", True)
+        app.config.setdefault("RATE_LIMITS", {})
+        app.extensions["rate_limiter"] = self
+
+        # Pre-compute each blueprint's rules (capacity and refill rate per second) so each request only performs a dictionary lookup
+        self.rules = {}
+        for blueprint, limits in app.config["RATE_LIMITS"].items():
+            self.rules[blueprint] = [
+                (index, limit["limit"], limit["limit"] / limit["per"], limit.get("methods"), limit.get("key", "ip"))
+                for index, limit in enumerate(limits)
+            ]
+
+        if app.config["RATE_LIMIT_ENABLED"]:
+            app.before_request(self.check_request)
+
+    # Function to identify the client making the request
+    def client_key(self, key_type):
+        if key_type == "user":
+            try:
+                verify_jwt_in_request(optional=True)
+                user_id = get_jwt_identity()
+            except Exception:
+                # Invalid/expired tokens are handled by the route itself. Fall back to IP address.
+                user_id = None
+            if user_id:
+                return f"user:{user_id}"
+        return f"ip:{request.remote_addr}"
+
+    # Runs before every request
+    def check_request(self):
+        rules = self.rules.get(request.blueprint)
+        if not rules:
+            return None
+
+        for index, capacity, rate, methods, key_type in rules:
+            # Skip rules which do not apply to this request method
+            if methods and request.method not in methods:
+                continue
+            key = f"{request.endpoint}:{index}:{self.client_key(key_type)}"
+            allowed, retry_after = self.storage.consume(key, capacity, rate)
+            if not allowed:
+                return {"error": "Too many requests. Please slow down and try again shortly."}, 429, {"Retry-After": str(math.ceil(retry_after))}
+        return None
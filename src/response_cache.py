@@ -0,0 +1,309 @@
+# Import ABC and abstractmethod to define the interface of cache backends
+from abc import ABC, abstractmethod
+
+# Import threading for locks, time for entry expiry and OrderedDict for least recently used (LRU) eviction
+import threading
+import time
+from collections import OrderedDict, Counter
+
+# Import wraps to create the caching decorator
+from functools import wraps
+
+# Import current_app to build cached responses, g to collect the tags of the current request, request to build cache keys and make_response to capture responses
+from flask import current_app, g, request, make_response
+
+# Import check_not_modified to answer conditional requests from the validators stored with a cached response
+from conditional import check_not_modified
+
+# Import SingleFlight to share the computation of a response between identical concurrent requests
+from singleflight import SingleFlight
+
+
+# Interface for response cache backends. A backend stores entries (dictionaries of bytes/strings/lists, so they can be pickled by shared backends) by key,
+# each with a time to live (seconds) and a list of tags. invalidate_tags must remove every entry stored with any of the provided tags.
+# The backend also keeps a generation number, incremented by every invalidate_tags/clear. set only stores an entry if the generation is still the one read
+# (with generation()) before the response was computed, so a response computed from data which changed meanwhile is never stored. The check and the store
+# must be atomic (e.g. a Lua script or WATCH/MULTI on Redis).
+# MemoryBackend (below) stores entries in the worker process. A shared backend (e.g. one built on Redis) can be provided with RESPONSE_CACHE_BACKEND
+# so every worker shares entries, invalidations and the generation.
+class CacheBackend(ABC):
+    @abstractmethod
+    def get(self, key):
+        pass
+
+    @abstractmethod
+    def set(self, key, entry, ttl, tags, generation):
+        pass
+
+    @abstractmethod
+    def generation(self):
+        pass
+
+    @abstractmethod
+    def invalidate_tags(self, tags):
+        pass
+
+    @abstractmethod
+    def clear(self):
+        pass
+
+    @abstractmethod
+    def size(self):
+        pass
+
+
+# In-process backend: least recently used entries are evicted once max_entries are stored, and entries expire after their time to live.
+# Note: each worker process has its own entries and generation. An invalidation in one worker does not reach the others, so other workers may serve an entry
+# (e.g. a routine list including a routine which has since been made private or deleted) for up to its time to live. Only use it with a single worker process.
+class MemoryBackend(CacheBackend):
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        # key -> (expires, entry, tags), least recently used first
+        self.entries = OrderedDict()
+        # tag -> set of keys stored with the tag
+        self.tag_keys = {}
+        # Incremented on every invalidation
+        self.current_generation = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            item = self.entries.get(key)
+            if item is None:
+                return None
+            if item[0] <= time.monotonic():
+                self.remove(key)
+                return None
+            self.entries.move_to_end(key)
+            return item[1]
+
+    def set(self, key, entry, ttl, tags, generation):
+        with self.lock:
+            if generation != self.current_generation:
+                return
+            self.remove(key)
+            self.entries[key] = (time.monotonic() + ttl, entry, tags)
+            for tag in tags:
+                self.tag_keys.setdefault(tag, set()).add(key)
+            # Evict the least recently used entries
+            while len(self.entries) > self.max_entries:
+                self.remove(next(iter(self.entries)))
+
+    def generation(self):
+        return self.current_generation
+
+    def invalidate_tags(self, tags):
+        with self.lock:
+            self.current_generation += 1
+            for tag in tags:
+                for key in self.tag_keys.pop(tag, ()):
+                    self.remove(key)
+
+    def clear(self):
+        with self.lock:
+            self.current_generation += 1
+            self.entries.clear()
+            self.tag_keys.clear()
+
+    def size(self):
+        return len(self.entries)
+
+    # Function to remove an entry and its tags (lock must be held)
+    def remove(self, key):
+        item = self.entries.pop(key, None)
+        if item is None:
+            return
+        for tag in item[2]:
+            keys = self.tag_keys.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.tag_keys[tag]
+
+
+# Server-side response cache for read routes whose responses are identical for every caller of the same visibility class (e.g. anonymous routine lists, the exercise catalog).
+# - Routes are decorated with @response_cache.cached(*tags). Entries are keyed by route + normalised query parameters (sorted) + response format (JSON / MessagePack)
+#   + visibility class: "anonymous" (only requests without an Authorization header are cached) or "shared" (the response does not depend on the user, shared=True).
+# - Only 200 responses are stored, along with their conditional GET validators, so a cached response can also be answered with 304 (not modified).
+# - Entries are tagged with the decorator's tags plus any tags added by the route with tag() (e.g. the target of a routine list). Routes which modify data call
+#   invalidate(*tags) after committing, which removes every entry with any of those tags. Entries also expire after RESPONSE_CACHE_TTL seconds.
+# - If an invalidation happens while a response is being computed, the response is not stored (it may have been computed from data which has since changed).
+#   The generation which tracks invalidations is kept by the backend, so with a shared backend this includes invalidations made by other workers.
+# - Disabled by default (RESPONSE_CACHE_ENABLED): the default in-process backend is only safe with a single worker process (see MemoryBackend).
+# - Compressed bodies are stored alongside each entry (see compressed_variants in compression.py), so a cached body is only compressed once per encoding.
+# - Single-flight (SINGLE_FLIGHT_ENABLED): on a miss, identical concurrent requests (same key) wait for the first request to compute the response and share it,
+#   instead of each running the same queries (e.g. many requests for a popular list arriving just after it was invalidated). Routes which should not be cached
+#   (e.g. single routines) can share concurrent computations only with @response_cache.coalesced().
+# - Hit/miss/coalesced counters for each route are available from stats() (GET /cache/stats, admin only).
+#   Responses include an X-Cache header (HIT / MISS / COALESCED / BYPASS).
+class ResponseCache:
+    def __init__(self, app=None):
+        self.enabled = False
+        self.coalesce = False
+        self.flights = None
+        self.backend = None
+        self.counters = Counter()
+        self.lock = threading.Lock()
+        if app is not None:
+            self.init_app(app)
+
+    def init_app(self, app):
+        app.config.setdefault("RESPONSE_CACHE_ENABLED", False)
+        app.config.setdefault("RESPONSE_CACHE_TTL", 30)
+        app.config.setdefault("RESPONSE_CACHE_MAX_ENTRIES", 1024)
+        app.config.setdefault("RESPONSE_CACHE_BACKEND", None)
+        app.config.setdefault("SINGLE_FLIGHT_ENABLED", True)
+        app.config.setdefault("SINGLE_FLIGHT_TIMEOUT", 5)
+        app.extensions["response_cache"] = self
+        self.enabled = app.config["RESPONSE_CACHE_ENABLED"]
+        self.coalesce = app.config["SINGLE_FLIGHT_ENABLED"]
+        self.flights = SingleFlight(app.config["SINGLE_FLIGHT_TIMEOUT"])
+        self.ttl = app.config["RESPONSE_CACHE_TTL"]
+        self.backend = app.config["RESPONSE_CACHE_BACKEND"] or MemoryBackend(app.config["RESPONSE_CACHE_MAX_ENTRIES"])
+
+    # Function to build the cache key of the current request. Returns None if the request cannot be cached.
+    def make_key(self, shared):
+        if request.method != "GET":
+            return None
+        if shared:
+            visibility = "shared"
+        elif "Authorization" in request.headers:
+            return None
+        else:
+            visibility = "anonymous"
+        response_format = "msgpack" if current_app.json.wants_msgpack() else "json"
+        args = "&".join(f"{name}={value}" for name, value in sorted(request.args.items(multi=True)))
+        return f"{request.endpoint}|{request.path}?{args}|{response_format}|{visibility}"
+
+    # Function to add tags to the response of the current request (in addition to the tags of the decorator)
+    def tag(self, *tags):
+        g.setdefault("cache_tags", set()).update(tags)
+
+    # Function to remove every cached response with any of the provided tags. Call after the change has been committed.
+    def invalidate(self, *tags):
+        if not self.enabled or not tags:
+            return
+        with self.lock:
+            self.counters["invalidations"] += 1
+        self.backend.invalidate_tags(tags)
+
+    # Function to remove every cached response (e.g. when a change affects every list)
+    def clear(self):
+        if not self.enabled:
+            return
+        with self.lock:
+            self.counters["invalidations"] += 1
+        self.backend.clear()
+
+    # Function to count a hit/miss/coalesced request for a route
+    def count(self, endpoint, outcome):
+        with self.lock:
+            self.counters[(endpoint, outcome)] += 1
+
+    # Function to fetch the hit/miss/coalesced counters, in total and for each route
+    def stats(self):
+        with self.lock:
+            counters = dict(self.counters)
+        endpoints = {}
+        for key, value in counters.items():
+            if isinstance(key, tuple):
+                endpoints.setdefault(key[0], {"hits": 0, "misses": 0, "coalesced": 0})[key[1]] = value
+        hits = sum(endpoint["hits"] for endpoint in endpoints.values())
+        misses = sum(endpoint["misses"] for endpoint in endpoints.values())
+        return {
+            "enabled": self.enabled,
+            "single_flight": self.coalesce,
+            "backend": type(self.backend).__name__,
+            "entries": self.backend.size(),
+            "ttl": self.ttl,
+            "hits": hits,
+            "misses": misses,
+            "hit_ratio": round(hits / (hits + misses), 4) if hits + misses else None,
+            "coalesced": sum(endpoint["coalesced"] for endpoint in endpoints.values()),
+            "invalidations": counters.get("invalidations", 0),
+            "endpoints": endpoints
+        }
+
+    # Function to build a cache entry from a response. Returns None if the response cannot be cached or shared (only 200 responses with validators).
+    def make_entry(self, response):
+        validators = g.get("validator_values")
+        if response.status_code != 200 or response.is_streamed or validators is None:
+            return None
+        return {
+            "body": response.get_data(),
+            "headers": [(name, value) for name, value in response.headers.items() if name in ("Content-Type", "Vary")],
+            "validators": validators,
+            "last_modified": g.validators[1],
+            "variants": {}
+        }
+
+    # Function to build a response from a cached entry (or a 304 if the client's copy is still up to date)
+    def cached_response(self, entry):
+        not_modified = check_not_modified(*entry["validators"], last_modified=entry["last_modified"])
+        if not_modified:
+            return not_modified
+        response = current_app.response_class(entry["body"], status=200, headers=entry["headers"])
+        response.compressed_variants = entry["variants"]
+        return response
+
+    # Decorator to cache the responses of a read route (see class description). shared=True: the response is the same for every user, logged in or not.
+    # store=False: responses are not cached, only shared between identical concurrent requests (see coalesced).
+    def cached(self, *tags, shared=False, store=True):
+        def decorator(fn):
+            @wraps(fn)
+            def wrapper(*args, **kwargs):
+                store_response = store and self.enabled
+                key = self.make_key(shared) if store_response or self.coalesce else None
+                if key is None:
+                    response = make_response(fn(*args, **kwargs))
+                    response.headers["X-Cache"] = "BYPASS"
+                    return response
+
+                if store_response:
+                    entry = self.backend.get(key)
+                    if entry is not None:
+                        self.count(request.endpoint, "hits")
+                        response = self.cached_response(entry)
+                        response.headers["X-Cache"] = "HIT"
+                        return response
+                    self.count(request.endpoint, "misses")
+
+                generation = self.backend.generation()
+                response = None
+
+                # Function to compute the response. Returns the entry shared with identical concurrent requests (None if the response cannot be shared).
+                def compute():
+                    nonlocal response
+                    response = make_response(fn(*args, **kwargs))
+                    return self.make_entry(response)
+
+                if self.coalesce:
+                    # The generation is part of the key, so requests which arrive after an invalidation do not share a response computed before it
+                    entry, leader = self.flights.do(f"{key}|{generation}", compute)
+                else:
+                    entry, leader = compute(), True
+
+                if not leader:
+                    # The response computed by another request can't be shared (e.g. an error), compute it for this request
+                    if entry is None:
+                        response = make_response(fn(*args, **kwargs))
+                        response.headers["X-Cache"] = "MISS"
+                        return response
+                    self.count(request.endpoint, "coalesced")
+                    response = self.cached_response(entry)
+                    response.headers["X-Cache"] = "COALESCED"
+                    return response
+
+                response.headers["X-Cache"] = "MISS"
+                if entry is not None:
+                    response.compressed_variants = entry["variants"]
+                    # Store the entry unless the data may have changed while the response was computed (checked by the backend)
+                    if store_response:
+                        self.backend.set(key, entry, self.ttl, [*tags, *g.get("cache_tags", ())], generation)
+                return response
+            return wrapper
+        return decorator
+
+    # Decorator to share the computation of a read route's response between identical concurrent requests, without caching it
+    def coalesced(self, shared=False):
+        return self.cached(shared=shared, store=False)
@@ -0,0 +1,218 @@
+# Import bisect to find prefix matches in sorted lists, math to round up the number of trigrams required and re to split names into words for trigrams
+import bisect
+import math
+import re
+
+# Import Counter to count the trigrams each exercise shares with the search terms
+from collections import Counter
+
+# Import SQLAlchemy database to build the search query, and the Exercise model to search with its alphabetical sort order
+from init import db
+from models.exercise import Exercise, exercise_name_order
+
+
+# EXERCISE SEARCH (GET /exercises/search?q=)
+# Exercises are ranked in three groups:
+# 1. The exercise name starts with the search terms (alphabetical order)
+# 2. A word of the exercise name starts with the search terms, e.g. "curl" matches "Hammer Curl" (alphabetical order)
+# 3. Fuzzy matches (e.g. misspelt search terms): the word similarity of the search terms and the exercise name (see word_similarity, based on trigrams:
+#    sequences of three characters) is at least SEARCH_SIMILARITY_THRESHOLD. Ordered by trigram similarity (most similar first), then alphabetical order.
+# Searches are run in the database with the pg_trgm extension (search_database, indexed by ix_exercises_name_order and ix_exercises_name_trgm), or in memory on
+# the exercise catalog's records (ExerciseSearchIndex, see catalog.py). Both only search later groups if the earlier groups have fewer results than the limit.
+
+# Constant variable for the longest search terms accepted
+MAX_QUERY_LENGTH = 100
+
+# Constant variable for the word similarity a fuzzy match must reach (the default of pg_trgm's word_similarity_threshold)
+SEARCH_SIMILARITY_THRESHOLD = 0.6
+
+
+# Function to fetch the trigrams of a text in order (including repeats), the same way as pg_trgm: the text is lower cased and split into words (letters and
+# digits), and each word is padded with two spaces before and one space after, e.g. "Curl" -> ["  c", " cu", "cur", "url", "rl "]
+def trigram_sequence(text):
+    result = []
+    for word in re.findall(r"[^\W_]+", text.lower()):
+        padded = f"  {word} "
+        result.extend(padded[index:index + 3] for index in range(len(padded) - 2))
+    return result
+
+
+# Function to fetch the set of trigrams of a text (see trigram_sequence)
+def trigrams(text):
+    return set(trigram_sequence(text))
+
+
+# Function to calculate pg_trgm's word_similarity(query, name): the greatest trigram similarity (shared trigrams / trigrams in either) between the search
+# terms and any continuous extent of the name's trigrams. A port of pg_trgm's iterate_word_similarity: the extent is grown one trigram at a time, and each
+# time it reaches one of the search terms' trigrams its start is moved forward if that makes the extent more similar.
+# query_trigrams: set of trigrams of the search terms
+def word_similarity(query_trigrams, name):
+    sequence = trigram_sequence(name)
+    # trigram -> position of its last occurrence in the current extent
+    last_position = {}
+    # Unique trigrams in the current extent, and how many of them are search term trigrams
+    extent_count = 0
+    shared = 0
+    lower = -1
+    best = 0.0
+    for position, trigram in enumerate(sequence):
+        found = trigram in query_trigrams
+        # Trigrams before the first search term trigram are not part of any extent
+        if lower >= 0 or found:
+            if trigram not in last_position:
+                extent_count += 1
+                if found:
+                    shared += 1
+            last_position[trigram] = position
+        if not found:
+            continue
+        if lower == -1:
+            lower = position
+            extent_count = 1
+        current = shared / (len(query_trigrams) + extent_count - shared)
+        # Try each later start for the extent (ending at this trigram), keeping the most similar
+        start_count, start_shared, previous_lower = extent_count, shared, lower
+        for start in range(lower, position + 1):
+            similarity = start_shared / (len(query_trigrams) + start_count - start_shared)
+            if similarity > current:
+                current, extent_count, shared, lower = similarity, start_count, start_shared, start
+            start_trigram = sequence[start]
+            if last_position[start_trigram] == start:
+                start_count -= 1
+                if start_trigram in query_trigrams:
+                    start_shared -= 1
+        best = max(best, current)
+        # Forget the trigrams which are no longer part of the extent
+        for start in range(previous_lower, lower):
+            if last_position.get(sequence[start]) == start:
+                del last_position[sequence[start]]
+    return best
+
+
+# Function to build the database queries for a search (PostgreSQL with the pg_trgm extension, see migration 0008): one select statement for each group, in
+# ranked order (ties are in alphabetical order, see exercise_name_order). Each group excludes the exercises matched by the earlier groups.
+# query: search terms (lower cased and stripped of surrounding whitespace)
+# - Name prefixes (LIKE 'terms%') use ix_exercises_name_order (in the C collation, so the matches are read in order and the scan stops at the limit)
+# - Word prefixes (LIKE '% terms%') and fuzzy matches (terms <% name) use ix_exercises_name_trgm
+def search_statements(query):
+    name = db.func.lower(Exercise.exercise_name)
+    name_prefix = exercise_name_order.startswith(query, autoescape=True)
+    word_prefix = name.contains(f" {query}", autoescape=True)
+    # word_similarity(terms, name) >= pg_trgm.word_similarity_threshold
+    fuzzy = db.literal(query).op("<%")(name)
+    return [
+        db.select(Exercise).where(name_prefix).order_by(exercise_name_order, Exercise.id),
+        db.select(Exercise).where(word_prefix, db.not_(name_prefix)).order_by(exercise_name_order, Exercise.id),
+        db.select(Exercise).where(fuzzy, db.not_(name_prefix), db.not_(word_prefix)).order_by(db.func.similarity(name, query).desc(), exercise_name_order, Exercise.id)
+    ]
+
+
+# Function to search the database. Returns up to limit exercises in ranked order. The statement for each group is only run if the earlier groups have fewer
+# results than the limit (a single statement ranking every group would check and sort every fuzzy match, the slowest group, even when the limit is reached
+# by name or word prefix matches). options: loader options for the exercises (see exercise_options in loaders.py)
+def search_database(query, limit, options=()):
+    results = []
+    for statement in search_statements(query):
+        results.extend(db.session.scalars(statement.options(*options).limit(limit - len(results))))
+        if len(results) >= limit:
+            break
+    return results
+
+
+# In-memory search index for a list of exercise records (built once for each exercise catalog snapshot, see catalog.py). Returns the same groups and order as
+# search_database.
+# - Sorted list of lower cased names: name prefix matches are a contiguous range, found with a binary search
+# - Sorted list of word suffixes (the rest of the name from the start of each word after the first): word prefix matches are a contiguous range too
+# - Inverted trigram index (trigram -> IDs of the exercises whose name includes it): fuzzy candidates are found without comparing every name
+# Later groups are only searched if the earlier groups have fewer results than the limit.
+class ExerciseSearchIndex:
+    def __init__(self, records):
+        self.records = {record.id: record for record in records}
+        # id -> lower cased name, and id -> words of the name (see trigram_sequence)
+        self.lower_names = {record.id: record.exercise_name.lower() for record in records}
+        self.words = {record_id: tuple(re.findall(r"[^\W_]+", name)) for record_id, name in self.lower_names.items()}
+        # (lower cased name, id) in alphabetical order
+        self.names = sorted((record.exercise_name.lower(), record.id) for record in records)
+        # (lower cased name from the start of a word, id) in alphabetical order
+        self.suffixes = []
+        # trigram -> list of exercise IDs, and exercise ID -> number of trigrams in its name
+        self.trigram_ids = {}
+        self.trigram_counts = {}
+        for name, record_id in self.names:
+            for match in re.finditer(" (?=[^ ])", name):
+                self.suffixes.append((name[match.end():], record_id))
+            name_trigrams = trigrams(name)
+            self.trigram_counts[record_id] = len(name_trigrams)
+            for trigram in name_trigrams:
+                self.trigram_ids.setdefault(trigram, []).append(record_id)
+        self.suffixes.sort()
+
+    # Function to search the index. query: search terms (lower cased and stripped of surrounding whitespace). Returns up to limit records in ranked order.
+    def search(self, query, limit):
+        results = []
+        found = set()
+
+        # 1. Name prefix matches (already in alphabetical order)
+        index = bisect.bisect_left(self.names, (query,))
+        while index < len(self.names) and len(results) < limit and self.names[index][0].startswith(query):
+            record_id = self.names[index][1]
+            results.append(self.records[record_id])
+            found.add(record_id)
+            index += 1
+        if len(results) >= limit:
+            return results
+
+        # 2. Word prefix matches (a name may match with more than one word, so matches are collected before sorting)
+        index = bisect.bisect_left(self.suffixes, (query,))
+        word_matches = set()
+        while index < len(self.suffixes) and self.suffixes[index][0].startswith(query):
+            record_id = self.suffixes[index][1]
+            if record_id not in found:
+                word_matches.add(record_id)
+            index += 1
+        for record_id in sorted(word_matches, key=lambda record_id: (self.lower_names[record_id], record_id))[:limit - len(results)]:
+            results.append(self.records[record_id])
+            found.add(record_id)
+        if len(results) >= limit:
+            return results
+
+        # 3. Fuzzy matches: word_similarity(search terms, name) >= SEARCH_SIMILARITY_THRESHOLD (the same test as pg_trgm's <% operator).
+        # A name's word similarity is at most the share of the search terms' trigrams found anywhere in the name, so candidates are first narrowed to names which
+        # share at least `required` trigrams. The exercise ID lists of the search terms' trigrams are sorted from shortest to longest. A candidate must appear in
+        # at least one of the shortest len - required + 1 lists (it could appear in every other list and still be short of `required`), so only those lists are
+        # counted in full. The longer lists (e.g. of trigrams which start common words) are only checked for the exercises found in the shorter lists.
+        query_trigrams = trigrams(query)
+        if not query_trigrams:
+            return results
+        postings = sorted((self.trigram_ids.get(trigram, ()) for trigram in query_trigrams), key=len)
+        required = math.ceil(round(SEARCH_SIMILARITY_THRESHOLD * len(postings), 6))
+        split = len(postings) - required + 1
+        shared = Counter()
+        for ids in postings[:split]:
+            shared.update(ids)
+        candidates = set(shared)
+        for ids in postings[split:]:
+            shared.update(candidates.intersection(ids))
+        # Candidates in ranked order: trigram similarity (shared trigrams / trigrams in either text, most similar first), then alphabetical order. The word
+        # similarity of each candidate is only calculated until the limit is reached. Extents start and end at search term trigrams, so only the words from the
+        # first to the last word with one of the search terms' trigrams affect it: names which share those words (e.g. "Seated Dumbbell Curl" and "Incline
+        # Dumbbell Row" for "dumbel") share the calculation.
+        ranked = sorted((-count / (len(query_trigrams) + self.trigram_counts[record_id] - count), self.lower_names[record_id], record_id)
+                        for record_id, count in shared.items() if count >= required and record_id not in found)
+        # word -> whether it includes any of the search terms' trigrams, and words -> word similarity
+        query_words = {}
+        similarities = {}
+        for similarity, name, record_id in ranked:
+            words = self.words[record_id]
+            for word in words:
+                if word not in query_words:
+                    query_words[word] = not query_trigrams.isdisjoint(trigrams(word))
+            matching = [index for index, word in enumerate(words) if query_words[word]]
+            extent = " ".join(words[matching[0]:matching[-1] + 1])
+            if extent not in similarities:
+                similarities[extent] = word_similarity(query_trigrams, extent)
+            if similarities[extent] >= SEARCH_SIMILARITY_THRESHOLD:
+                results.append(self.records[record_id])
+                if len(results) >= limit:
+                    break
+        return results
@@ -0,0 +1,125 @@
+# Import lru_cache to compile each schema once
+from functools import lru_cache
+
+# Import marshmallow fields (to recognise field types) and missing (marker for values which are left out of the output)
+from marshmallow import fields, missing
+
+
+# COMPILED SERIALIZERS
+# marshmallow's dump() looks up, dispatches and validates every field of every object on every call. For read routes which dump large lists, a schema is
+# instead compiled once into a plain Python function which builds the output dictionary directly, e.g. for RoutineSchema(only=("id", "created_by")):
+#     def dump(obj):
+#         data = {}
+#         data['id'] = ...obj.id...
+#         value = obj.user
+#         data['created_by'] = None if value is None else nested_0(value)
+#         return data
+# The compiled function is generated from the schema's fields (respecting only/exclude, attribute and data_key) and produces the same output as schema.dump():
+# - Plain fields (String, Integer, Boolean, Float and fields inferred from Meta.fields) copy values which already have the expected type, and otherwise use the field's own serialisation
+# - Method fields call the schema method, Nested and List(Nested) fields call the compiled nested schema
+# - Per-object post_dump hooks (e.g. RoutineExerciseSchema.remove_none_values) are called on each result
+# - Any other field type uses the field's own serialize() method
+# Schemas which use pre_dump hooks or post_dump(pass_many=True) hooks are not compiled and fall back to schema.dump().
+# marshmallow is still used for loading and validating request data.
+
+# Value types which can be copied directly for each plain field type (values of any other type are passed to the field's _serialize method)
+PLAIN_TYPES = {
+    fields.String: (str,),
+    fields.Integer: (int,),
+    fields.Boolean: (bool,),
+    fields.Float: (float, int),
+    fields.Inferred: (str, int, bool, float),
+}
+
+
+# Function to check whether a schema uses hooks which cannot be compiled (hooks which run before dumping or on a whole list)
+def has_unsupported_hooks(schema):
+    if schema._hooks.get("pre_dump"):
+        return True
+    return any(hook_many for attr_name, hook_many, hook_kwargs in schema._hooks.get("post_dump", []))
+
+
+# Function to compile a schema instance into a function which dumps a single object. Returns None if the schema cannot be compiled.
+@lru_cache(maxsize=256)
+def compile_schema(schema):
+    if has_unsupported_hooks(schema):
+        return None
+
+    namespace = {"missing": missing, "accessor": schema.get_attribute}
+    lines = ["def dump(obj):", "    data = {}"]
+
+    for index, (name, field) in enumerate(schema.dump_fields.items()):
+        attribute = field.attribute or name
+        key = repr(field.data_key or name)
+        field_name = f"field_{index}"
+        namespace[field_name] = field
+        nested = nested_serializer(field)
+
+        # Attributes which are not simple attribute names (e.g. "user.username") are read with the schema's accessor
+        if not attribute.isidentifier() and not isinstance(field, fields.Method):
+            lines.append(f"    value = {field_name}.serialize({attribute!r}, obj, accessor=accessor)")
+            lines.append(f"    if value is not missing: data[{key}] = value")
+        elif isinstance(field, fields.Method):
+            # Method fields call the schema method with the object (fields without a method are left out of the output)
+            if field.serialize_method_name is None:
+                continue
+            namespace[f"method_{index}"] = getattr(schema, field.serialize_method_name)
+            lines.append(f"    data[{key}] = method_{index}(obj)")
+        elif nested is not None:
+            # Nested schemas are compiled too. Lists of nested objects dump each item.
+            serializer, many = nested
+            namespace[f"nested_{index}"] = serializer
+            lines.append(f"    value = obj.{attribute}")
+            if many:
+                lines.append(f"    data[{key}] = None if value is None else [nested_{index}(item) for item in value]")
+            else:
+                lines.append(f"    data[{key}] = None if value is None else nested_{index}(value)")
+        elif type(field) in PLAIN_TYPES:
+            # Plain values which already have the expected type are copied as is
+            namespace[f"plain_{index}"] = PLAIN_TYPES[type(field)]
+            lines.append(f"    value = obj.{attribute}")
+            lines.append(f"    data[{key}] = value if value is None or value.__class__ in plain_{index} else {field_name}._serialize(value, {attribute!r}, obj)")
+        else:
+            # Any other field type uses marshmallow's serialisation for that field
+            lines.append(f"    value = {field_name}.serialize({attribute!r}, obj, accessor=accessor)")
+            lines.append(f"    if value is not missing: data[{key}] = value")
+
+    # Per-object post_dump hooks
+    for index, (attr_name, hook_many, hook_kwargs) in enumerate(schema._hooks.get("post_dump", [])):
+        namespace[f"hook_{index}"] = getattr(schema, attr_name)
+        if hook_kwargs.get("pass_original", False):
+            lines.append(f"    data = hook_{index}(data, obj, many={schema.many!r})")
+        else:
+            lines.append(f"    data = hook_{index}(data, many={schema.many!r})")
+
+    lines.append("    return data")
+    exec("\n".join(lines), namespace)
+    return namespace["dump"]
+
+
+# Function to fetch the serializer for a Nested or List(Nested) field. Returns (serializer, many) or None if the field is not nested.
+def nested_serializer(field):
+    many = False
+    if isinstance(field, fields.List) and isinstance(field.inner, fields.Nested):
+        field, many = field.inner, True
+    if not isinstance(field, fields.Nested):
+        return None
+
+    schema = field.schema
+    serializer = compile_schema(schema)
+    if serializer is None:
+        # Nested schema cannot be compiled, use marshmallow for this field (one object at a time)
+        serializer = lambda obj: schema.dump(obj, many=False)
+    if schema.many:
+        many = True
+    return serializer, many
+
+
+# Function to dump an object (or list of objects if the schema was created with many=True) using the compiled serializer for the schema
+def serialize(schema, obj):
+    serializer = compile_schema(schema)
+    if serializer is None:
+        return schema.dump(obj)
+    if schema.many:
+        return [serializer(item) for item in obj]
+    return serializer(obj)
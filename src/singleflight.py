@@ -0,0 +1,49 @@
+# Import threading to let concurrent requests wait for a computation in progress
+import threading
+
+
+# A computation in progress (see SingleFlight)
+class Flight:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.failed = False
+
+
+# Single-flight: concurrent calls with the same key share a single computation. The first caller (the leader) runs the function, and callers which arrive
+# while it is running (followers) wait for it and receive the same result instead of running the same queries again.
+# - If the leader's function raises an exception, the exception is raised for the leader only. Followers receive None (and should compute the result themselves).
+# - Followers wait at most timeout seconds, then receive None.
+# Note: calls are only shared within a worker process, and only while a computation is in progress (results are not kept, see response_cache.py for caching).
+class SingleFlight:
+    def __init__(self, timeout=5):
+        self.timeout = timeout
+        # key -> Flight in progress
+        self.flights = {}
+        self.lock = threading.Lock()
+
+    # Function to run fn once for all concurrent calls with the same key. Returns (result, leader) where leader is True for the caller which ran fn.
+    def do(self, key, fn):
+        with self.lock:
+            flight = self.flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self.flights[key] = Flight()
+
+        # Followers wait for the leader's result
+        if not leader:
+            if not flight.done.wait(self.timeout) or flight.failed:
+                return None, False
+            return flight.result, False
+
+        try:
+            flight.result = fn()
+        except BaseException:
+            flight.failed = True
+            raise
+        finally:
+            # Remove the flight before waking followers, so later calls start a new computation
+            with self.lock:
+                del self.flights[key]
+            flight.done.set()
+        return flight.result, True
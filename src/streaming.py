@@ -0,0 +1,50 @@
+# Import current_app to encode items with the app's JSON provider, request to read the 'stream' query parameter and stream_with_context to keep the request (and database session) open while streaming
+from flask import current_app, request, stream_with_context
+
+# Import JWT functions to check the logged in user on routes which do not require a login
+from flask_jwt_extended import verify_jwt_in_request, get_jwt_identity
+
+# Import SQLAlchemy database for executing streamed queries
+from init import db
+
+# Import serialize to dump each batch with the compiled serializers
+from serializers import serialize
+
+# Import user_is_admin to restrict streaming to admin
+from utils import user_is_admin
+
+# Constant variable for the number of rows fetched from the database (and serialised) at a time while streaming
+STREAM_BATCH_SIZE = 500
+
+
+# Function to check if the user requested a streamed response (?stream=true)
+def wants_stream():
+    return request.args.get("stream", "").lower() == "true"
+
+
+# Function to check if the logged in user can stream a full list (admin only, as streamed lists are not paginated)
+def stream_allowed():
+    verify_jwt_in_request(optional=True)
+    return get_jwt_identity() is not None and user_is_admin()
+
+
+# Function to stream every result of a select statement as a JSON response, e.g. {"routines": [...], "next_cursor": null}
+# Instead of loading the full list, dumping it and encoding it in one go (holding ~3 copies of the result set in memory), rows are read from a server side cursor
+# STREAM_BATCH_SIZE at a time (yield_per), and each batch is serialised, encoded and sent before the next batch is read. Memory use stays flat regardless of the number of rows.
+# keys: list of (column, descending) pairs to order the results by (same as the paginated route)
+# schema: schema (many=True) used to dump each batch, key: name of the list in the response
+def stream_response(stmt, keys, schema, key):
+    order = [column.desc() if descending else column.asc() for column, descending in keys]
+    stmt = stmt.order_by(None).order_by(*order).execution_options(yield_per=STREAM_BATCH_SIZE)
+    dumps = current_app.json.dumps
+
+    def generate():
+        yield f"{{{dumps(key)}:["
+        separator = ""
+        for batch in db.session.scalars(stmt).partitions():
+            items = serialize(schema, batch)
+            yield separator + ",".join(dumps(item) for item in items)
+            separator = ","
+        yield '],"next_cursor":null}'
+
+    return current_app.response_class(stream_with_context(generate()), mimetype="application/json")
@@ -0,0 +1,139 @@
+# Import os to configure the app from environment variables before it is created, and threading to count queries from concurrent requests
+import os
+import threading
+
+# Import pytest for fixtures and markers, and event to listen for every statement sent to the database
+import pytest
+from sqlalchemy import event
+from sqlalchemy.engine.interfaces import ExecuteStyle
+
+# Tests run against a PostgreSQL database (the app uses PostgreSQL specific SQL).
+# WARNING: every table in TEST_DATABASE_URL is dropped and re-created for each test, so never point it at a database with data you want to keep.
+# e.g. TEST_DATABASE_URL="postgresql+psycopg2://<name_of_admin>:<password>@localhost:5432/<name_of_test_database>" python -m pytest
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+
+# Constant variable for the password of every seeded user (see seed_tables in cli_controllers.py)
+SEED_PASSWORD = "abc123!"
+
+
+# Add the --benchmark option (benchmarks and load tests are slow, so they only run when requested)
+def pytest_addoption(parser):
+    parser.addoption("--benchmark", action="store_true", default=False, help="Run benchmarks and load tests (marked with @pytest.mark.benchmark)")
+
+
+# Skip every test if no test database is configured, and benchmarks unless --benchmark is provided
+def pytest_collection_modifyitems(config, items):
+    for item in items:
+        if not TEST_DATABASE_URL:
+            item.add_marker(pytest.mark.skip(reason="Set TEST_DATABASE_URL to an empty PostgreSQL database to run the tests"))
+        elif "benchmark" in item.keywords and not config.getoption("--benchmark"):
+            item.add_marker(pytest.mark.skip(reason="Benchmarks only run with --benchmark"))
+
+
+# Counts the statements sent to the database (SELECT, INSERT, UPDATE, DELETE...) and the transactions committed by every thread
+class QueryCounter:
+    def __init__(self):
+        self.count = 0
+        self.commits = 0
+        self.lock = threading.Lock()
+
+    # Listener for before_cursor_execute. psycopg2 sends an executemany() (e.g. an ORM flush of many rows) as one statement per set of parameters.
+    # Multi-row INSERTs (insertmanyvalues) are a single statement.
+    def statement(self, conn, cursor, statement, parameters, context, executemany):
+        with self.lock:
+            if executemany and context.execute_style is ExecuteStyle.EXECUTEMANY:
+                self.count += len(parameters)
+            else:
+                self.count += 1
+
+    # Listener for commit
+    def commit(self, *args, **kwargs):
+        with self.lock:
+            self.commits += 1
+
+    # Function to restart counting from zero
+    def reset(self):
+        with self.lock:
+            self.count = 0
+            self.commits = 0
+
+
+# The flask app, created once for the test session
+@pytest.fixture(scope="session")
+def app():
+    os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+    os.environ.setdefault("JWT_SECRET_KEY", "test-secret-key-which-is-long-enough-for-hs256")
+    # Cheap password hashes so logging in doesn't dominate the tests (benchmarks choose their own cost)
+    os.environ.setdefault("BCRYPT_LOG_ROUNDS", "4")
+    os.environ.setdefault("RATE_LIMIT_ENABLED", "false")
+    # Only reload the exercise catalog when it changes in the test (not every second), so query counts don't depend on timing
+    os.environ.setdefault("EXERCISE_CATALOG_CHECK_INTERVAL", "3600")
+
+    from main import create_app
+    app = create_app()
+    app.config["TESTING"] = True
+    return app
+
+
+# Re-create and seed every table before each test, and clear the app's in-process state
+@pytest.fixture(autouse=True)
+def database(request, app):
+    if not TEST_DATABASE_URL:
+        yield None
+        return
+
+    from init import db, response_cache
+    from catalog import exercise_catalog
+    from like_buffer import like_buffer
+
+    runner = app.test_cli_runner()
+    for command in ("drop", "create", "seed"):
+        result = runner.invoke(args=["db", command])
+        assert result.exception is None, result.output
+    exercise_catalog.invalidate()
+    with like_buffer.lock:
+        like_buffer.pending.clear()
+        like_buffer.flushing = {}
+        like_buffer.attempts.clear()
+    response_cache.clear()
+    yield db
+
+
+# Test client for the app
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+# Function to log in as a seeded user. Returns the Authorization header for the user's token.
+@pytest.fixture
+def login(client):
+    def login(email="usera@email.com", password=SEED_PASSWORD):
+        response = client.post("/auth/login", json={"email": email, "password": password})
+        assert response.status_code == 200, response.get_json()
+        return {"Authorization": f"Bearer {response.get_json()['token']}"}
+    return login
+
+
+# Counts the statements sent to the database while a test runs (call queries.reset() before the requests being measured)
+@pytest.fixture
+def queries(app):
+    from init import db
+
+    counter = QueryCounter()
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, "before_cursor_execute", counter.statement)
+    event.listen(engine, "commit", counter.commit)
+    yield counter
+    event.remove(engine, "before_cursor_execute", counter.statement)
+    event.remove(engine, "commit", counter.commit)
+
+
+# Function to print a line of benchmark results (shown even when pytest captures output)
+@pytest.fixture
+def report(request, capsys):
+    def report(line):
+        with capsys.disabled():
+            print(f"\n[{request.node.name}] {line}")
+    return report
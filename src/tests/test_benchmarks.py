@@ -0,0 +1,255 @@
+# Benchmarks and load tests. These are slow, so they only run with --benchmark, e.g.
+# TEST_DATABASE_URL=... python -m pytest --benchmark
+# Each benchmark reports its results and checks that the optimised path is correct (and not slower where the difference is reliable).
+import statistics
+import threading
+import time
+
+import bcrypt as bcrypt_lib
+import pytest
+from flask import Blueprint, Flask
+from flask_jwt_extended import create_access_token
+
+from tests.test_query_counts import create_routines
+
+pytestmark = pytest.mark.benchmark
+
+
+# Function to run 'fn' on 'threads' threads at once (started together). Returns the number of seconds taken by all threads.
+def run_threads(threads, fn):
+    barrier = threading.Barrier(threads)
+    errors = []
+
+    def worker(index):
+        barrier.wait()
+        try:
+            fn(index)
+        except Exception as err:
+            errors.append(err)
+
+    workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    assert not errors, errors
+    return elapsed
+
+
+# Password checks per second for different hashing pool sizes (logins which arrive at once share the pool. bcrypt releases the GIL, so throughput scales with the pool size up to the number of CPU cores)
+def test_password_hashing_pool(report):
+    from flask_bcrypt import Bcrypt
+    from hashing import PasswordHasher
+
+    pw_hash = bcrypt_lib.hashpw(b"abc123!", bcrypt_lib.gensalt(10)).decode("utf-8")
+    logins = 32
+    for pool_size in (1, 2, 4):
+        app = Flask("benchmark")
+        app.config.update(HASHING_POOL_SIZE=pool_size, HASHING_QUEUE_SIZE=logins, BCRYPT_LOG_ROUNDS=10)
+        hasher = PasswordHasher(Bcrypt(app), app)
+
+        def login(index):
+            assert hasher.check_password_hash(pw_hash, "abc123!")
+
+        elapsed = run_threads(logins, login)
+        hasher.executor.shutdown()
+        report(f"pool size {pool_size}: {logins / elapsed:.1f} logins/sec (bcrypt cost 10, {logins} concurrent logins)")
+
+
+# Overhead of the rate limiter for each request
+def test_rate_limiter_overhead(report):
+    from rate_limit import MemoryStorage, RateLimiter
+
+    storage = MemoryStorage()
+    checks = 100000
+    start = time.perf_counter()
+    for index in range(checks):
+        storage.consume(f"ip:{index % 1000}", 10, 1)
+    per_consume = (time.perf_counter() - start) / checks * 1e6
+
+    app = Flask("benchmark")
+    auth_bp = Blueprint("auth", __name__, url_prefix="/auth")
+    auth_bp.add_url_rule("/login", "login_user", lambda: "", methods=["POST"])
+    app.register_blueprint(auth_bp)
+    app.config["RATE_LIMITS"] = {"auth": [{"limit": checks * 2, "per": 60, "methods": ["POST"], "key": "ip"}]}
+    limiter = RateLimiter(app=app)
+
+    checks = 20000
+    with app.test_request_context("/auth/login", method="POST"):
+        start = time.perf_counter()
+        for index in range(checks):
+            assert limiter.check_request() is None
+        per_request = (time.perf_counter() - start) / checks * 1e6
+
+    report(f"MemoryStorage.consume: {per_consume:.2f} µs, check_request (1 rule): {per_request:.2f} µs")
+    assert per_request < 1000
+
+
+# Compiled serializers compared to marshmallow's dump() for a large list of routines (with owner and routine exercises)
+def test_compiled_serializers(app, report):
+    from init import db
+    from models.routine import Routine, routines_schema
+    from models.routine_exercise import RoutineExercise
+    from loaders import routine_list_options
+    from serializers import serialize
+
+    with app.app_context():
+        routine_count = 10000
+        routine_ids = db.session.scalars(db.insert(Routine).returning(Routine.id), [
+            {"routine_title": f"Routine #{number}", "description": "Benchmark", "target": "Chest", "public": True, "user_id": 3}
+            for number in range(routine_count)
+        ]).all()
+        db.session.execute(db.insert(RoutineExercise), [
+            {"routine_id": routine_id, "exercise_id": exercise_id, "sets": 3, "reps": 10}
+            for routine_id in routine_ids for exercise_id in (1, 2, 3)
+        ])
+        db.session.commit()
+
+        routines = db.session.scalars(db.select(Routine).options(*routine_list_options())).all()
+
+        start = time.perf_counter()
+        expected = routines_schema.dump(routines)
+        marshmallow_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        data = serialize(routines_schema, routines)
+        compiled_time = time.perf_counter() - start
+
+    assert data == expected
+    report(f"{len(routines)} routines: marshmallow {len(routines) / marshmallow_time:.0f} rows/sec, compiled {len(routines) / compiled_time:.0f} rows/sec")
+    assert compiled_time < marshmallow_time
+
+
+
+# Exercise search over 100,000 exercises, in memory (the exercise catalog's ExerciseSearchIndex) and in the database (search_database). Every name combines a
+# modifier, a piece of equipment and a movement, so each word is shared by thousands of names (e.g. "dumbel" has 2,000 fuzzy candidates which all fail).
+SEARCH_MODIFIERS = "incline decline seated standing single arm alternating reverse close wide neutral kneeling lying bent over overhead front rear side low high cable assisted weighted explosive paused tempo isometric deficit banded pendlay sumo romanian bulgarian zercher landmine hack goblet spider jefferson".split()
+SEARCH_EQUIPMENT = "barbell dumbbell kettlebell cable machine band smith trap ez bodyweight plate sandbag medicine ball rope ring sled bench box bar landmine swiss bosu suspension chain wheel roller pulley tire hammer sliders vest belt weight rack log keg stone yoke anchor handle strap towel pipe beam trx mace club ladder cone".split()
+SEARCH_MOVEMENTS = "press curl row squat lunge deadlift raise fly extension pulldown pullup chinup dip pushup shrug crunch twist plank bridge thrust kickback swing snatch clean jerk carry drag march step jump hop skip sprint climb crawl rotation pullover pushdown skullcrusher hold walk toss slam chop lift throw pull push kick tuck".split()
+# Name prefixes, word prefixes, fuzzy matches (misspelt searches) and no matches
+SEARCH_QUERIES = ["incline", "seated ket", "press", "hammer cu", "dumbbell press", "benhc pres", "squatt frnt", "incln dumbel pres", "dumbel", "kettlebel swng", "zzzz"]
+
+
+def test_exercise_search(app, report):
+    from init import db
+    from models.exercise import Exercise
+    from search import ExerciseSearchIndex, search_database
+
+    with app.app_context():
+        db.session.execute(db.insert(Exercise), [
+            {"exercise_name": f"{modifier} {equipment} {movement}".title(), "description": "Benchmark", "body_part": "Chest", "user_id": 1}
+            for modifier in SEARCH_MODIFIERS for equipment in SEARCH_EQUIPMENT for movement in SEARCH_MOVEMENTS
+        ])
+        db.session.commit()
+        # Update the planner statistics and move new entries into the trigram index, as autovacuum would (VACUUM can't run inside a transaction)
+        with db.engine.connect().execution_options(isolation_level="AUTOCOMMIT") as connection:
+            connection.exec_driver_sql("VACUUM ANALYZE exercises")
+        exercises = db.session.scalars(db.select(Exercise)).all()
+
+        start = time.perf_counter()
+        index = ExerciseSearchIndex(exercises)
+        report(f"{len(exercises)} exercises: index built in {time.perf_counter() - start:.2f} s")
+
+        # Median time of each search (ms)
+        medians = {"memory": [], "database": []}
+        for query in SEARCH_QUERIES:
+            for path, search in (("memory", index.search), ("database", search_database)):
+                times = []
+                for _ in range(5):
+                    start = time.perf_counter()
+                    results = search(query, 20)
+                    times.append(time.perf_counter() - start)
+                medians[path].append(statistics.median(times) * 1000)
+            # Both paths return the same exercises in the same order
+            assert [exercise.id for exercise in results] == [exercise.id for exercise in index.search(query, 20)]
+            report(f"'{query}': in memory {medians['memory'][-1]:.2f} ms, database {medians['database'][-1]:.2f} ms, {len(results)} results")
+
+    for path, times in medians.items():
+        report(f"{path}: median {statistics.median(times):.2f} ms, slowest {max(times):.2f} ms")
+        assert statistics.median(times) < 10
+
+
+# A burst of identical requests for the same routine/list (e.g. after a cache invalidation), with and without single-flight
+@pytest.mark.parametrize("url", ["/routines/3", "/routines/Upper-body?sort=popular"])
+def test_thundering_herd(app, client, queries, report, url):
+    from init import response_cache
+
+    threads = 50
+    statements = {}
+    for coalesce in (False, True):
+        response_cache.coalesce = coalesce
+        # Start each run with nothing cached, so every request needs the response computed
+        response_cache.clear()
+        try:
+            def request(index):
+                response = app.test_client().get(url)
+                assert response.status_code == 200
+
+            queries.reset()
+            elapsed = run_threads(threads, request)
+            statements[coalesce] = queries.count
+        finally:
+            response_cache.coalesce = app.config["SINGLE_FLIGHT_ENABLED"]
+        report(f"{url} single-flight {'on' if coalesce else 'off'}: {queries.count} statements for {threads} concurrent requests in {elapsed * 1000:.0f} ms")
+
+    assert statements[True] < statements[False]
+
+
+
+# Many users liking and unliking the same routines at once, with and without the like buffer
+@pytest.mark.parametrize("buffered", [False, True])
+def test_like_load(app, client, login, queries, report, buffered):
+    from init import db
+    from like_buffer import like_buffer
+    from models.like import Like
+    from models.routine import Routine
+    from models.user import User
+
+    routine_ids = create_routines(client, login("usera@email.com"), 5, exercises=0)
+
+    # Create users with tokens (signed directly, so logging in doesn't count towards the load test)
+    user_count = 20
+    with app.app_context():
+        user_ids = db.session.scalars(db.insert(User).returning(User.id), [
+            {"username": f"loaduser{number}", "email": f"loaduser{number}@email.com", "password": "unused", "is_admin": False}
+            for number in range(user_count)
+        ]).all()
+        db.session.commit()
+        headers = [{"Authorization": f"Bearer {create_access_token(identity=str(user_id))}"} for user_id in user_ids]
+
+    rounds = 5
+
+    # Each user likes and unlikes every routine several times, finishing with every routine liked
+    def like_routines(index):
+        user_client = app.test_client()
+        for _ in range(rounds):
+            for routine_id in routine_ids:
+                assert user_client.post(f"/routines/{routine_id}/like", headers=headers[index]).status_code == 201
+                assert user_client.delete(f"/routines/{routine_id}/like", headers=headers[index]).status_code == 200
+        for routine_id in routine_ids:
+            assert user_client.post(f"/routines/{routine_id}/like", headers=headers[index]).status_code == 201
+
+    like_buffer.enabled = buffered
+    try:
+        queries.reset()
+        elapsed = run_threads(user_count, like_routines)
+        like_buffer.flush()
+        statements, commits = queries.count, queries.commits
+    finally:
+        like_buffer.enabled = app.config["LIKE_BUFFER_ENABLED"]
+
+    requests = user_count * len(routine_ids) * (rounds * 2 + 1)
+    report(f"like buffer {'on' if buffered else 'off'}: {requests / elapsed:.0f} requests/sec, {statements} statements and {commits} commits for {requests} requests")
+
+    # Every like was written exactly once and the likes counts match the likes stored in the database
+    with app.app_context():
+        for routine_id in routine_ids:
+            likes = db.session.scalar(db.select(db.func.count()).select_from(Like).filter_by(routine_id=routine_id))
+            assert likes == user_count
+            assert db.session.get(Routine, routine_id).likes_count == user_count
+
+    # Buffered likes/unlikes are written in batches (likes followed by unlikes never reach the database)
+    if buffered:
+        assert commits < requests
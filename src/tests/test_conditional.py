@@ -0,0 +1,83 @@
+# Checks that conditional GETs only return 304 (not modified) while the response body would be unchanged
+import pytest
+
+from tests.test_query_counts import create_routines
+
+
+# Function to check that a GET request returns 304 with the ETag of an earlier response. Returns the ETag.
+def assert_not_modified(client, url, headers):
+    etag = client.get(url, headers=headers).headers["ETag"]
+    response = client.get(url, headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 304
+    return etag
+
+
+# Function to check that a GET request with an out of date ETag returns the full response. Returns the response's JSON.
+def assert_modified(client, url, headers, etag):
+    response = client.get(url, headers={**headers, "If-None-Match": etag})
+    assert response.status_code == 200, response.get_json()
+    return response.get_json()
+
+
+# A change of username is shown in created_by without the routines being updated
+@pytest.mark.parametrize("url", ["/routines/", "/routines/Upper-body", "/routines/{}"])
+def test_routines_are_modified_by_a_change_of_username(client, login, url):
+    user_a = login("usera@email.com")
+    user_b = login("userb@email.com")
+    routine_id, = create_routines(client, user_a, 1)
+    url = url.format(routine_id)
+
+    etag = assert_not_modified(client, url, user_b)
+    response = client.patch("/auth/users/", headers=user_a, json={"username": "Renamed.User_A"})
+    assert response.status_code == 200, response.get_json()
+    assert "Renamed.User_A" in str(assert_modified(client, url, user_b, etag))
+
+
+# Routines transferred to the deleted account show the deleted account in created_by
+@pytest.mark.parametrize("url", ["/routines/", "/routines/{}"])
+def test_routines_are_modified_by_a_transfer_to_the_deleted_account(client, login, url):
+    user_a = login("usera@email.com")
+    user_b = login("userb@email.com")
+    routine_id, = create_routines(client, user_a, 1)
+    url = url.format(routine_id)
+    user_id = client.patch("/auth/users/", headers=user_a, json={}).get_json()["id"]
+
+    etag = assert_not_modified(client, url, user_b)
+    response = client.delete(f"/auth/users/{user_id}", headers=user_a, json={"delete_public_routines": False})
+    assert response.status_code == 200, response.get_json()
+    assert "Deleted_Account" in str(assert_modified(client, url, user_b, etag))
+
+
+# A change of username is shown in exercise lists, with and without the exercise catalog
+@pytest.mark.parametrize("catalog", [True, False])
+def test_exercise_lists_are_modified_by_a_change_of_username(app, client, login, catalog):
+    from catalog import exercise_catalog
+
+    user_a = login("usera@email.com")
+    response = client.post("/exercises/", headers=user_a, json={"exercise_name": "Test exercise", "description": "Created by the test suite", "body_part": "Chest"})
+    assert response.status_code == 201, response.get_json()
+
+    exercise_catalog.enabled = catalog
+    try:
+        url = "/exercises/?body_part=Chest"
+        etag = assert_not_modified(client, url, user_a)
+        response = client.patch("/auth/users/", headers=user_a, json={"username": "Renamed.User_A"})
+        assert response.status_code == 200, response.get_json()
+        assert "Renamed.User_A" in str(assert_modified(client, url, user_a, etag))
+    finally:
+        exercise_catalog.enabled = app.config["EXERCISE_CATALOG_ENABLED"]
+
+
+# A 304 (not modified) carries the ETag of the client's copy, which is weak if the copy was compressed
+@pytest.mark.parametrize("accept_encoding", ["gzip", "identity"])
+def test_not_modified_has_the_etag_of_the_clients_copy(client, accept_encoding):
+    compressed = accept_encoding == "gzip"
+    response = client.get("/routines/", headers={"Accept-Encoding": accept_encoding})
+    assert response.status_code == 200
+    assert (response.headers.get("Content-Encoding") == "gzip") == compressed
+    etag = response.headers["ETag"]
+    assert etag.startswith("W/") == compressed
+
+    response = client.get("/routines/", headers={"Accept-Encoding": accept_encoding, "If-None-Match": etag})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
@@ -0,0 +1,88 @@
+# Checks that the stored routine documents always match the routines serialised from the tables
+from tests.test_query_counts import create_routines
+
+
+# Function to sort the routine exercises of a serialised routine (the routine_exercises relationship has no defined order)
+def sort_routine_exercises(data):
+    return {**data, "routine_exercises": sorted(data["routine_exercises"], key=lambda routine_exercise: routine_exercise["id"])}
+
+
+# Function to check the document of every routine against the routine serialised from the tables
+def assert_documents_match_tables(app):
+    from init import db
+    from documents import DOCUMENT_FIELDS
+    from fieldsets import fieldset_schema
+    from loaders import routine_options
+    from models.routine import Routine, RoutineSchema
+    from serializers import serialize
+
+    with app.app_context():
+        schema = fieldset_schema(RoutineSchema, DOCUMENT_FIELDS)
+        routines = db.session.scalars(db.select(Routine).options(*routine_options())).all()
+        assert routines
+        for routine in routines:
+            assert sort_routine_exercises(routine.document) == sort_routine_exercises(serialize(schema, routine)), routine.id
+
+
+def test_documents_match_the_tables_after_each_change(app, client, login):
+    assert_documents_match_tables(app)
+
+    user_a = login("usera@email.com")
+    admin = login("admin@email.com")
+    routine_id, = create_routines(client, user_a, 1, exercises=2)
+    assert_documents_match_tables(app)
+
+    # Routine changes
+    response = client.patch(f"/routines/{routine_id}", headers=user_a, json={"routine_title": "Renamed routine"})
+    assert response.status_code == 200, response.get_json()
+    assert_documents_match_tables(app)
+
+    # Routine exercise changes
+    response = client.post(f"/routines/{routine_id}/exercise", headers=user_a, json={"exercise_id": 3, "sets": 5, "reps": 5})
+    assert response.status_code == 201, response.get_json()
+    routine_exercise_id = response.get_json()["id"]
+    response = client.patch(f"/routines/{routine_id}/exercise/{routine_exercise_id}", headers=user_a, json={"exercise_id": 4, "reps": 8})
+    assert response.status_code == 200, response.get_json()
+    assert_documents_match_tables(app)
+    response = client.delete(f"/routines/{routine_id}/exercise/{routine_exercise_id}", headers=user_a)
+    assert response.status_code == 200, response.get_json()
+    assert_documents_match_tables(app)
+
+    # Exercise names (changed by an admin, as the exercise is used in routines)
+    response = client.patch("/exercises/1", headers=admin, json={"exercise_name": "Renamed exercise"})
+    assert response.status_code == 200, response.get_json()
+    assert_documents_match_tables(app)
+
+    # Usernames
+    response = client.patch("/auth/users/", headers=user_a, json={"username": "Renamed.User_A"})
+    assert response.status_code == 200, response.get_json()
+    user_id = response.get_json()["id"]
+    assert_documents_match_tables(app)
+
+    # Public routines transferred to the deleted account
+    response = client.delete(f"/auth/users/{user_id}", headers=user_a, json={"delete_public_routines": False})
+    assert response.status_code == 200, response.get_json()
+    assert_documents_match_tables(app)
+
+
+# An admin can delete an exercise which is used in routines. Its routine exercises are deleted and the routines' documents no longer include it.
+def test_deleting_a_used_exercise_removes_it_from_routines(app, client, login):
+    user_a = login("usera@email.com")
+    response = client.post("/exercises/", headers=user_a, json={"exercise_name": "Test exercise", "description": "Created by the test suite", "body_part": "Chest"})
+    assert response.status_code == 201, response.get_json()
+    exercise_id = response.get_json()["id"]
+    routine_id, = create_routines(client, user_a, 1, exercises=1)
+    response = client.post(f"/routines/{routine_id}/exercise", headers=user_a, json={"exercise_id": exercise_id, "sets": 3, "reps": 10})
+    assert response.status_code == 201, response.get_json()
+
+    # The exercise's creator can't delete it while it is used
+    response = client.delete(f"/exercises/{exercise_id}", headers=user_a)
+    assert response.status_code == 409, response.get_json()
+
+    response = client.delete(f"/exercises/{exercise_id}", headers=login("admin@email.com"))
+    assert response.status_code == 200, response.get_json()
+    assert_documents_match_tables(app)
+
+    response = client.get(f"/routines/{routine_id}", headers=user_a)
+    assert response.status_code == 200, response.get_json()
+    assert [routine_exercise["exercise_id"] for routine_exercise in response.get_json()["routine_exercises"]] == [1]
@@ -0,0 +1,151 @@
+# Checks that routes run a fixed number of statements, regardless of how many routines/routine exercises/likes they include (no N+1 queries)
+import pytest
+
+
+# Function to create routines for the logged in user (each with routine exercises). Returns the IDs of the new routines.
+def create_routines(client, headers, count, target="Upper-body", public=True, exercises=2):
+    routine_ids = []
+    for number in range(count):
+        response = client.post("/routines/", headers=headers, json={
+            "routine_title": f"Test routine #{number}",
+            "description": "Created by the test suite",
+            "target": target,
+            "public": public
+        })
+        assert response.status_code == 201, response.get_json()
+        routine_id = response.get_json()["id"]
+        for exercise_id in range(1, exercises + 1):
+            response = client.post(f"/routines/{routine_id}/exercise", headers=headers, json={"exercise_id": exercise_id, "sets": 3, "reps": 10})
+            assert response.status_code == 201, response.get_json()
+        routine_ids.append(routine_id)
+    return routine_ids
+
+
+# Function to like routines as the logged in user
+def like_routines(client, headers, routine_ids):
+    for routine_id in routine_ids:
+        response = client.post(f"/routines/{routine_id}/like", headers=headers)
+        assert response.status_code == 201, response.get_json()
+
+
+# Function to count the statements run by a request (after a warm up request, so one-off work isn't counted)
+def count_queries(client, queries, method, url, **kwargs):
+    client.open(url, method=method, **kwargs)
+    queries.reset()
+    response = client.open(url, method=method, **kwargs)
+    assert response.status_code == 200, response.get_json()
+    return queries.count
+
+
+# GET routes which list routines
+LIST_URLS = [
+    "/routines/",
+    "/routines/Upper-body",
+    "/routines/Upper-body?sort=popular",
+    "/routines/liked",
+    "/routines/?expand=routine_exercises",
+    "/routines/Upper-body?sort=popular&expand=routine_exercises",
+    "/routines/liked?expand=routine_exercises",
+]
+
+
+@pytest.mark.parametrize("url", LIST_URLS)
+def test_routine_lists_run_a_constant_number_of_queries(client, login, queries, url):
+    user_a = login("usera@email.com")
+    user_b = login("userb@email.com")
+
+    # The seeded routines
+    before = count_queries(client, queries, "GET", url, headers=user_b)
+
+    # Add routines which each have routine exercises and likes
+    routine_ids = create_routines(client, user_a, 20)
+    like_routines(client, user_b, routine_ids)
+
+    after = count_queries(client, queries, "GET", url, headers=user_b)
+    assert after == before
+
+
+def test_single_routine_runs_a_constant_number_of_queries(client, login, queries):
+    user_a = login("usera@email.com")
+    few, many = create_routines(client, user_a, 1, exercises=1) + create_routines(client, user_a, 1, exercises=10)
+
+    url = "/routines/{}"
+    assert count_queries(client, queries, "GET", url.format(many), headers=user_a) == count_queries(client, queries, "GET", url.format(few), headers=user_a)
+
+
+# Deleting a user runs the same statements however many routines, routine exercises and likes the user has (set-based statements)
+def test_deleting_a_user_runs_a_constant_number_of_statements(client, login, queries):
+    statements = []
+    for email, routine_count in (("fewroutines@email.com", 1), ("manyroutines@email.com", 15)):
+        response = client.post("/auth/register", json={"username": email.split("@")[0], "email": email, "password": "abc123!"})
+        assert response.status_code == 201, response.get_json()
+        user_id = response.get_json()["id"]
+        headers = login(email, "abc123!")
+
+        # Public and private routines (the public routines are liked by other users)
+        public_ids = create_routines(client, headers, routine_count)
+        create_routines(client, headers, routine_count, public=False)
+        for liker in ("usera@email.com", "userb@email.com"):
+            like_routines(client, login(liker), public_ids)
+        # Likes from the user being deleted
+        like_routines(client, headers, [3, 4, 5])
+
+        queries.reset()
+        response = client.delete(f"/auth/users/{user_id}", headers=headers, json={"delete_public_routines": False})
+        assert response.status_code == 200, response.get_json()
+        statements.append(queries.count)
+
+    assert statements[0] == statements[1]
+
+
+# Making a routine private deletes its likes in a single statement
+def test_making_a_routine_private_runs_a_constant_number_of_statements(client, login, queries):
+    user_a = login("usera@email.com")
+    one_like, many_likes = create_routines(client, user_a, 2)
+    like_routines(client, login("userb@email.com"), [one_like])
+    for liker in ("userb@email.com", "userc@email.com", "userd@email.com", "admin@email.com"):
+        like_routines(client, login(liker), [many_likes])
+
+    statements = []
+    for routine_id in (one_like, many_likes):
+        queries.reset()
+        response = client.patch(f"/routines/{routine_id}", headers=user_a, json={"public": False})
+        assert response.status_code == 200, response.get_json()
+        assert response.get_json()["likes_count"] == 0
+        statements.append(queries.count)
+
+    assert statements[0] == statements[1]
+
+
+# Copying routines runs the same statements however many routines/routine exercises are copied
+def test_copying_routines_runs_a_constant_number_of_queries(client, login, queries):
+    user_a = login("usera@email.com")
+    user_b = login("userb@email.com")
+    few = create_routines(client, user_a, 1, exercises=1)
+    many = create_routines(client, user_a, 10, exercises=3)
+
+    queries.reset()
+    response = client.post("/routines/copy", headers=user_b, json={"routine_ids": few})
+    assert response.status_code == 201, response.get_json()
+    copy_few = queries.count
+
+    queries.reset()
+    response = client.post("/routines/copy", headers=user_b, json={"routine_ids": many})
+    assert response.status_code == 201, response.get_json()
+    assert queries.count == copy_few
+
+
+# Every column of the routine exercises is copied
+def test_copying_a_routine_copies_every_routine_exercise_column(client, login):
+    user_a = login("usera@email.com")
+    routine_id, = create_routines(client, user_a, 1, exercises=0)
+    routine_exercise = {"exercise_id": 1, "sets": 3, "reps": 10, "weight": 60, "distance_km": 1, "distance_m": 500, "hours": 1, "minutes": 2, "seconds": 3, "note": "Slow"}
+    response = client.post(f"/routines/{routine_id}/exercise", headers=user_a, json=routine_exercise)
+    assert response.status_code == 201, response.get_json()
+
+    response = client.post(f"/routines/{routine_id}/copy", headers=login("userb@email.com"))
+    assert response.status_code == 201, response.get_json()
+    copied, = response.get_json()["details"]["routine_exercises"]
+    for key, value in routine_exercise.items():
+        if key != "exercise_id":
+            assert copied[key] == value
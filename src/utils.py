@@ -1,5 +1,8 @@
-# Import for getting logged in user identity
-from flask_jwt_extended import get_jwt_identity
+# Import for getting logged in user identity and the claims of their JWT
+from flask_jwt_extended import get_jwt_identity, get_jwt
+
+# Import g to cache the logged in user for the duration of a request, and request to check the request method
+from flask import g, request
 
 # Import for creation of decorators
 from functools import wraps
@@ -14,79 +17,90 @@ from models.routine import Routine
 # Constant variable for administration email. Is applied to various error messages for contact support reasons.
 ADMIN_EMAIL = "admin@email.com"
 
+# Function to fetch the logged in user. The user is only fetched from the db once per request and then cached on flask.g
+# Returns None if user is not logged in (or the user no longer exists)
+def get_logged_user():
+    # get the user's id from get_jwt_identity
+    user_id = get_jwt_identity()
+    # If user is not logged in
+    if not user_id:
+        return None
+    # If the user has not been fetched during this request, fetch the user from the db and cache it
+    if "logged_user" not in g:
+        g.logged_user = db.session.get(User, int(user_id))
+    return g.logged_user
+
 # Global variable: to check if a logged in user is admin or not. 
 # Can only be applied when a check has been completed if user is logged in.
+# Read-only (GET) routes may use the JWT's signed is_admin claim (see login_user), which reflects the user's admin status when the token was issued.
+# Routes which modify data (POST/PUT/PATCH/DELETE) always check the user's current admin status in the database, so a revoked admin can't keep using old tokens.
 def user_is_admin():
-    # get the user's id from get_jwt_identity
-    user_id = get_jwt_identity()
-    # fetch the user from the db
-    stmt = db.select(User).filter_by(id=user_id)
-    user = db.session.scalar(stmt)
+    # If the JWT contains a signed is_admin claim and the route is read-only, use it without a database round trip
+    claims = get_jwt()
+    if "is_admin" in claims and request.method == "GET":
+        return bool(claims["is_admin"])
+    # Else (route modifies data, or token issued without the claim), fetch the logged in user (cached per request)
+    user = get_logged_user()
     # check whether the user is an admin or not
-    return user.is_admin
+    return bool(user and user.is_admin)
 
 # Decorator for checking if logged in user is the owner of the resource (user_id, exercise_id or routine_id) OR an admin 
 # Also includes validation by checking if the resource ID in the URL can be found in the respective resource table
+# The fetched resource is passed to the decorated route as a keyword argument (user, exercise or routine), so the route does not need to fetch it again.
+# For routes which modify data (POST/PUT/PATCH/DELETE), the resource row is locked (SELECT ... FOR UPDATE) until the route commits.
+# Optionally, loader options can be provided to eager load relationships in the same fetch, e.g. @auth_as_admin_or_owner(options=routine_detail_options())
 # Note: Does not check if user is not logged in. Please use @jwt_required for checking if user is logged in
-def auth_as_admin_or_owner(fn):
+def auth_as_admin_or_owner(fn=None, *, options=()):
+    # If decorator is used with arguments, return the decorator with the provided options
+    if fn is None:
+        return lambda fn: auth_as_admin_or_owner(fn, options=options)
+
     @wraps(fn)
     def wrapper(*args, **kwargs):
         # get the user's id from get_jwt_identity
         logged_user_id = get_jwt_identity()
-        # fetch the logged in user from the db
-        stmt = db.select(User).filter_by(id=logged_user_id)
-        user = db.session.scalar(stmt)
+        # check whether the logged in user is an admin (uses the JWT claim on GET routes, otherwise the user cached for this request)
+        is_admin = user_is_admin()
 
         # Fetch the user/exercise/routine ID from URL
         user_id = kwargs.get('user_id')
         exercise_id = kwargs.get('exercise_id')
         routine_id = kwargs.get('routine_id')
 
-        # If user_id is provided in URL:
+        # If user_id is provided in URL: check the User table (the owner of a user is the user themselves)
         if user_id:
-            # Check if user_id exists in User table
-            user_stmt = db.select(User).filter_by(id=user_id)
-            user_exists = db.session.scalar(user_stmt)
-            # If user doesn't exist:
-            if not user_exists:
-                # Return error message
-                return {"error": f"User with ID '{user_id}' could not be found."}, 404
-            # if logged in user is admin or correct user
-            if user.is_admin or user.id == int(user_id):
-                # allow the function to execute
-                return fn(*args, **kwargs)
-            
-        # If exercise_id is provided in URL:
+            model, resource_id, name = User, user_id, "user"
+        # If exercise_id is provided in URL: check the Exercise table
         elif exercise_id:
-            # Check if exercise_id exists in Exercise table
-            exercise_stmt = db.select(Exercise).filter_by(id=exercise_id)
-            exercise_exists = db.session.scalar(exercise_stmt)
-            # If it doesn't exist:
-            if not exercise_exists:
-                # Return error message
-                return {"error": f"Exercise with ID '{exercise_id}' could not be found."}, 404
-            # Else:
-            else:
-                # if user is admin or owner of exercise
-                if user.is_admin or exercise_exists.user_id == int(logged_user_id):
-                    # allow the function to execute
-                    return fn(*args, **kwargs)
-        # If routine_id is provided in URL:
+            model, resource_id, name = Exercise, exercise_id, "exercise"
+        # If routine_id is provided in URL: check the Routine table
         elif routine_id:
-            # Check if routine_id exists in Routine table
-            routine_stmt = db.select(Routine).filter_by(id=routine_id)
-            routine_exists = db.session.scalar(routine_stmt)
-            # If it doesn't exist:
-            if not routine_exists:
-                # Return error message
-                return {"error": f"Routine with ID '{routine_id}' could not be found."}, 404
-            # Else:
-            else:
-                # if user is admin or owner of routine
-                if user.is_admin or routine_exists.user_id == int(logged_user_id):
-                    # allow the function to execute
-                    return fn(*args, **kwargs)
+            model, resource_id, name = Routine, routine_id, "routine"
+        # Else (no resource in URL)
+        else:
+            return {"error": "Only admin or the owner of this resource can perform this action."}, 403
+
+        # Fetch the resource from its table (with any eager loaded relationships)
+        stmt = db.select(model).filter_by(id=resource_id).options(*options)
+        # If the route modifies data, lock the resource row to prevent concurrent modifications
+        if request.method != "GET":
+            stmt = stmt.with_for_update(of=model)
+        resource = db.session.scalar(stmt)
+
+        # If it doesn't exist:
+        if not resource:
+            # Return error message
+            return {"error": f"{model.__name__} with ID '{resource_id}' could not be found."}, 404
+
+        # Fetch the owner of the resource
+        owner_id = resource.id if model is User else resource.user_id
+
+        # if user is admin or owner of resource
+        if is_admin or owner_id == int(logged_user_id):
+            # allow the function to execute, passing the fetched resource to the route
+            kwargs[name] = resource
+            return fn(*args, **kwargs)
 
         return {"error": "Only admin or the owner of this resource can perform this action."}, 403
         
-    return wrapper
\ No newline at end of file
+    return wrapper